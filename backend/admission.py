@@ -0,0 +1,250 @@
+"""
+Controle de admissão por classe de rota, com fila limitada e descarte rápido.
+
+Cada requisição pertence a uma classe (lead, admin, debug) com prioridade,
+limite de concorrência, tamanho de fila e espera máxima próprios, e todas
+dividem um limite global de requisições em andamento e outro de fila.
+Quando uma vaga abre, a fila de maior prioridade é servida primeiro.
+
+Uma requisição é descartada com 503 + Retry-After quando:
+- a fila da classe está cheia, ou a fila global está cheia sem nenhuma
+  requisição menos prioritária para desalojar
+- estava na fila e foi desalojada por uma requisição mais prioritária
+- a espera estimada (posição na fila x tempo médio de atendimento) já passa
+  da espera máxima da classe: não adianta enfileirar o que vai expirar
+- a espera máxima vence antes de uma vaga abrir
+
+O estado vive no event loop do worker (sem locks); com vários workers cada
+um aplica os limites de forma independente.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from serialization import dumps
+
+
+@dataclass
+class AdmissionClass:
+    priority: int  # menor = mais prioritária
+    concurrency: int
+    queue_size: int
+    max_wait: float  # segundos
+
+
+class Shed(Exception):
+    """Requisição descartada; `retry_after` em segundos"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _ClassState:
+    def __init__(self, spec):
+        self.spec = spec
+        self.in_flight = 0
+        self.waiters = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.max_queue_depth = 0
+        self.shed = {"queue_full": 0, "deadline": 0, "expired": 0, "evicted": 0}
+        self.service_time = 0.05  # média móvel exponencial (s)
+
+
+class AdmissionController:
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, max_concurrency, max_queue, classes):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.classes = {name: _ClassState(spec) for name, spec in classes.items()}
+        self._by_priority = sorted(self.classes.values(), key=lambda state: state.spec.priority)
+        self.in_flight = 0
+
+    @property
+    def enabled(self):
+        return self.max_concurrency > 0
+
+    def _has_slot(self, state):
+        return self.in_flight < self.max_concurrency and state.in_flight < state.spec.concurrency
+
+    def _queued_ahead(self, state):
+        """Requisições que seriam atendidas antes de uma nova da classe `state`"""
+        return sum(len(other.waiters) for other in self._by_priority if other.spec.priority <= state.spec.priority)
+
+    def _retry_after(self, state):
+        capacity = max(1, min(state.spec.concurrency, self.max_concurrency))
+        return max(1, math.ceil((self._queued_ahead(state) + 1) * state.service_time / capacity))
+
+    def _shed(self, state, reason):
+        state.shed[reason] += 1
+        return Shed(reason, self._retry_after(state))
+
+    def _evict_for(self, state):
+        """Desaloja o waiter mais recente da classe menos prioritária que `state`"""
+        for other in reversed(self._by_priority):
+            if other.spec.priority <= state.spec.priority:
+                return False
+            if other.waiters:
+                other.waiters.pop().set_exception(self._shed(other, "evicted"))
+                return True
+        return False
+
+    async def acquire(self, name):
+        """Espera uma vaga para a classe `name`; levanta Shed se a requisição for descartada"""
+        state = self.classes[name]
+        # Vagas livres sempre vão para os waiters em release(); fila vazia + vaga = admissão direta
+        if not state.waiters and self._has_slot(state):
+            self._admit(state)
+            return
+
+        capacity = max(1, min(state.spec.concurrency, self.max_concurrency))
+        expected_wait = (self._queued_ahead(state) + 1) * state.service_time / capacity
+        if expected_wait > state.spec.max_wait:
+            raise self._shed(state, "deadline")
+        if len(state.waiters) >= state.spec.queue_size:
+            raise self._shed(state, "queue_full")
+        if self.queue_depth >= self.max_queue and not self._evict_for(state):
+            raise self._shed(state, "queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        state.waiters.append(waiter)
+        state.queued += 1
+        state.max_queue_depth = max(state.max_queue_depth, len(state.waiters))
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=state.spec.max_wait)
+        except asyncio.TimeoutError:
+            if self._granted(waiter):
+                return  # a vaga chegou junto com o timeout
+            self._abandon(state, waiter)
+            raise self._shed(state, "expired")
+        except asyncio.CancelledError:
+            # Cliente desconectou na fila; se a vaga já tinha sido concedida, devolvê-la
+            if self._granted(waiter):
+                self.release(name, None)
+            else:
+                self._abandon(state, waiter)
+            raise
+
+    @staticmethod
+    def _granted(waiter):
+        return waiter.done() and not waiter.cancelled() and waiter.exception() is None
+
+    @staticmethod
+    def _abandon(state, waiter):
+        waiter.cancel()
+        try:
+            state.waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    @property
+    def queue_depth(self):
+        return sum(len(state.waiters) for state in self._by_priority)
+
+    def _admit(self, state):
+        state.in_flight += 1
+        state.admitted += 1
+        self.in_flight += 1
+
+    def release(self, name, elapsed):
+        state = self.classes[name]
+        state.in_flight -= 1
+        self.in_flight -= 1
+        if elapsed is not None:
+            state.service_time += self.EWMA_ALPHA * (elapsed - state.service_time)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Concede as vagas livres aos waiters, da classe mais prioritária para a menos"""
+        for state in self._by_priority:
+            while state.waiters and self._has_slot(state):
+                self._admit(state)
+                state.waiters.popleft().set_result(True)
+
+    def snapshot(self):
+        return {
+            "enabled": self.enabled,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "classes": {
+                name: {
+                    "priority": state.spec.priority,
+                    "concurrency": state.spec.concurrency,
+                    "queue_size": state.spec.queue_size,
+                    "max_wait": state.spec.max_wait,
+                    "in_flight": state.in_flight,
+                    "queue_depth": len(state.waiters),
+                    "max_queue_depth": state.max_queue_depth,
+                    "admitted": state.admitted,
+                    "queued": state.queued,
+                    "shed": dict(state.shed),
+                    "service_time_ms": round(state.service_time * 1000, 2),
+                }
+                for name, state in self.classes.items()
+            },
+        }
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI que passa cada requisição pelo AdmissionController.
+
+    `routes` é uma lista de (prefixo, classe); o primeiro prefixo que casar
+    vence, `None` como classe isenta a rota (ex.: streams longos) e rotas
+    sem prefixo correspondente não passam pelo controle.
+    """
+
+    def __init__(self, app, controller, routes):
+        self.app = app
+        self.controller = controller
+        self.routes = routes
+
+    def classify(self, path):
+        for prefix, name in self.routes:
+            if path.startswith(prefix):
+                return name
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.controller.enabled:
+            await self.app(scope, receive, send)
+            return
+        name = self.classify(scope["path"])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire(name)
+        except Shed as e:
+            await self._reject(send, name, e)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(name, time.monotonic() - started)
+
+    async def _reject(self, send, name, shed):
+        body = dumps({
+            "detail": "Serviço temporariamente sobrecarregado. Tente novamente em instantes.",
+            "class": name,
+            "reason": shed.reason,
+        })
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(shed.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,125 @@
+"""
+Limite de tamanho do corpo das requisições, aplicado na camada ASGI.
+
+`BodyLimitMiddleware` escolhe o limite pelo prefixo mais longo do caminho e
+o aplica antes de qualquer parsing: um Content-Length acima do limite é
+recusado com 413 sem ler nada, e corpos sem Content-Length (chunked) são
+contados enquanto chegam; ao passar do limite a leitura é interrompida e a
+resposta vira 413, mesmo que a aplicação tente responder outra coisa.
+"""
+import logging
+
+from starlette.exceptions import HTTPException
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+
+class RequestBodyTooLarge(HTTPException):
+    """Levantada pelo `receive` embrulhado quando o corpo passa do limite.
+
+    É uma HTTPException para que o FastAPI a propague ao ler o corpo (em vez
+    de convertê-la em 400) e o handler padrão responda 413.
+    """
+
+    def __init__(self, limit):
+        super().__init__(status_code=413, detail=f"Corpo da requisição excede o limite de {limit} bytes")
+        self.limit = limit
+
+
+def parse_size(value):
+    """'16k', '5m', '1048576' -> bytes"""
+    value = str(value).strip().lower()
+    multiplier = 1
+    if value and value[-1] in "kmg":
+        multiplier = 1024 ** ("kmg".index(value[-1]) + 1)
+        value = value[:-1]
+    return int(float(value) * multiplier)
+
+
+class BodyLimitMiddleware:
+    """Middleware ASGI com limites de corpo por prefixo de rota.
+
+    `limits` mapeia prefixo do caminho -> bytes; o prefixo mais longo que
+    casar vence e `default` vale para o resto.
+    """
+
+    def __init__(self, app, limits, default):
+        self.app = app
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+        self.default = default
+        self.rejected = 0
+
+    def limit_for(self, path):
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return limit
+        return self.default
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limit_for(scope["path"])
+        content_length = None
+        for name, value in scope.get("headers", ()):
+            if name == b"content-length":
+                try:
+                    content_length = int(value)
+                except ValueError:
+                    pass
+                break
+        if content_length is not None and content_length > limit:
+            await self._reject(scope, send, limit, content_length)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                raise RequestBodyTooLarge(limit)
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise RequestBodyTooLarge(limit)
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded:
+                # A aplicação respondeu depois de estourar o limite (ex.: capturou
+                # a exceção); a resposta 413 é enviada no lugar desta
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except RequestBodyTooLarge:
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await self._reject(scope, send, limit, received)
+
+    async def _reject(self, scope, send, limit, size):
+        self.rejected += 1
+        logger.warning(f"Corpo rejeitado em {scope.get('method')} {scope['path']}: {size} bytes (limite {limit})")
+        body = dumps({"detail": f"Corpo da requisição excede o limite de {limit} bytes"})
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
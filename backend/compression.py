@@ -0,0 +1,235 @@
+"""
+Compressão gzip das respostas HTTP e dos corpos enviados aos webhooks.
+
+`CompressionMiddleware` comprime respostas de tipos textuais (JSON, texto)
+a partir de um tamanho mínimo, quando o cliente aceita gzip. Respostas com
+ETag forte são estáticas por versão (ex.: /api/admin/fundos, /api/form/config,
+páginas e fundos do catálogo): o corpo comprimido fica num cache LRU por
+(caminho, ETag) e as requisições seguintes não comprimem de novo. O ETag da
+resposta comprimida vira fraco (`W/`), como no nginx, e continua casando
+com o If-None-Match pela comparação fraca. O cache é descartado a cada nova
+versão da configuração publicada, então uma entrada nunca sobrevive ao corpo
+que a gerou, mesmo que algum ETag não cubra todo o conteúdo da resposta.
+
+Ficam de fora: respostas em streaming (SSE, exportações), respostas que já
+têm Content-Encoding, HEAD e corpos abaixo do mínimo, onde o cabeçalho gzip
+e a CPU custam mais do que economizam (ver benchmarks/bench_compression.py).
+"""
+import asyncio
+import gzip
+from collections import OrderedDict
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+UNCOMPRESSIBLE_TYPES = ("text/event-stream",)
+
+
+def gzip_bytes(body, level=6):
+    """Comprime `body` (bytes ou memoryview); mtime=0 deixa a saída determinística"""
+    return gzip.compress(bytes(body), compresslevel=level, mtime=0)
+
+
+def accepts_gzip(accept_encoding):
+    """O header Accept-Encoding aceita gzip (respeitando q=0)?"""
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def is_compressible(content_type):
+    content_type = content_type.lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(UNCOMPRESSIBLE_TYPES)
+
+
+class CompressedResponseCache:
+    """Corpos já comprimidos por (caminho, ETag), LRU limitado em bytes.
+
+    Vive no event loop do worker (sem locks), como o AdmissionController.
+    `invalidate()` pode ser chamado de outra thread (recarga da configuração):
+    só avança a geração, e o loop esvazia o cache no próximo acesso.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._entries_generation = 0
+
+    def invalidate(self):
+        """Descarta tudo no próximo acesso (nova versão da configuração publicada)"""
+        self.generation += 1
+
+    def _check_generation(self):
+        if self._entries_generation != self.generation:
+            self._entries_generation = self.generation
+            self.clear()
+
+    def get(self, key):
+        self._check_generation()
+        body = self._entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def put(self, key, body):
+        self._check_generation()
+        if len(body) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._entries[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def snapshot(self):
+        self._check_generation()
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class ResponseCompressor:
+    """Configuração, cache e contadores da compressão das respostas.
+
+    `level=0` desliga. Corpos a partir de `offload_size` são comprimidos numa
+    thread (zlib libera o GIL) para não segurar o event loop.
+    """
+
+    def __init__(self, minimum_size, level, cache=None, offload_size=256 * 1024):
+        self.minimum_size = minimum_size
+        self.level = level
+        self.cache = cache
+        self.offload_size = offload_size
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def enabled(self):
+        return self.level > 0
+
+    async def compress(self, key, body):
+        """Corpo comprimido, do cache quando `key` (caminho, ETag) já foi visto"""
+        compressed = self.cache.get(key) if key is not None and self.cache is not None else None
+        if compressed is None:
+            if len(body) >= self.offload_size:
+                compressed = await asyncio.get_running_loop().run_in_executor(None, gzip_bytes, body, self.level)
+            else:
+                compressed = gzip_bytes(body, self.level)
+            if key is not None and self.cache is not None:
+                self.cache.put(key, compressed)
+        self.compressed += 1
+        self.bytes_in += len(body)
+        self.bytes_out += len(compressed)
+        return compressed
+
+    def snapshot(self):
+        return {
+            "enabled": self.enabled,
+            "level": self.level,
+            "minimum_size": self.minimum_size,
+            "compressed": self.compressed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+            "cache": self.cache.snapshot() if self.cache is not None else None,
+        }
+
+
+class CompressionMiddleware:
+    """Middleware ASGI que comprime as respostas conforme o ResponseCompressor"""
+
+    def __init__(self, app, compressor):
+        self.app = app
+        self.compressor = compressor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.compressor.enabled or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = ""
+        for name, value in scope.get("headers", ()):
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        if not accepts_gzip(accept_encoding):
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = {name.lower(): value for name, value in message.get("headers", ())}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                if b"content-encoding" in headers or not is_compressible(content_type):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.compressor.minimum_size:
+                # Streaming (o corpo não está inteiro aqui) ou pequeno demais
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+            await self._send_compressed(scope, start_message, body, send)
+
+        await self.app(scope, receive, compressing_send)
+
+    async def _send_compressed(self, scope, start_message, body, send):
+        headers = [(name, value) for name, value in start_message.get("headers", ())
+                   if name.lower() not in (b"content-length", b"etag", b"vary")]
+        original = dict((name.lower(), value) for name, value in start_message.get("headers", ()))
+        etag = original.get(b"etag")
+
+        # ETag forte numa resposta 200: representação estática, vale guardar comprimida
+        key = None
+        if etag and not etag.startswith(b"W/") and start_message["status"] == 200:
+            key = (scope["path"], etag)
+        compressed = await self.compressor.compress(key, body)
+
+        vary = original.get(b"vary")
+        headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+        if etag:
+            headers.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+        headers.append((b"content-encoding", b"gzip"))
+        headers.append((b"content-length", str(len(compressed)).encode()))
+        await send({**start_message, "headers": headers})
+        await send({"type": "http.response.body", "body": compressed})
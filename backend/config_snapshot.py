@@ -0,0 +1,344 @@
+"""
+Snapshots imutáveis da configuração dos fundos com recarga a quente.
+
+`ConfigStore` lê `fundos_criterios.json`, valida e compila as estruturas
+derivadas (índice de elegibilidade, tabelas de validação, respostas
+pré-serializadas) e publica tudo de uma vez como um `ConfigSnapshot`
+imutável. Leitores só pegam a referência do snapshot atual; uma recarga
+monta o próximo snapshot por fora e troca a referência atomicamente.
+Arquivos inválidos são rejeitados e o último snapshot válido continua ativo.
+Recargas concorrentes do mesmo conteúdo do arquivo (watcher, edições do
+painel, recarga manual) são agrupadas numa só (single-flight).
+
+`ConfigWatcher` detecta alterações no arquivo via inotify (Linux), com
+fallback para polling de mtime.
+"""
+import ctypes
+import ctypes.util
+import hashlib
+import logging
+import os
+import select
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict
+
+from serialization import loads
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class FrozenDict(dict):
+    """dict somente leitura (continua serializável por orjson/jsonable_encoder)"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Snapshot de configuração é somente leitura")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+
+def freeze(value):
+    """Converte recursivamente dicts em FrozenDict e listas em tuplas"""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Cópia mutável (dict/list) de uma estrutura congelada"""
+    if isinstance(value, dict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(v) for v in value]
+    return value
+
+
+EMPTY_CONFIG = {"fundos": {}, "opcoes_formulario": {}, "configuracao": {}}
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Versão imutável da configuração e de tudo que é derivado dela"""
+
+    version: str
+    generation: int
+    loaded_at: str
+    config: FrozenDict
+    eligibility: Any = None
+    ranker: Any = None
+    router: Any = None
+    transforms: Any = None
+    catalog: Any = None
+    validators: Dict[str, frozenset] = field(default_factory=dict)
+    responses: Dict[str, bytes] = field(default_factory=dict)
+    opcoes_etag: str = ""
+
+    @property
+    def fundos(self):
+        return self.config.get("fundos", FrozenDict())
+
+    @property
+    def opcoes_formulario(self):
+        return self.config.get("opcoes_formulario", FrozenDict())
+
+    @property
+    def configuracao(self):
+        return self.config.get("configuracao", FrozenDict())
+
+
+def file_signature(path):
+    """(mtime_ns, tamanho, inode) do arquivo, ou None se não existir"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class ConfigStore:
+    """Mantém o snapshot atual e faz a recarga validada/atômica.
+
+    `compile_fn(config, version)` recebe o dict recém-lido e a versão (hash do
+    conteúdo, None para a configuração vazia de fallback), deve levantar
+    ValueError se a configuração for inválida e retorna um dict com os campos
+    derivados do snapshot (`eligibility`, `validators`, `responses`...).
+    `on_publish(snapshot)`, se informado, é chamado a cada snapshot publicado
+    (na thread que fez a recarga, ainda com o lock).
+    """
+
+    def __init__(self, path_fn, compile_fn, on_publish=None):
+        self.path_fn = path_fn
+        self.compile_fn = compile_fn
+        self.on_publish = on_publish
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._signature = None
+        self._generation = 0
+        self.last_error = None
+        self.reloads = 0
+        self.rejected = 0
+        self.reload_flight = SingleFlight()
+
+    def current(self):
+        """Snapshot ativo (carrega na primeira chamada)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.reload()
+            snapshot = self._snapshot
+        return snapshot
+
+    def changed(self):
+        """True se o arquivo mudou desde o último carregamento"""
+        return file_signature(self.path_fn()) != self._signature
+
+    def reload(self, force=False):
+        """Relê o arquivo; retorna True se um novo snapshot foi publicado.
+
+        Quem chama enquanto uma recarga da mesma assinatura do arquivo está em
+        andamento espera e recebe o resultado dela; um arquivo alterado depois
+        (outra assinatura) ganha uma recarga própria.
+        """
+        return self.reload_flight.do((file_signature(self.path_fn()), force), self._reload, force)
+
+    def _reload(self, force):
+        with self._lock:
+            path = self.path_fn()
+            signature = file_signature(path)
+            if not force and self._snapshot is not None and signature == self._signature:
+                return False
+
+            try:
+                with open(path, "rb") as f:
+                    raw = f.read()
+                config = loads(raw) if raw.strip() else None
+                if not isinstance(config, dict):
+                    raise ValueError("o arquivo não contém um objeto JSON")
+                version = hashlib.sha256(raw).hexdigest()[:16]
+            except FileNotFoundError:
+                logger.error(f"Arquivo fundos_criterios.json não encontrado em: {path}")
+                config, version = dict(EMPTY_CONFIG), "missing"
+            except ValueError as e:
+                return self._reject(signature, f"JSON inválido: {e}")
+
+            if self._snapshot is not None and version == self._snapshot.version:
+                self._signature = signature
+                self.last_error = None
+                return False
+
+            try:
+                derived = self.compile_fn(config, None if version == "missing" else version)
+            except ValueError as e:
+                return self._reject(signature, str(e))
+
+            self._generation += 1
+            self._publish(ConfigSnapshot(
+                version=version,
+                generation=self._generation,
+                loaded_at=datetime.utcnow().isoformat(),
+                config=freeze(config),
+                **derived,
+            ))
+            self._signature = signature
+            self.last_error = None
+            self.reloads += 1
+            logger.info(f"Configuração carregada: versão {version}, {len(config.get('fundos', {}))} fundos")
+            return True
+
+    def _reject(self, signature, error):
+        # Mantém o último snapshot válido; só marca a assinatura para não
+        # revalidar o mesmo conteúdo inválido a cada verificação
+        self._signature = signature
+        self.last_error = error
+        self.rejected += 1
+        if self._snapshot is None:
+            self._generation += 1
+            self._publish(ConfigSnapshot(
+                version="invalid",
+                generation=self._generation,
+                loaded_at=datetime.utcnow().isoformat(),
+                config=freeze(EMPTY_CONFIG),
+                **self.compile_fn(dict(EMPTY_CONFIG), None),
+            ))
+        logger.error(f"Configuração rejeitada, mantendo a versão anterior: {error}")
+        return False
+
+    def _publish(self, snapshot):
+        self._snapshot = snapshot
+        if self.on_publish is not None:
+            try:
+                self.on_publish(snapshot)
+            except Exception:
+                logger.exception("Falha no on_publish do snapshot de configuração")
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "generation": snapshot.generation if snapshot else 0,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "reloads": self.reloads,
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+            "reload_coalescing": self.reload_flight.snapshot(),
+        }
+
+
+# Constantes do inotify (linux/inotify.h)
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+
+class _Inotify:
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc não encontrada")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+
+    def watch(self, path, mask):
+        return self._libc.inotify_add_watch(self.fd, os.fsencode(str(path)), mask) >= 0
+
+    def drain(self):
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ConfigWatcher:
+    """Thread que recarrega o ConfigStore quando o arquivo muda.
+
+    Observa o arquivo e o diretório via inotify (o arquivo em si cobre bind
+    mounts de arquivo único; o diretório cobre editores que substituem o
+    arquivo). Sem inotify, ou como rede de segurança, compara o mtime a cada
+    `poll_interval` segundos.
+    """
+
+    def __init__(self, store, poll_interval=2.0, debounce=0.2):
+        self.store = store
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.mode = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _check(self):
+        if self.store.changed():
+            try:
+                self.store.reload()
+            except Exception as e:  # nunca derrubar a thread do watcher
+                logger.error(f"Erro ao recarregar configuração: {e}")
+
+    def _run(self):
+        inotify = None
+        try:
+            inotify = _Inotify()
+            self.mode = "inotify"
+        except (OSError, AttributeError) as e:
+            logger.info(f"inotify indisponível ({e}); usando polling de mtime")
+            self.mode = "polling"
+
+        try:
+            while not self._stop.is_set():
+                if inotify is None:
+                    self._stop.wait(self.poll_interval)
+                    self._check()
+                    continue
+
+                path = self.store.path_fn()
+                inotify.watch(path, _IN_MODIFY | _IN_CLOSE_WRITE | _IN_ATTRIB | _IN_DELETE_SELF | _IN_MOVE_SELF)
+                inotify.watch(os.path.dirname(str(path)) or ".", _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE)
+                readable, _, _ = select.select([inotify.fd], [], [], self.poll_interval)
+                if readable:
+                    # Agrupa a rajada de eventos de uma mesma gravação
+                    time.sleep(self.debounce)
+                    inotify.drain()
+                self._check()
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+    def status(self):
+        return {
+            "mode": self.mode,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "poll_interval": self.poll_interval,
+        }
@@ -0,0 +1,265 @@
+"""
+Índice compilado de elegibilidade dos fundos.
+
+Cada fundo ativo recebe uma posição de bit. Para cada dimensão dos critérios
+o índice guarda, por valor aceito, a máscara dos fundos que aceitam aquele
+valor, mais a máscara dos fundos que aceitam qualquer valor (lista vazia ou
+"todos"). Avaliar um lead vira alguns lookups em dict e operações OR/AND em
+inteiros, em vez de percorrer os critérios de todos os fundos.
+
+`Ranker` ordena os fundos por um score ponderado (aceitação explícita vale
+mais que curinga, mais a prioridade do tipo do fundo) e `near_miss_mask`
+separa os "quase elegíveis", reprovados em exatamente uma dimensão.
+"""
+
+# Ordem de avaliação; o motivo de rejeição é a primeira dimensão que falha
+DIMENSIONS = (
+    "situacao_empresa",
+    "faturamento_renda",
+    "regioes",
+    "segmentos",
+    "razoes",
+    "garantias",
+    "tipo_imovel",
+)
+
+WILDCARD = "todos"
+
+# tipo_imovel nunca tratou "todos" como curinga: só a lista vazia aceita tudo
+_NO_WILDCARD = frozenset({"tipo_imovel"})
+
+
+class EligibilityIndex:
+    """Máscaras de bits por dimensão/valor, compiladas a partir de `fundos`"""
+
+    def __init__(self, fundos):
+        self.fund_ids = tuple(fid for fid, data in fundos.items() if data.get("ativo", True))
+        self.names = tuple(fundos[fid].get("nome", fid) for fid in self.fund_ids)
+        self.tipos = tuple(fundos[fid].get("tipo") for fid in self.fund_ids)
+        self.positions = {fid: pos for pos, fid in enumerate(self.fund_ids)}
+        self.all_mask = (1 << len(self.fund_ids)) - 1
+        self.accepts_all = {}
+        self.by_value = {}
+        # Valores aceitos por fundo e dimensão, para explicar reprovações
+        self.accepted = tuple(
+            {dimension: tuple(fundos[fid].get("criterios", {}).get(dimension) or ()) for dimension in DIMENSIONS}
+            for fid in self.fund_ids
+        )
+
+        for dimension in DIMENSIONS:
+            wildcard = 0
+            by_value = {}
+            for pos, fid in enumerate(self.fund_ids):
+                accepted = fundos[fid].get("criterios", {}).get(dimension) or ()
+                bit = 1 << pos
+                if not accepted or (dimension not in _NO_WILDCARD and WILDCARD in accepted):
+                    wildcard |= bit
+                    continue
+                for value in accepted:
+                    by_value[value] = by_value.get(value, 0) | bit
+            self.accepts_all[dimension] = wildcard
+            self.by_value[dimension] = by_value
+
+    def __len__(self):
+        return len(self.fund_ids)
+
+    def explicit_mask(self, dimension, values):
+        """Fundos que listam explicitamente ao menos um de `values` na dimensão"""
+        mask = 0
+        by_value = self.by_value[dimension]
+        for value in values:
+            mask |= by_value.get(value, 0)
+        return mask
+
+    def dimension_mask(self, dimension, values):
+        """Fundos que aceitam ao menos um de `values` na dimensão"""
+        return self.accepts_all[dimension] | self.explicit_mask(dimension, values)
+
+    def explicit_masks(self, lead_values):
+        """Máscara de aceitação explícita por dimensão aplicável ao lead"""
+        return {
+            dimension: self.explicit_mask(dimension, lead_values[dimension])
+            for dimension in DIMENSIONS
+            if dimension in lead_values
+        }
+
+    def masks(self, lead_values, explicit=None):
+        """Máscara de aprovação por dimensão.
+
+        `lead_values` mapeia dimensão -> sequência de valores do lead; uma
+        dimensão ausente não se aplica ao lead e aprova todos os fundos.
+        """
+        if explicit is None:
+            explicit = self.explicit_masks(lead_values)
+        return {
+            dimension: (
+                self.accepts_all[dimension] | explicit[dimension]
+                if dimension in explicit else self.all_mask
+            )
+            for dimension in DIMENSIONS
+        }
+
+    def evaluate(self, lead_values, masks=None):
+        """(máscara dos elegíveis, {posição do fundo: primeira dimensão reprovada})"""
+        if masks is None:
+            masks = self.masks(lead_values)
+        remaining = self.all_mask
+        first_failure = {}
+        for dimension, mask in masks.items():
+            failed = remaining & ~mask
+            for pos in iter_bits(failed):
+                first_failure[pos] = dimension
+            remaining &= mask
+        return remaining, first_failure
+
+    def failure_masks(self, masks):
+        """Máscara das dimensões reprovadas por fundo (bit i = DIMENSIONS[i]).
+
+        Mesmo percurso de `evaluate`, mas registrando todas as dimensões
+        reprovadas em vez de só a primeira; 0 significa elegível.
+        """
+        failures = [0] * len(self.fund_ids)
+        for i, dimension in enumerate(DIMENSIONS):
+            bit = 1 << i
+            failed = self.all_mask & ~masks[dimension]
+            while failed:
+                low = failed & -failed
+                failures[low.bit_length() - 1] |= bit
+                failed ^= low
+        return failures
+
+    def ids(self, mask):
+        return [self.fund_ids[pos] for pos in iter_bits(mask)]
+
+
+def near_miss_mask(index, masks):
+    """Fundos reprovados em exatamente uma dimensão (contagem bit a bit)"""
+    failed_once = failed_twice = 0
+    for mask in masks.values():
+        failed = index.all_mask & ~mask
+        failed_twice |= failed_once & failed
+        failed_once |= failed
+    return failed_once & ~failed_twice
+
+
+# Pesos padrão do ranking; sobrescritos por configuracao.ranking
+DEFAULT_WEIGHTS = {
+    "situacao_empresa": 1.0,
+    "faturamento_renda": 1.5,
+    "regioes": 1.0,
+    "segmentos": 2.0,
+    "razoes": 1.5,
+    "garantias": 2.0,
+    "tipo_imovel": 1.0,
+}
+DEFAULT_TIPO_PRIORITY = {"constitucional": 3.0, "desenvolvimento": 2.0, "privado": 1.0, "pf": 1.0}
+DEFAULT_WILDCARD_FACTOR = 0.5
+DEFAULT_TOP_K = 3
+
+
+class Ranker:
+    """Score 0-100 de cada (lead, fundo), compilado a partir de configuracao.ranking.
+
+    Por dimensão aplicável ao lead: `peso` se o fundo lista o valor do lead,
+    `peso * peso_curinga` se aceita qualquer valor, 0 se reprova. Soma-se a
+    prioridade do tipo do fundo e normaliza pelo máximo possível.
+
+    O score é calculado sobre as máscaras, não fundo a fundo: os candidatos
+    ficam agrupados por score parcial (`{total: máscara}`, começando pela
+    prioridade do tipo) e cada termo (máscara, pontos) divide os grupos com
+    um AND. O custo depende do número de termos e de scores distintos, não
+    do número de fundos; os bits só são percorridos uma vez, no final.
+    """
+
+    def __init__(self, index, ranking=None):
+        ranking = ranking or {}
+        if not isinstance(ranking, dict):
+            raise ValueError("configuracao.ranking deve ser um objeto")
+        try:
+            weights = {**DEFAULT_WEIGHTS, **{k: float(v) for k, v in ranking.get("pesos", {}).items()}}
+            priority = {**DEFAULT_TIPO_PRIORITY, **{k: float(v) for k, v in ranking.get("prioridade_tipo", {}).items()}}
+            self.wildcard_factor = float(ranking.get("peso_curinga", DEFAULT_WILDCARD_FACTOR))
+            self.top_k = int(ranking.get("top_k", DEFAULT_TOP_K))
+        except (TypeError, ValueError, AttributeError) as e:
+            raise ValueError(f"configuracao.ranking inválido: {e}")
+
+        unknown = set(weights) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"configuracao.ranking.pesos: dimensões desconhecidas {sorted(unknown)}")
+        invalid = sorted(k for k, v in {**weights, **priority}.items() if not 0 <= v < float("inf"))
+        if invalid:
+            raise ValueError(f"configuracao.ranking: pesos e prioridades devem ser números >= 0 ({invalid})")
+        if not 0 <= self.wildcard_factor <= 1:
+            raise ValueError("configuracao.ranking.peso_curinga deve estar entre 0 e 1")
+        if self.top_k < 1:
+            raise ValueError("configuracao.ranking.top_k deve ser >= 1")
+
+        self.index = index
+        self.weights = weights
+        # Fundos por prioridade do tipo: ponto de partida dos grupos de score
+        self.priority_masks = {}
+        for pos, tipo in enumerate(index.tipos):
+            base = priority.get(tipo, 0.0)
+            self.priority_masks[base] = self.priority_masks.get(base, 0) | (1 << pos)
+        self.max_priority = max(priority.values(), default=0.0)
+
+    def score_masks(self, candidates, explicit):
+        """{score: máscara dos fundos de `candidates` com esse score}"""
+        index = self.index
+        # Um termo (máscara, pontos) por dimensão e tipo de aceitação
+        terms = []
+        max_score = self.max_priority
+        for dimension, explicit_mask in explicit.items():
+            weight = self.weights[dimension]
+            max_score += weight
+            terms.append((explicit_mask, weight))
+            terms.append((index.accepts_all[dimension] & ~explicit_mask, weight * self.wildcard_factor))
+        scale = 100.0 / max_score if max_score else 0.0
+
+        groups = {}
+        for base, mask in self.priority_masks.items():
+            if candidates & mask:
+                groups[base] = groups.get(base, 0) | (candidates & mask)
+        for mask, points in terms:
+            if not points or not mask:
+                continue
+            split = {}
+            for total, group in groups.items():
+                hit = group & mask
+                if hit:
+                    split[total + points] = split.get(total + points, 0) | hit
+                if group ^ hit:
+                    split[total] = split.get(total, 0) | (group ^ hit)
+            groups = split
+
+        scores = {}
+        for total, group in groups.items():
+            score = round(total * scale, 2)
+            scores[score] = scores.get(score, 0) | group
+        return scores
+
+    def scores(self, candidates, explicit):
+        """{posição: score} para os fundos em `candidates`"""
+        return {
+            pos: score
+            for score, mask in self.score_masks(candidates, explicit).items()
+            for pos in iter_bits(mask)
+        }
+
+    def rank(self, candidates, explicit):
+        """Posições de `candidates` ordenadas por score (desc) e ordem da configuração"""
+        by_score = self.score_masks(candidates, explicit)
+        return [(pos, score) for score in sorted(by_score, reverse=True) for pos in iter_bits(by_score[score])]
+
+
+def failed_dimensions(failure_mask):
+    """Dimensões (na ordem de avaliação) de uma máscara de `failure_masks`"""
+    return [DIMENSIONS[i] for i in iter_bits(failure_mask)]
+
+
+def iter_bits(mask):
+    """Posições dos bits ligados, em ordem crescente"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
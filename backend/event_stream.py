@@ -0,0 +1,224 @@
+"""
+Fan-out de eventos para clientes Server-Sent Events (SSE).
+
+`EventBroadcaster` guarda os últimos eventos num ring buffer (para retomar
+via Last-Event-ID) e entrega cada evento novo a filas limitadas, uma por
+assinante. `publish` nunca bloqueia: um assinante lento cuja fila enche é
+desconectado com um evento `overflow`, e o EventSource do navegador
+reconecta e retoma a partir do último id recebido.
+
+O assinante só existe enquanto o gerador de `stream` roda: é registrado
+na primeira iteração e removido quando o gerador termina, então uma
+resposta que nunca começa (cliente que desconectou antes) não ocupa vaga.
+
+Os eventos e os ids ficam na memória do processo. Com vários workers,
+`EventRelay` repassa aos assinantes de cada worker os eventos que os
+outros gravaram no backend de estado compartilhado; um cliente que
+reconecta em outro worker recebe `reset` e recarrega a lista.
+"""
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+from serialization import dumps
+
+_OVERFLOW = object()
+
+
+class _Subscriber:
+    __slots__ = ("queue", "loop", "dropped")
+
+    def __init__(self, loop, maxsize):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.loop = loop
+        self.dropped = False
+
+
+class EventBroadcaster:
+    def __init__(self, ring_size=500, queue_size=100, heartbeat=15.0, max_subscribers=50):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self._pid = None
+        self._stream_id = None
+        self._ids = itertools.count(1)
+        self._ring = deque(maxlen=ring_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.overflows = 0
+
+    @property
+    def stream_id(self):
+        """Prefixo dos ids, por processo: ids de outro worker (o broadcaster é criado
+        no mestre, antes do fork) ou de outra execução não são confundidos com os atuais"""
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid = pid
+            self._stream_id = f"{pid:x}{int(time.time()):x}"
+        return self._stream_id
+
+    def publish(self, event, data):
+        """Registra o evento e o entrega aos assinantes (seguro a partir de qualquer thread)"""
+        payload = dumps(data)
+        with self._lock:
+            seq = next(self._ids)
+            item = (seq, event, payload)
+            self._ring.append(item)
+            subscribers = list(self._subscribers)
+            self.published += 1
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        for sub in subscribers:
+            if running is sub.loop:
+                self._offer(sub, item)
+            else:
+                try:
+                    sub.loop.call_soon_threadsafe(self._offer, sub, item)
+                except RuntimeError:  # loop já encerrado
+                    pass
+
+    def _offer(self, sub, item):
+        if sub.dropped:
+            return
+        try:
+            sub.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Fila cheia: descarta o conteúdo e avisa o cliente para reconectar
+            sub.dropped = True
+            self.overflows += 1
+            while not sub.queue.empty():
+                sub.queue.get_nowait()
+            sub.queue.put_nowait(_OVERFLOW)
+
+    def _event_id(self, seq):
+        return f"{self.stream_id}-{seq}"
+
+    def _backlog(self, last_event_id):
+        """Eventos a reenviar para um cliente que informou `last_event_id`"""
+        if not last_event_id:
+            return [], False
+        stream_id, _, seq = last_event_id.rpartition("-")
+        with self._lock:
+            ring = list(self._ring)
+        if stream_id != self.stream_id or not seq.isdigit():
+            return ring, True
+        seq = int(seq)
+        gap = bool(ring) and ring[0][0] > seq + 1
+        return [item for item in ring if item[0] > seq], gap
+
+    def format(self, item):
+        seq, event, payload = item
+        return b"id: " + self._event_id(seq).encode() + b"\nevent: " + event.encode() + b"\ndata: " + payload + b"\n\n"
+
+    def has_capacity(self):
+        with self._lock:
+            return len(self._subscribers) < self.max_subscribers
+
+    def has_subscribers(self):
+        with self._lock:
+            return bool(self._subscribers)
+
+    def subscribe(self):
+        """Registra um assinante no loop atual; RuntimeError se o limite foi atingido"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise RuntimeError("limite de assinantes atingido")
+            sub = _Subscriber(loop, self.queue_size)
+            self._subscribers.add(sub)
+        return sub
+
+    async def stream(self, last_event_id=None):
+        """Gerador assíncrono de bytes SSE; encerra quando o cliente desconecta"""
+        try:
+            sub = self.subscribe()
+        except RuntimeError:
+            # Lotou entre a checagem do handler e o início da resposta: o
+            # EventSource tenta de novo depois do `retry`
+            yield b"retry: 10000\n\n"
+            return
+        try:
+            # O backlog é lido depois do registro: nada publicado entre os dois se perde
+            backlog, gap = self._backlog(last_event_id)
+            yield b"retry: 3000\n\n"
+            if gap:
+                # Parte dos eventos já saiu do ring buffer; o cliente deve recarregar a lista
+                yield b"event: reset\ndata: {}\n\n"
+            sent = 0
+            for item in backlog:
+                yield self.format(item)
+                sent = item[0]
+            while True:
+                try:
+                    item = await asyncio.wait_for(sub.queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if item is _OVERFLOW:
+                    yield b"event: overflow\ndata: {}\n\n"
+                    return
+                if item[0] <= sent:  # já enviado no backlog
+                    continue
+                yield self.format(item)
+        finally:
+            with self._lock:
+                self._subscribers.discard(sub)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "buffered": len(self._ring),
+                "published": self.published,
+                "overflows": self.overflows,
+            }
+
+
+class EventRelay:
+    """Repassa ao broadcaster local os eventos gravados por outros workers.
+
+    `fetch()` lê do estado compartilhado a lista de eventos (mais recente
+    primeiro), cada um com `id` único e `origin` (o `stream_id` do processo
+    que o gerou). `poll`, chamado periodicamente, publica localmente os itens
+    novos de outras origens, do mais antigo para o mais novo. Sem assinantes
+    conectados não lê nada; ao voltar a ter, a primeira leitura só marca o
+    que já existia (o painel carrega o histórico pela listagem).
+    """
+
+    def __init__(self, broadcaster, event, fetch, window=1000):
+        self.broadcaster = broadcaster
+        self.event = event
+        self.fetch = fetch
+        self._seen = deque(maxlen=window)
+        self._seen_ids = set()
+        self._primed = False
+        self.relayed = 0
+
+    def _mark(self, item_id):
+        if len(self._seen) == self._seen.maxlen:
+            self._seen_ids.discard(self._seen[0])
+        self._seen.append(item_id)
+        self._seen_ids.add(item_id)
+
+    def poll(self):
+        """Publica os eventos novos de outros workers; retorna quantos foram repassados"""
+        if not self.broadcaster.has_subscribers():
+            self._primed = False
+            return 0
+        items = [item for item in self.fetch() if item.get("id") and item["id"] not in self._seen_ids]
+        primed, self._primed = self._primed, True
+        origin = self.broadcaster.stream_id
+        relayed = 0
+        for item in reversed(items):
+            self._mark(item["id"])
+            if primed and item.get("origin") != origin:
+                self.broadcaster.publish(self.event, item)
+                relayed += 1
+        self.relayed += relayed
+        return relayed
@@ -0,0 +1,128 @@
+"""
+Catálogo de fundos para as listagens administrativas.
+
+Compilado uma vez por snapshot da configuração: ids em ordem alfabética
+(a ordem estável usada pelo cursor), o JSON pré-serializado e o ETag de
+cada fundo, e máscaras de bits por filtro (tipo, ativo, região e segmento
+aceitos). Uma página filtrada é um AND de máscaras seguido da leitura dos
+próximos `limit` bits a partir do cursor.
+"""
+import base64
+import binascii
+import hashlib
+from bisect import bisect_right
+
+from eligibility import WILDCARD, iter_bits
+from serialization import dumps
+
+# Campos aceitos em `fields` (projeção); "criterios.<dimensão>" também vale
+FUND_FIELDS = ("nome", "tipo", "ativo", "criterios")
+
+
+def make_etag(data):
+    return '"' + hashlib.sha256(data).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Compara o header If-None-Match com o ETag (comparação fraca, RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def encode_cursor(fund_id):
+    return base64.urlsafe_b64encode(fund_id.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Id do último fundo da página anterior; ValueError se o cursor for inválido"""
+    try:
+        return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("cursor inválido")
+
+
+def parse_fields(fields):
+    """'nome,criterios.regioes' -> tupla de campos; ValueError se algum for desconhecido"""
+    parsed = tuple(f.strip() for f in fields.split(",") if f.strip())
+    for name in parsed:
+        top, dot, sub = name.partition(".")
+        if top not in FUND_FIELDS or (dot and (top != "criterios" or not sub)):
+            raise ValueError(f"campo desconhecido: {name}")
+    return parsed
+
+
+def project(fundo, fields):
+    """Cópia de `fundo` só com os campos pedidos"""
+    result = {}
+    for name in fields:
+        top, _, sub = name.partition(".")
+        if not sub:
+            if top in fundo:
+                result[top] = fundo[top]
+            continue
+        criterios = fundo.get("criterios", {})
+        if sub in criterios:
+            result.setdefault("criterios", {})[sub] = criterios[sub]
+    return result
+
+
+class FundCatalog:
+    def __init__(self, fundos):
+        self.ids = tuple(sorted(fundos))
+        self.all_mask = (1 << len(self.ids)) - 1
+        self.fund_json = {}
+        self.fund_etags = {}
+        self.tipo_masks = {}
+        self.ativo_mask = 0
+        self.value_masks = {"regioes": {}, "segmentos": {}}
+        self.wildcard_masks = {"regioes": 0, "segmentos": 0}
+
+        for pos, fund_id in enumerate(self.ids):
+            fundo = fundos[fund_id]
+            bit = 1 << pos
+            body = dumps(fundo)
+            self.fund_json[fund_id] = body
+            self.fund_etags[fund_id] = make_etag(body)
+            tipo = fundo.get("tipo")
+            self.tipo_masks[tipo] = self.tipo_masks.get(tipo, 0) | bit
+            if fundo.get("ativo", True):
+                self.ativo_mask |= bit
+            criterios = fundo.get("criterios", {})
+            for dimension, by_value in self.value_masks.items():
+                accepted = criterios.get(dimension) or ()
+                if not accepted or WILDCARD in accepted:
+                    self.wildcard_masks[dimension] |= bit
+                    continue
+                for value in accepted:
+                    by_value[value] = by_value.get(value, 0) | bit
+
+    def filter_mask(self, tipo=None, ativo=None, regiao=None, segmento=None):
+        mask = self.all_mask
+        if tipo is not None:
+            mask &= self.tipo_masks.get(tipo, 0)
+        if ativo is not None:
+            mask &= self.ativo_mask if ativo else self.all_mask & ~self.ativo_mask
+        if regiao is not None:
+            mask &= self.wildcard_masks["regioes"] | self.value_masks["regioes"].get(regiao, 0)
+        if segmento is not None:
+            mask &= self.wildcard_masks["segmentos"] | self.value_masks["segmentos"].get(segmento, 0)
+        return mask
+
+    def page(self, mask, after=None, limit=50):
+        """(ids da página, id para o próximo cursor ou None, total filtrado)"""
+        total = bin(mask).count("1")
+        if after is not None:
+            start = bisect_right(self.ids, after)
+            mask = mask >> start << start
+        page_ids = []
+        next_id = None
+        for pos in iter_bits(mask):
+            if len(page_ids) == limit:
+                next_id = page_ids[-1]
+                break
+            page_ids.append(self.ids[pos])
+        return page_ids, next_id, total
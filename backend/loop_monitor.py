@@ -0,0 +1,276 @@
+"""
+Monitor do atraso (lag) do event loop e detector de chamadas bloqueantes.
+
+Um heartbeat no próprio loop dorme `interval` segundos e mede quanto acordou
+atrasado: esse atraso é o tempo em que o loop ficou ocupado sem devolver o
+controle (código síncrono num handler `async def`, I/O bloqueante, CPU).
+As medidas vão para um histograma de latência.
+
+O heartbeat não consegue observar o bloqueio enquanto ele acontece (o loop
+está parado), então uma thread watchdog confere o último batimento: passado
+`threshold` sem batimento, ela captura a pilha da thread do loop naquele
+instante, isto é, a pilha de quem está bloqueando. Como no SamplingProfiler,
+o LoopMonitorMiddleware marca o frame de cada requisição, e a pilha
+capturada é atribuída à rota cujo frame estiver nela.
+
+Modo estrito (LOOP_MONITOR_STRICT=1, para testes): a requisição que
+bloqueou o loop termina com LoopBlockedError depois de responder; com o
+TestClient (raise_server_exceptions=True) o teste falha apontando a rota e
+a pilha.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Limites superiores (ms) dos buckets do histograma; o último bucket é +Inf
+LAG_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class LoopBlockedError(RuntimeError):
+    """Levantada no modo estrito quando uma requisição bloqueou o event loop"""
+
+
+class LagHistogram:
+    def __init__(self, bounds=LAG_BUCKETS_MS):
+        self.bounds = bounds
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms):
+        for pos, bound in enumerate(self.bounds):
+            if value_ms <= bound:
+                self.counts[pos] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def quantile(self, q):
+        """Limite superior do bucket que contém o quantil `q` (estimativa)"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for pos, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.bounds[pos] if pos < len(self.bounds) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(list(self.bounds) + ["+Inf"], self.counts):
+            cumulative += count
+            buckets.append({"le": bound, "count": cumulative})
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class LoopLagMonitor:
+    """Heartbeat no event loop + watchdog em thread que captura a pilha dos bloqueios"""
+
+    def __init__(self, interval=0.1, threshold=0.1, strict=False, history=50, max_depth=40):
+        self.interval = interval
+        self.threshold = threshold
+        self.strict = strict
+        self.max_depth = max_depth
+        self.histogram = LagHistogram()
+        self.stalls = deque(maxlen=history)
+        self.stall_count = 0
+        self.violations = 0
+
+        self._lock = threading.Lock()
+        self._requests = {}  # id(frame do middleware) -> requisição em andamento
+        self._task = None
+        self._watchdog = None
+        self._stop = threading.Event()
+        self._loop_thread = None
+        self._last_beat = None
+        self._beat = 0
+        self._captured_beat = None
+        self._pending = None  # stall capturado aguardando o lag final
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Inicia o heartbeat no loop atual e a thread watchdog (chamar dentro do loop)"""
+        if not self.enabled or self.running:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._stop.clear()
+        if self._watchdog is None or not self._watchdog.is_alive():
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _heartbeat(self):
+        while True:
+            started = time.monotonic()
+            with self._lock:
+                self._last_beat = started
+                self._beat += 1
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - started - self.interval)
+            self._record(lag)
+
+    def _record(self, lag):
+        lag_ms = lag * 1000
+        with self._lock:
+            self.histogram.observe(lag_ms)
+            pending, self._pending = self._pending, None
+            if lag < self.threshold:
+                return
+            self.stall_count += 1
+            if pending is None:
+                # Bloqueio curto demais para o watchdog ver: registra sem pilha
+                pending = {"at": datetime.utcnow().isoformat(), "route": None, "stack": None}
+                self.stalls.append(pending)
+            pending["lag_ms"] = round(lag_ms, 1)
+            pending.pop("_request", None)
+        logger.warning(f"Event loop bloqueado por {lag_ms:.0f} ms"
+                       + (f" em {pending['route']}" if pending["route"] else "")
+                       + (f": {pending['stack'][-1]}" if pending["stack"] else ""))
+
+    # -- watchdog --------------------------------------------------------------
+
+    def _watch(self):
+        period = max(0.005, min(self.interval, self.threshold) / 4)
+        while not self._stop.wait(period):
+            with self._lock:
+                last_beat, beat = self._last_beat, self._beat
+            if last_beat is None or beat == self._captured_beat:
+                continue
+            if time.monotonic() - last_beat < self.interval + self.threshold:
+                continue
+            self._captured_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                self._capture(frame)
+            del frame
+
+    def _capture(self, frame):
+        with self._lock:
+            request = None
+            marker = None
+            f = frame
+            while f is not None:
+                request = self._requests.get(id(f))
+                if request is not None:
+                    marker = f
+                    break
+                f = f.f_back
+            stack = []
+            f = frame
+            while f is not None and f is not marker and len(stack) < self.max_depth:
+                code = f.f_code
+                stack.append(f"{code.co_filename}:{f.f_lineno} {code.co_name}")
+                f = f.f_back
+            stack.reverse()
+            stall = {
+                "at": datetime.utcnow().isoformat(),
+                "route": request["route"] if request is not None else None,
+                "stack": stack,
+                "lag_ms": None,
+            }
+            self.stalls.append(stall)
+            if request is not None:
+                request["stalls"] += 1
+                request["stack"] = stack
+            self._pending = stall
+
+    # -- requisições -----------------------------------------------------------
+
+    def enter(self, marker_frame, route):
+        request = {"route": route, "stalls": 0, "stack": None}
+        with self._lock:
+            self._requests[id(marker_frame)] = request
+        return request
+
+    def exit(self, marker_frame):
+        with self._lock:
+            self._requests.pop(id(marker_frame), None)
+
+    def reset(self):
+        with self._lock:
+            self.histogram.reset()
+            self.stalls.clear()
+            self.stall_count = 0
+            self.violations = 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "running": self.running,
+                "interval_ms": self.interval * 1000,
+                "threshold_ms": self.threshold * 1000,
+                "strict": self.strict,
+                "stalls": self.stall_count,
+                "violations": self.violations,
+                "lag": self.histogram.snapshot(),
+                "recent_stalls": [
+                    {key: value for key, value in stall.items() if not key.startswith("_")}
+                    for stall in reversed(self.stalls)
+                ],
+            }
+
+
+class LoopMonitorMiddleware:
+    """Middleware ASGI que marca o frame de cada requisição para o LoopLagMonitor"""
+
+    def __init__(self, app, monitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.monitor.running:
+            await self.app(scope, receive, send)
+            return
+
+        marker = sys._getframe()
+        request = self.monitor.enter(marker, f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.exit(marker)
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                request["route"] = f"{scope['method']} {route}"
+        if request["stalls"] and self.monitor.strict:
+            self.monitor.violations += 1
+            stack = "\n  ".join(request["stack"] or ())
+            raise LoopBlockedError(f"{request['route']} bloqueou o event loop por mais de "
+                                   f"{self.monitor.threshold * 1000:g} ms; pilha no bloqueio:\n  {stack}")
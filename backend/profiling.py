@@ -0,0 +1,199 @@
+"""
+Profiling amostral por rota, opcional e de baixo custo.
+
+Uma fração configurável das requisições (PROFILE_SAMPLE_RATE) é marcada para
+profiling. Enquanto houver requisição marcada em andamento, uma thread de
+fundo captura periodicamente as pilhas do event loop e das threads de
+executor associadas a ela, e agrega por rota no formato "collapsed stacks"
+(uma linha `rota;frame;frame N`), compatível com flamegraph.pl e speedscope.
+
+Com PROFILE_SAMPLE_RATE=0 (padrão) o middleware só repassa a requisição.
+"""
+import contextvars
+import itertools
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+_current_token = contextvars.ContextVar("profiling_token", default=None)
+
+
+class SamplingProfiler:
+    """Amostrador de pilhas agregado por rota"""
+
+    def __init__(self, sample_rate=0.0, interval=0.005, max_depth=64, max_stacks_per_route=5000):
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_depth = max_depth
+        self.max_stacks_per_route = max_stacks_per_route
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._active = {}         # token -> Counter de pilhas da requisição
+        self._marker_frames = {}  # id(frame do middleware) -> token
+        self._bound_threads = {}  # ident da thread de executor -> token
+        self._routes = {}         # rota -> {"requests": n, "samples": n, "stacks": Counter}
+        self._loop_thread = None
+        self._sampler = None
+        self._wake = threading.Event()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def should_sample(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    # -- ciclo de uma requisição amostrada ---------------------------------
+
+    def begin(self, marker_frame):
+        token = next(self._ids)
+        with self._lock:
+            self._active[token] = Counter()
+            self._marker_frames[id(marker_frame)] = token
+            self._loop_thread = threading.get_ident()
+        _current_token.set(token)
+        self._ensure_sampler()
+        return token
+
+    def end(self, token, marker_frame, route):
+        with self._lock:
+            stacks = self._active.pop(token, Counter())
+            self._marker_frames.pop(id(marker_frame), None)
+            data = self._routes.setdefault(route, {"requests": 0, "samples": 0, "stacks": Counter()})
+            data["requests"] += 1
+            data["samples"] += sum(stacks.values())
+            route_stacks = data["stacks"]
+            for stack, count in stacks.items():
+                if stack not in route_stacks and len(route_stacks) >= self.max_stacks_per_route:
+                    stack = "(truncated)"
+                route_stacks[stack] += count
+
+    def bind(self, fn):
+        """Envolve `fn` para que a thread que a executar seja atribuída à requisição atual"""
+        token = _current_token.get()
+        if token is None:
+            return fn
+
+        def bound(*args, **kwargs):
+            ident = threading.get_ident()
+            with self._lock:
+                self._bound_threads[ident] = token
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._bound_threads.pop(ident, None)
+        return bound
+
+    # -- amostragem --------------------------------------------------------
+
+    def _ensure_sampler(self):
+        with self._lock:
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+                self._sampler.start()
+        self._wake.set()
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            if not self._active:
+                self._wake.clear()
+                if not self._wake.wait(30):
+                    # Ocioso: encerra a thread; a próxima requisição amostrada cria outra
+                    with self._lock:
+                        if not self._active:
+                            self._sampler = None
+                            return
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    if ident == self._loop_thread:
+                        self._sample_loop_thread(frame)
+                    elif ident in self._bound_threads:
+                        token = self._bound_threads[ident]
+                        if token in self._active:
+                            self._active[token][self._collapse(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def _sample_loop_thread(self, frame):
+        # A pilha do loop só pertence a uma requisição amostrada se contiver o
+        # frame do middleware daquela requisição
+        f = frame
+        while f is not None:
+            token = self._marker_frames.get(id(f))
+            if token is not None:
+                if token in self._active:
+                    self._active[token][self._collapse(frame, stop=f)] += 1
+                return
+            f = f.f_back
+
+    def _collapse(self, frame, stop=None):
+        names = []
+        while frame is not None and frame is not stop and len(names) < self.max_depth:
+            code = frame.f_code
+            module = frame.f_globals.get("__name__", "?")
+            names.append(f"{module}:{code.co_name}")
+            frame = frame.f_back
+        names.reverse()
+        return ";".join(names)
+
+    # -- resultados --------------------------------------------------------
+
+    def summary(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "sample_rate": self.sample_rate,
+                "interval_ms": self.interval * 1000,
+                "in_flight": len(self._active),
+                "routes": {
+                    route: {"requests": data["requests"], "samples": data["samples"], "stacks": len(data["stacks"])}
+                    for route, data in sorted(self._routes.items())
+                },
+            }
+
+    def collapsed(self, route=None):
+        """Pilhas agregadas no formato collapsed (`rota;frame;...;frame contagem`)"""
+        lines = []
+        with self._lock:
+            for name, data in sorted(self._routes.items()):
+                if route and name != route:
+                    continue
+                for stack, count in data["stacks"].most_common():
+                    prefix = name.replace(";", ":").replace(" ", "_")
+                    lines.append(f"{prefix};{stack} {count}" if stack else f"{prefix} {count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI que marca uma fração das requisições para o SamplingProfiler"""
+
+    def __init__(self, app, profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.should_sample():
+            await self.app(scope, receive, send)
+            return
+
+        marker = sys._getframe()
+        token = self.profiler.begin(marker)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or scope.get("path", "?")
+            self.profiler.end(token, marker, f"{scope.get('method', '?')} {path}")
@@ -0,0 +1,272 @@
+"""
+Agendador de tarefas periódicas em processo (manutenção, rollups, replays).
+
+Cada job roda numa task do event loop do worker: espera o próximo horário da
+agenda (intervalo fixo ou expressão cron de 5 campos, em UTC), soma um
+atraso aleatório de até `jitter` segundos, para os workers não acordarem
+todos juntos, e executa a função: corrotinas no próprio loop, funções
+síncronas no executor padrão, para não bloquear o loop.
+
+Os horários são alinhados ao relógio (intervalo de 60 s vence nos minutos
+cheios), então todos os workers calculam o mesmo horário para cada execução.
+Jobs `exclusive` rodam uma vez por horário entre todos os workers da
+máquina: quem chega primeiro pega o lock do arquivo `<lock_dir>/<job>.lock`
+(flock) e grava nele o horário atendido; os demais encontram o lock ocupado
+ou o horário já atendido e pulam. Jobs sem agenda (`schedule=None`) só
+rodam por `run()` (execução manual), com o mesmo lock.
+"""
+import asyncio
+import calendar
+import fcntl
+import functools
+import logging
+import math
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class IntervalSchedule:
+    def __init__(self, seconds):
+        if seconds <= 0:
+            raise ValueError("Intervalo deve ser positivo")
+        self.seconds = seconds
+
+    def next_after(self, timestamp):
+        return (math.floor(timestamp / self.seconds) + 1) * self.seconds
+
+    def describe(self):
+        return f"every {self.seconds:g}s"
+
+
+def _parse_cron_field(field, low, high):
+    values = set()
+    for part in field.split(","):
+        expr, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if expr == "*":
+            start, end = low, high
+        elif "-" in expr:
+            start, end = (int(v) for v in expr.split("-", 1))
+        else:
+            start = int(expr)
+            end = high if step > 1 else start
+        if step < 1 or start < low or end > high or start > end:
+            raise ValueError(f"Campo cron inválido: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """Expressão cron `minuto hora dia mês dia-da-semana` (UTC; domingo = 0 ou 7)"""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Expressão cron deve ter 5 campos: {expression!r}")
+        self.expression = expression
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        self.weekdays = {day % 7 for day in _parse_cron_field(fields[4], 0, 7)}
+        # Como no cron: com dia e dia da semana restritos, vale qualquer um dos dois
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, timestamp):
+        moment = datetime.utcfromtimestamp(timestamp).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=5 * 366)
+        while moment < limit:
+            if moment.month not in self.months:
+                year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+                moment = datetime(year, month, 1)
+            elif not self._day_matches(moment):
+                moment = datetime(moment.year, moment.month, moment.day) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return calendar.timegm(moment.timetuple())
+        raise ValueError(f"Expressão cron nunca ocorre: {self.expression!r}")
+
+    def describe(self):
+        return f"cron {self.expression}"
+
+
+def parse_schedule(value):
+    """Número (segundos) vira IntervalSchedule; texto com 5 campos vira CronSchedule"""
+    if isinstance(value, (int, float)):
+        return IntervalSchedule(value)
+    value = str(value).strip()
+    try:
+        return IntervalSchedule(float(value))
+    except ValueError:
+        return CronSchedule(value)
+
+
+class Job:
+    def __init__(self, name, fn, schedule, jitter=0.0, exclusive=True):
+        self.name = name
+        self.fn = fn
+        self.schedule = schedule
+        self.jitter = jitter
+        self.exclusive = exclusive
+        self.running = False
+        self.next_run = None
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_run = None
+        self.last_duration = None
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_error = None
+        self.last_result = None
+
+    def snapshot(self):
+        def iso(timestamp):
+            return datetime.utcfromtimestamp(timestamp).isoformat() if timestamp else None
+
+        return {
+            "schedule": self.schedule.describe() if self.schedule is not None else "manual",
+            "exclusive": self.exclusive,
+            "running": self.running,
+            "next_run": iso(self.next_run),
+            "last_run": iso(self.last_run),
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_duration_ms": round(self.last_duration * 1000, 2) if self.last_duration is not None else None,
+            "avg_duration_ms": round(self.total_duration / self.runs * 1000, 2) if self.runs else None,
+            "max_duration_ms": round(self.max_duration * 1000, 2),
+            "last_error": self.last_error,
+            "last_result": self.last_result,
+        }
+
+
+class JobScheduler:
+    def __init__(self, lock_dir, enabled=True):
+        self.lock_dir = Path(lock_dir)
+        self.enabled = enabled
+        self.jobs = {}
+        self._tasks = []
+
+    def add(self, name, fn, schedule, jitter=0.0, exclusive=True):
+        """Registra `fn` (função ou corrotina); `schedule` em segundos ou cron, None = só manual"""
+        if name in self.jobs:
+            raise ValueError(f"Job {name} já registrado")
+        schedule = parse_schedule(schedule) if schedule is not None else None
+        if isinstance(schedule, IntervalSchedule):
+            # Jitter maior que o intervalo faria o job pular execuções
+            jitter = min(jitter, schedule.seconds / 2)
+        job = Job(name, fn, schedule, jitter=jitter, exclusive=exclusive)
+        self.jobs[name] = job
+        return job
+
+    def start(self):
+        """Cria as tasks dos jobs no loop atual (chamar dentro do loop, no lifespan)"""
+        if not self.enabled or self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._loop(job)) for job in self.jobs.values() if job.schedule is not None]
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _loop(self, job):
+        while True:
+            job.next_run = job.schedule.next_after(time.time())
+            delay = job.next_run - time.time() + random.uniform(0, job.jitter)
+            await asyncio.sleep(max(0.0, delay))
+            await self.run(job.name, slot=job.next_run)
+
+    async def run(self, name, slot=None, **kwargs):
+        """Executa o job agora; `slot` é o horário agendado (None = execução manual).
+
+        `kwargs` vão para a função do job (execuções manuais). Retorna False se
+        o job foi pulado (já rodando aqui ou com o lock em outro worker); o
+        resultado fica em `last_result`.
+        """
+        job = self.jobs[name]
+        if job.running:
+            job.skipped += 1
+            return False
+        job.running = True
+        loop = asyncio.get_running_loop()
+        lock = None
+        try:
+            if job.exclusive:
+                lock = await loop.run_in_executor(None, self._claim, job, slot or time.time())
+                if lock is None:
+                    job.skipped += 1
+                    return False
+            started = time.monotonic()
+            job.last_run = time.time()
+            try:
+                if asyncio.iscoroutinefunction(job.fn):
+                    job.last_result = await job.fn(**kwargs)
+                else:
+                    job.last_result = await loop.run_in_executor(None, functools.partial(job.fn, **kwargs))
+                job.last_error = None
+            except Exception as e:
+                job.failures += 1
+                job.last_error = str(e)
+                logger.error(f"Job {name} falhou: {e}")
+            job.last_duration = time.monotonic() - started
+            job.total_duration += job.last_duration
+            job.max_duration = max(job.max_duration, job.last_duration)
+            job.runs += 1
+            return True
+        finally:
+            job.running = False
+            if lock is not None:
+                lock.close()  # fechar o arquivo solta o flock
+
+    def _claim(self, job, slot):
+        """Lock do job entre workers: o arquivo aberto e travado, ou None se outro
+        worker está rodando o job ou já atendeu este horário"""
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        f = open(self.lock_dir / f"{job.name}.lock", "a+")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return None
+        f.seek(0)
+        try:
+            done = float(f.read().strip() or 0)
+        except ValueError:
+            done = 0.0
+        if done >= slot:
+            f.close()
+            return None
+        f.seek(0)
+        f.truncate()
+        f.write(repr(slot))
+        f.flush()
+        return f
+
+    def snapshot(self):
+        return {
+            "enabled": self.enabled,
+            "running": bool(self._tasks),
+            "lock_dir": str(self.lock_dir),
+            "worker": os.getpid(),
+            "jobs": {name: job.snapshot() for name, job in self.jobs.items()},
+        }
@@ -0,0 +1,81 @@
+"""
+Serialização JSON canônica da API.
+
+Todo payload encaminhado ao webhook é serializado uma única vez; os mesmos
+bytes são usados para o limite de tamanho, para a assinatura HMAC e para o
+corpo da requisição. Usa orjson quando disponível e cai para o json da
+biblioteca padrão caso contrário.
+
+As respostas HTTP usam `FastJSONResponse` por padrão (selecionável pela
+variável JSON_RESPONSE_ENCODER). Payloads estáticos por versão da
+configuração já vêm serializados no snapshot (`ConfigSnapshot.responses`) e
+são devolvidos como estão com `raw_json_response`.
+"""
+import hashlib
+import hmac
+import json
+import os
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+
+def dumps(obj):
+    """Serializa um objeto Python para bytes JSON (UTF-8, sem espaços)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    """Desserializa bytes/str JSON"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def model_to_json_bytes(model):
+    """Serializa um modelo Pydantic direto para bytes, sem passar por dict"""
+    return type(model).__pydantic_serializer__.to_json(model)
+
+
+def sign_payload(body, secret):
+    """Assinatura HMAC-SHA256 (hex) dos bytes exatos que serão enviados"""
+    return hmac.new(secret.encode(), body, digestmod=hashlib.sha256).hexdigest()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse renderizada com orjson (ou stdlib, se orjson não estiver instalado)"""
+
+    def render(self, content):
+        return dumps(content)
+
+
+def get_response_class():
+    """Classe de resposta padrão da aplicação conforme JSON_RESPONSE_ENCODER (orjson|stdlib)"""
+    encoder = os.getenv("JSON_RESPONSE_ENCODER", "orjson").lower()
+    if encoder == "stdlib" or orjson is None:
+        return JSONResponse
+    return FastJSONResponse
+
+
+class RawJSONResponse(Response):
+    """Resposta cujo conteúdo já são bytes JSON; aceita memoryview (ex.: fatia de
+    um snapshot mapeado em memória) sem copiar"""
+
+    media_type = "application/json"
+
+    def render(self, content):
+        if isinstance(content, (bytes, memoryview)):
+            return content
+        return super().render(content)
+
+
+def raw_json_response(body, status_code=200, headers=None):
+    """Resposta com bytes JSON já serializados (sem jsonable_encoder nem dumps)"""
+    return RawJSONResponse(content=body, status_code=status_code, headers=headers)
+
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Ponto de entrada de produção da API (multiprocesso com pré-carga e fork).
+
+O processo mestre:
+- importa `server` e pré-carrega a configuração compilada antes do fork,
+  para que os workers compartilhem essa memória por copy-on-write
+- abre o socket de escuta uma única vez e o compartilha com os workers
+- dimensiona os workers pelas CPUs realmente disponíveis (afinidade e cota
+  do cgroup do container)
+- reinicia workers que morrem e faz reload gradual (sem downtime) ao
+  receber SIGHUP; alterações em `fundos_criterios.json` já são recarregadas
+  a quente por cada worker (ConfigWatcher), e reiniciar os workers a cada
+  alteração fica opcional (--watch-config)
+- com mais de um worker, usa estado compartilhado: sem STATE_BACKEND_URL,
+  SQLite em /dev/shm; memory:// explícito é recusado
+
+Uso:
+    python serve.py run --host 0.0.0.0 --port 8000 --workers auto
+    python serve.py importtime --budget-ms 800
+"""
+import gc
+import json
+import logging
+import os
+import select
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import typer
+
+logger = logging.getLogger("serve")
+
+cli = typer.Typer(add_completion=False, help="Servidor de produção da Investiza Form API")
+
+
+@cli.callback()
+def main():
+    """Servidor de produção da Investiza Form API"""
+
+
+def available_cpus():
+    """CPUs utilizáveis pelo processo, respeitando afinidade e cota de CPU do cgroup"""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - plataformas sem sched_getaffinity
+        count = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "max 100000" ou "200000 100000"
+        limit, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            limit = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read_text())
+            period = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read_text())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota is not None:
+        count = min(count, max(1, int(quota)))
+    return max(1, count)
+
+
+def resolve_workers(workers):
+    if workers == "auto":
+        return available_cpus()
+    return max(1, int(workers))
+
+
+def default_state_backend_url():
+    """SQLite em /dev/shm (tmpfs, quando disponível), visível a todos os workers da máquina"""
+    base = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+    return "sqlite:///" + os.path.join(base, "investiza-state.db")
+
+
+def configure_state_backend(workers):
+    """Escolhe o backend de estado antes de importar `server`.
+
+    Com memory://, cada worker teria os próprios tokens, tentativas de login e
+    logs do webhook: com mais de um worker, a falta de STATE_BACKEND_URL vira
+    SQLite compartilhado e memory:// explícito impede a subida.
+    """
+    url = os.getenv("STATE_BACKEND_URL", "")
+    if workers <= 1:
+        return
+    if not url:
+        os.environ["STATE_BACKEND_URL"] = default_state_backend_url()
+        logger.info(f"{workers} workers sem STATE_BACKEND_URL: usando {os.environ['STATE_BACKEND_URL']}")
+    elif url.startswith("memory://"):
+        typer.echo(f"ERRO: STATE_BACKEND_URL={url} não é compartilhado entre os {workers} workers; "
+                   "use sqlite:////caminho.db, redis://... ou --workers 1", err=True)
+        raise typer.Exit(2)
+
+
+def detect_loop():
+    """uvloop/httptools quando instalados, asyncio/h11 caso contrário"""
+    try:
+        import uvloop  # noqa: F401
+        loop = "uvloop"
+    except ImportError:
+        loop = "asyncio"
+    try:
+        import httptools  # noqa: F401
+        http = "httptools"
+    except ImportError:
+        http = "h11"
+    return loop, http
+
+
+def bind_socket(host, port, backlog):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def config_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class Master:
+    """Supervisor dos workers pré-forkados"""
+
+    def __init__(self, app_module, sock, workers, loop, http, log_level, graceful_timeout,
+                 watch_config, watch_interval):
+        self.app_module = app_module
+        self.sock = sock
+        self.num_workers = workers
+        self.loop = loop
+        self.http = http
+        self.log_level = log_level
+        self.graceful_timeout = graceful_timeout
+        self.watch_config = watch_config
+        self.watch_interval = watch_interval
+
+        self.workers = {}  # pid -> instante de início
+        self.should_exit = False
+        self.reload_requested = False
+
+    # -- workers -----------------------------------------------------------
+
+    def spawn_worker(self):
+        """Faz o fork de um worker e espera ele sinalizar que está aceitando conexões"""
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # processo filho
+            os.close(ready_r)
+            code = 0
+            try:
+                self._run_worker(ready_w)
+            except BaseException:
+                logger.exception("Worker encerrado com erro")
+                code = 1
+            finally:
+                os._exit(code)
+
+        os.close(ready_w)
+        self.workers[pid] = time.monotonic()
+        readable, _, _ = select.select([ready_r], [], [], 30)
+        ok = bool(readable) and os.read(ready_r, 1) == b"1"
+        os.close(ready_r)
+        if not ok:
+            logger.warning(f"Worker {pid} não ficou pronto em 30s")
+        else:
+            logger.info(f"Worker {pid} pronto")
+        return pid
+
+    def _run_worker(self, ready_fd):
+        import uvicorn
+
+        for sig in (signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(sig, signal.SIG_DFL)
+
+        class WorkerServer(uvicorn.Server):
+            async def startup(self, sockets=None):
+                await super().startup(sockets=sockets)
+                os.write(ready_fd, b"1")
+                os.close(ready_fd)
+
+        config = uvicorn.Config(
+            self.app_module.app,
+            loop=self.loop,
+            http=self.http,
+            log_level=self.log_level,
+            timeout_graceful_shutdown=self.graceful_timeout,
+        )
+        WorkerServer(config).run(sockets=[self.sock])
+
+    def stop_worker(self, pid, wait=True):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            self.workers.pop(pid, None)
+            return
+        if not wait:
+            return
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while time.monotonic() < deadline:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+            if done:
+                break
+            time.sleep(0.05)
+        else:
+            logger.warning(f"Worker {pid} não encerrou a tempo; enviando SIGKILL")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.workers.pop(pid, None)
+
+    def reap(self):
+        """Recolhe workers que saíram e os substitui (se não estivermos encerrando)"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.workers:
+                started = self.workers.pop(pid)
+                if not self.should_exit:
+                    logger.warning(f"Worker {pid} saiu (status {status}); iniciando substituto")
+                    if time.monotonic() - started < 1:
+                        time.sleep(1)  # evita loop de fork se o worker falha ao subir
+                    self.spawn_worker()
+
+    def rolling_reload(self):
+        """Troca os workers um a um: sobe o novo, depois encerra o antigo"""
+        logger.info("Reload gradual dos workers")
+        # O mestre carrega a configuração nova antes do fork: os workers novos
+        # herdam o snapshot em vez de cada um reler e recompilar o arquivo
+        self.app_module.preload_config()
+        for pid in list(self.workers):
+            self.spawn_worker()
+            self.stop_worker(pid)
+
+    # -- ciclo de vida -----------------------------------------------------
+
+    def preload(self):
+        """Pré-carrega configuração e estruturas derivadas no mestre, antes do primeiro fork"""
+        self.app_module.preload_config()
+        # Move os objetos já criados para a geração permanente do GC, evitando que
+        # coletas nos filhos toquem (e copiem) essas páginas. Só na subida: a cada
+        # reload, o snapshot substituído ficaria congelado para sempre no mestre
+        gc.freeze()
+
+    def install_signals(self):
+        def on_exit(signum, frame):
+            self.should_exit = True
+
+        def on_hup(signum, frame):
+            self.reload_requested = True
+
+        signal.signal(signal.SIGTERM, on_exit)
+        signal.signal(signal.SIGINT, on_exit)
+        signal.signal(signal.SIGHUP, on_hup)
+
+    def run(self):
+        self.install_signals()
+        self.preload()
+        for _ in range(self.num_workers):
+            self.spawn_worker()
+        logger.info(f"Mestre {os.getpid()} com {self.num_workers} workers (loop={self.loop}, http={self.http})")
+
+        config_path = self.app_module.get_fundos_config_path()
+        last_mtime = config_mtime(config_path)
+        next_check = time.monotonic() + self.watch_interval
+        while not self.should_exit:
+            time.sleep(0.2)
+            self.reap()
+            if self.watch_config and time.monotonic() >= next_check:
+                next_check = time.monotonic() + self.watch_interval
+                mtime = config_mtime(config_path)
+                if mtime != last_mtime:
+                    logger.info(f"{config_path} alterado")
+                    last_mtime = mtime
+                    self.reload_requested = True
+            if self.reload_requested:
+                self.reload_requested = False
+                self.rolling_reload()
+
+        logger.info("Encerrando workers")
+        for pid in list(self.workers):
+            self.stop_worker(pid, wait=False)
+        for pid in list(self.workers):
+            self.stop_worker(pid)
+        self.sock.close()
+
+
+@cli.command()
+def run(
+    host: str = typer.Option("0.0.0.0", help="Endereço de escuta"),
+    port: int = typer.Option(int(os.getenv("PORT", "8000")), help="Porta de escuta"),
+    workers: str = typer.Option(os.getenv("WEB_CONCURRENCY", "auto"), help="Número de workers ou 'auto' (CPUs disponíveis)"),
+    backlog: int = typer.Option(2048, help="Backlog do socket de escuta"),
+    graceful_timeout: int = typer.Option(30, help="Tempo (s) para um worker terminar requisições em andamento"),
+    watch_config: bool = typer.Option(
+        False, help="Também reiniciar os workers quando fundos_criterios.json mudar (eles já recarregam a configuração a quente)"
+    ),
+    watch_interval: float = typer.Option(2.0, help="Intervalo (s) de verificação do arquivo de configuração"),
+    log_level: str = typer.Option("info", help="Nível de log"),
+    loop: Optional[str] = typer.Option(None, help="Event loop (padrão: uvloop se instalado)"),
+    http: Optional[str] = typer.Option(None, help="Parser HTTP (padrão: httptools se instalado)"),
+):
+    """Sobe a API com workers pré-forkados compartilhando o socket de escuta"""
+    logging.basicConfig(level=log_level.upper())
+    num_workers = resolve_workers(workers)
+    configure_state_backend(num_workers)
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    import server
+
+    detected_loop, detected_http = detect_loop()
+    sock = bind_socket(host, port, backlog)
+    Master(
+        server,
+        sock,
+        workers=num_workers,
+        loop=loop or detected_loop,
+        http=http or detected_http,
+        log_level=log_level,
+        graceful_timeout=graceful_timeout,
+        watch_config=watch_config,
+        watch_interval=watch_interval,
+    ).run()
+
+
+# Módulos pesados/opcionais que nunca devem ser carregados pela importação da API
+FORBIDDEN_STARTUP_MODULES = ("pandas", "numpy", "boto3", "botocore", "jq")
+
+_STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+server.preload_config()
+preloaded = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "preload_ms": (preloaded - imported) * 1000,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def parse_importtime(stderr, root="server"):
+    """Extrai (self_us, cumulativo_us, módulo) da subárvore de `root` na saída de -X importtime"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((int(self_us), int(cumulative_us), name.strip(), depth))
+
+    root_index = next((i for i, e in enumerate(entries) if e[2] == root), None)
+    if root_index is None:
+        return 0, []
+    root_depth = entries[root_index][3]
+    start = root_index
+    while start > 0 and entries[start - 1][3] > root_depth:
+        start -= 1
+    return entries[root_index][1], entries[start:root_index + 1]
+
+
+@cli.command()
+def importtime(
+    budget_ms: float = typer.Option(float(os.getenv("IMPORT_TIME_BUDGET_MS", "800")), help="Orçamento para importar server + pré-carga (ms)"),
+    runs: int = typer.Option(3, help="Execuções (usa a mediana)"),
+    top: int = typer.Option(15, help="Quantos módulos mais lentos listar"),
+):
+    """Relatório de tempo de inicialização (-X importtime); sai com erro se estourar o orçamento"""
+    backend_dir = Path(__file__).resolve().parent
+    totals, results, tree = [], [], []
+    for _ in range(max(1, runs)):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _STARTUP_PROBE % (FORBIDDEN_STARTUP_MODULES,)],
+            cwd=backend_dir, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            typer.echo(proc.stderr[-2000:], err=True)
+            raise typer.Exit(2)
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        _, tree = parse_importtime(proc.stderr)
+        results.append(result)
+        totals.append(result["import_ms"] + result["preload_ms"])
+
+    median_index = totals.index(statistics.median_low(totals))
+    result = results[median_index]
+    total = totals[median_index]
+
+    typer.echo(f"{'self (ms)':>10} {'cumul. (ms)':>12}  módulo")
+    for self_us, cumulative_us, name, depth in sorted(tree, key=lambda e: e[0], reverse=True)[:top]:
+        typer.echo(f"{self_us / 1000:>10.1f} {cumulative_us / 1000:>12.1f}  {name}")
+    typer.echo("")
+    typer.echo(f"import server: {result['import_ms']:.1f} ms | preload_config: {result['preload_ms']:.1f} ms | "
+               f"total: {total:.1f} ms (orçamento {budget_ms:.0f} ms, mediana de {len(totals)})")
+
+    failed = False
+    if result["loaded"]:
+        typer.echo(f"ERRO: módulos proibidos carregados na inicialização: {', '.join(result['loaded'])}", err=True)
+        failed = True
+    if total > budget_ms:
+        typer.echo(f"ERRO: inicialização acima do orçamento ({total:.1f} ms > {budget_ms:.0f} ms)", err=True)
+        failed = True
+    if failed:
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    cli()
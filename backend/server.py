@@ -1,12 +1,12 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, Field
+from fastapi.openapi.utils import get_openapi
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from pydantic.version import version_short as pydantic_version_short
 from typing import List, Dict, Any, Optional
 import os
-from dotenv import load_dotenv
 import logging
 from datetime import datetime, timedelta
 import uuid
@@ -15,39 +15,89 @@ import secrets
 import hashlib
 import hmac
 import time
+import re
+import asyncio
+import functools
+import tempfile
+import threading
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from admission import AdmissionClass, AdmissionController, AdmissionMiddleware
+from body_limits import BodyLimitMiddleware, parse_size
+from compression import CompressedResponseCache, CompressionMiddleware, ResponseCompressor, gzip_bytes
+from config_snapshot import ConfigStore, ConfigWatcher
+from eligibility import EligibilityIndex, Ranker, failed_dimensions, iter_bits, near_miss_mask
+from event_stream import EventBroadcaster, EventRelay
+from fund_catalog import FundCatalog, decode_cursor, encode_cursor, etag_matches, make_etag, parse_fields, project
+from loop_monitor import LoopLagMonitor, LoopMonitorMiddleware
+from profiling import ProfilingMiddleware, SamplingProfiler
+from scheduler import JobScheduler
+from serialization import dumps, get_response_class, loads, model_to_json_bytes, raw_json_response, sign_payload
+from single_flight import AsyncSingleFlight
+from snapshot_file import SnapshotDirectory, load_derived
+from state_backend import BatchedStateList, MemoryStateBackend, StateNamespace, create_state_backend
+from tracing import SPAN_KIND_CLIENT, BatchSpanExporter, Tracer, TracingMiddleware, create_sink
+from webhook_probe import WebhookProber, probe_url
+from webhook_resilience import AdaptiveConcurrencyLimiter, CircuitBreaker, DeliveryRollup, DestinationTracker, WebhookSpool
+from webhook_routing import DEFAULT_DESTINATION, WebhookRouter
+from webhook_transforms import PayloadTransformer
 
-# Load environment variables
-load_dotenv()
+# Load environment variables (python-dotenv só é importado se existir um .env)
+def _load_env_file():
+    for directory in (Path(__file__).resolve().parent, *Path(__file__).resolve().parents):
+        if (directory / ".env").is_file():
+            from dotenv import load_dotenv
+            load_dotenv(directory / ".env")
+            return
+
+_load_env_file()
 
 # Path para arquivo de configuração dos fundos
-# Tentar múltiplos caminhos para o arquivo de configuração
+# Tentar múltiplos caminhos para o arquivo de configuração (resolvido no primeiro uso)
 POSSIBLE_PATHS = [
     Path(__file__).parent / "fundos_criterios.json",  # /app/fundos_criterios.json
     Path(__file__).parent.parent / "fundos_criterios.json",  # /fundos_criterios.json
     Path("/app/fundos_criterios.json"),  # Caminho absoluto
 ]
 
-FUNDOS_CONFIG_PATH = None
-for path in POSSIBLE_PATHS:
-    if path.exists():
-        FUNDOS_CONFIG_PATH = path
-        break
+_fundos_config_path = None
+
+def get_fundos_config_path():
+    """Caminho do fundos_criterios.json (FUNDOS_CONFIG_PATH ou o primeiro caminho existente)"""
+    global _fundos_config_path
+    if _fundos_config_path is None:
+        env_path = os.getenv("FUNDOS_CONFIG_PATH")
+        if env_path:
+            _fundos_config_path = Path(env_path)
+        else:
+            _fundos_config_path = next((p for p in POSSIBLE_PATHS if p.exists()), POSSIBLE_PATHS[0])  # Fallback
+    return _fundos_config_path
+
+_requests_module = None
 
-if FUNDOS_CONFIG_PATH is None:
-    FUNDOS_CONFIG_PATH = POSSIBLE_PATHS[0]  # Fallback
+def get_requests():
+    """Importa `requests` sob demanda, fora do caminho de inicialização"""
+    global _requests_module
+    if _requests_module is None:
+        import requests
+        _requests_module = requests
+    return _requests_module
 
 # Funções para manipular arquivo JSON
 def load_fundos_config():
     """Carrega configuração dos fundos do arquivo JSON"""
     try:
-        logger.info(f"Tentando carregar arquivo de configuração: {FUNDOS_CONFIG_PATH}")
-        with open(FUNDOS_CONFIG_PATH, 'r', encoding='utf-8') as f:
+        config_path = get_fundos_config_path()
+        logger.info(f"Tentando carregar arquivo de configuração: {config_path}")
+        with tracer.span("load_fundos_config", **{"config.path": str(config_path)}) as span, \
+                open(config_path, 'r', encoding='utf-8') as f:
             config = json.load(f)
+            span.set_attribute("config.fundos", len(config.get('fundos', {})))
             logger.info(f"Arquivo carregado com sucesso. Fundos encontrados: {len(config.get('fundos', {}))}")
             return config
     except FileNotFoundError:
-        logger.error(f"Arquivo fundos_criterios.json não encontrado em: {FUNDOS_CONFIG_PATH}")
+        logger.error(f"Arquivo fundos_criterios.json não encontrado em: {get_fundos_config_path()}")
         logger.error(f"Caminhos testados: {[str(p) for p in POSSIBLE_PATHS]}")
         return {"fundos": {}, "opcoes_formulario": {}, "configuracao": {}}
     except json.JSONDecodeError as e:
@@ -55,16 +105,59 @@ def load_fundos_config():
         return {"fundos": {}, "opcoes_formulario": {}, "configuracao": {}}
 
 def save_fundos_config(config):
-    """Salva configuração dos fundos no arquivo JSON"""
+    """Salva configuração dos fundos no arquivo JSON.
+
+    Grava num arquivo temporário e troca com os.replace, para que leitores
+    (e o watcher) nunca vejam um arquivo pela metade. Se o arquivo for um
+    bind mount (a troca falha com EBUSY/EXDEV), grava no próprio arquivo.
+    """
     try:
-        config["configuracao"]["ultima_atualizacao"] = datetime.utcnow().isoformat()
-        with open(FUNDOS_CONFIG_PATH, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=2, ensure_ascii=False)
+        config.setdefault("configuracao", {})["ultima_atualizacao"] = datetime.utcnow().isoformat()
+        config_path = get_fundos_config_path()
+        data = json.dumps(config, indent=2, ensure_ascii=False)
+        tmp_path = config_path.with_name(f".{config_path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, config_path)
+        except OSError as e:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            logger.warning(f"Troca atômica da configuração falhou ({e}); gravando no próprio arquivo")
+            with open(config_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+        # Publica o novo snapshot já nesta requisição, sem esperar o watcher
+        config_store.reload()
         return True
     except Exception as e:
         logger.error(f"Erro ao salvar configuração: {e}")
         return False
 
+async def run_blocking(fn, *args, **kwargs):
+    """Executa `fn` bloqueante (arquivo, HTTP síncrono) no executor padrão, fora do event loop,
+    mantendo o trace e a atribuição do profiler da requisição"""
+    call = functools.partial(fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(None, tracer.bind(profiler.bind(call)))
+
+# Edições da configuração rodam em threads (run_blocking); o lock mantém cada
+# leitura-alteração-gravação inteira, sem perder alterações concorrentes
+config_edit_lock = threading.Lock()
+
+def edit_fundos_config(edit):
+    """Carrega a configuração, aplica `edit(config)` e grava, sob config_edit_lock.
+
+    `edit` altera `config` no lugar e devolve o resultado; se levantar
+    HTTPException, nada é gravado.
+    """
+    with config_edit_lock:
+        config = load_fundos_config()
+        result = edit(config)
+        if not save_fundos_config(config):
+            raise HTTPException(status_code=500, detail="Erro ao salvar configuração")
+        return result
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -74,69 +167,151 @@ API_KEY = os.getenv("API_KEY", secrets.token_urlsafe(32))  # Gera uma chave API
 ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "123456")  # API key específica para endpoints admin
 API_KEY_EXPIRATION = int(os.getenv("API_KEY_EXPIRATION", "3600"))  # Expiração em segundos (1 hora)
 
-# Armazenamento temporário de tokens (em produção, use Redis ou similar)
-valid_tokens = {}
+# Estado compartilhado entre workers (memory://, sqlite:////caminho.db, redis://...);
+# com mais de um worker, o serve.py troca o padrão memory:// por SQLite em /dev/shm
+state_backend = create_state_backend(os.getenv("STATE_BACKEND_URL", "memory://"))
+
+# Armazenamento de tokens
+valid_tokens = StateNamespace(state_backend, "tokens", ttl=API_KEY_EXPIRATION)
 
 # Proteção contra força bruta
-login_attempts = {}
+login_attempts = StateNamespace(state_backend, "login_attempts")
 max_login_attempts = 5
 lockout_time = 15 * 60  # 15 minutos em segundos
 
-# Armazenamento temporário de logs do webhook (últimos 100 logs)
-webhook_logs = []
+# Logs do webhook (últimos 100 logs), gravados em lotes no backend de estado
 max_webhook_logs = 100
+webhook_logs = BatchedStateList(
+    state_backend,
+    "webhook_logs",
+    maxlen=max_webhook_logs,
+    batch_size=int(os.getenv("STATE_BATCH_SIZE", "20")),
+    flush_interval=float(os.getenv("STATE_FLUSH_INTERVAL", "0.5")),
+)
+
+# Eventos de entrega do webhook para o stream SSE do painel
+webhook_events = EventBroadcaster(
+    ring_size=int(os.getenv("SSE_RING_SIZE", "500")),
+    queue_size=int(os.getenv("SSE_QUEUE_SIZE", "100")),
+    heartbeat=float(os.getenv("SSE_HEARTBEAT", "15")),
+)
+
+# Logs gravados por outros workers chegam ao stream deste pelo estado compartilhado
+# (job webhook-log-relay; desnecessário com memory://, que é de um worker só)
+webhook_log_relay = EventRelay(webhook_events, "webhook_log", lambda: webhook_logs.range())
+
+# Resiliência do encaminhamento ao webhook (circuit breaker + limite adaptativo + spool)
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", "10"))  # segundos
+# Compressão dos envios aos destinos com `gzip: true` (abaixo do mínimo vai sem compressão)
+WEBHOOK_GZIP_MIN_SIZE = parse_size(os.getenv("WEBHOOK_GZIP_MIN_SIZE", "1k"))
+WEBHOOK_GZIP_LEVEL = int(os.getenv("WEBHOOK_GZIP_LEVEL", "6"))
+# URLs que responderam 415 ao corpo comprimido: passam a receber sem compressão
+webhook_gzip_refused = set()
+def make_webhook_breaker():
+    return CircuitBreaker(
+        window_seconds=float(os.getenv("WEBHOOK_BREAKER_WINDOW", "60")),
+        min_requests=int(os.getenv("WEBHOOK_BREAKER_MIN_REQUESTS", "5")),
+        failure_rate_threshold=float(os.getenv("WEBHOOK_BREAKER_FAILURE_RATE", "0.5")),
+        open_seconds=float(os.getenv("WEBHOOK_BREAKER_OPEN_SECONDS", "30")),
+    )
+
+def make_webhook_limiter():
+    return AdaptiveConcurrencyLimiter(
+        initial_limit=int(os.getenv("WEBHOOK_CONCURRENCY_INITIAL", "4")),
+        max_limit=int(os.getenv("WEBHOOK_CONCURRENCY_MAX", "32")),
+        latency_threshold=float(os.getenv("WEBHOOK_LATENCY_THRESHOLD", "2.0")),
+    )
+
+# Breaker e limite do destino padrão; os demais destinos de webhook_routes ganham os seus sob demanda
+webhook_breaker = make_webhook_breaker()
+webhook_limiter = make_webhook_limiter()
+# Entregas por hora e destino (GET /api/admin/webhook-stats), gravadas pelo job webhook-stats-rollup
+webhook_rollup = DeliveryRollup(
+    state_backend, retention=int(os.getenv("WEBHOOK_STATS_RETENTION_DAYS", "7")) * 86400
+)
+webhook_destinations = DestinationTracker(
+    make_webhook_breaker, seed={DEFAULT_DESTINATION: webhook_breaker}, rollup=webhook_rollup,
+    limiter_factory=make_webhook_limiter, limiter_seed={DEFAULT_DESTINATION: webhook_limiter},
+)
+webhook_spool = WebhookSpool(os.getenv("WEBHOOK_SPOOL_DIR", str(Path(__file__).parent / "data" / "webhook_spool")))
+# Compartilhado entre os destinos: com folga para que um destino no limite máximo
+# não ocupe todas as threads dos demais
+webhook_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("WEBHOOK_EXECUTOR_WORKERS", str(webhook_limiter.max_limit * 4))),
+    thread_name_prefix="webhook",
+)
+# Sonda periódica dos destinos (job webhook-probe): latência por fase, prontidão no /api/health
+# e abertura antecipada do circuito do destino que caiu
+webhook_prober = WebhookProber(
+    window=int(os.getenv("WEBHOOK_PROBE_WINDOW", "20")),
+    failure_threshold=int(os.getenv("WEBHOOK_PROBE_FAILURES", "3")),
+    slow_ms=float(os.getenv("WEBHOOK_PROBE_SLOW_MS", "2000")),
+)
+WEBHOOK_PROBE_TIMEOUT = float(os.getenv("WEBHOOK_PROBE_TIMEOUT", "5"))
+WEBHOOK_PROBE_METHOD = os.getenv("WEBHOOK_PROBE_METHOD", "HEAD")
+_probe_tripped = set()  # destinos cujo circuito foi aberto pela sonda
+_probe_seen = {}  # destino -> "at" da última sondagem aplicada neste worker
+PROBE_NAMESPACE = "webhook_probe"
+_webhook_session = None
+_webhook_session_lock = threading.Lock()
+
+def get_webhook_session():
+    """requests.Session compartilhada: conexões keep-alive reaproveitadas por destino"""
+    global _webhook_session
+    if _webhook_session is None:
+        with _webhook_session_lock:
+            if _webhook_session is None:
+                requests = get_requests()
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=webhook_limiter.max_limit)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _webhook_session = session
+    return _webhook_session
 
 def check_brute_force(client_ip):
     """Verificar tentativas de login para prevenir ataques de força bruta"""
     current_time = time.time()
     
-    # Limpar entradas antigas
-    for ip in list(login_attempts.keys()):
-        if current_time - login_attempts[ip]["timestamp"] > lockout_time:
-            del login_attempts[ip]
+    # Entradas expiradas são removidas pelo job purge-expired-state
     
-    # Verificar se o IP está bloqueado
-    if client_ip in login_attempts:
-        attempt_data = login_attempts[client_ip]
-        if attempt_data["count"] >= max_login_attempts:
-            # Verificar se ainda está no período de bloqueio
-            if current_time - attempt_data["timestamp"] < lockout_time:
-                remaining = int(lockout_time - (current_time - attempt_data["timestamp"]))
-                return False, f"Muitas tentativas de login. Tente novamente em {remaining // 60} minutos."
-            else:
-                # Reiniciar contagem após o período de bloqueio
-                login_attempts[client_ip] = {"count": 1, "timestamp": current_time}
-        else:
-            # Incrementar contagem
-            login_attempts[client_ip]["count"] += 1
-    else:
-        # Primeira tentativa para este IP
-        login_attempts[client_ip] = {"count": 1, "timestamp": current_time}
+    # Contador com janela fixa de `lockout_time` a partir da primeira tentativa;
+    # o incremento é atômico no backend, então vale para todos os workers
+    count, first_attempt = state_backend.incr("login_attempts", client_ip, ttl=lockout_time)
+    if count > max_login_attempts:
+        remaining = int(lockout_time - (current_time - first_attempt))
+        return False, f"Muitas tentativas de login. Tente novamente em {remaining // 60} minutos."
     
     return True, ""
 
-def add_webhook_log(lead_data, success, error=None, status_code=None, idempotency_key=None):
+def add_webhook_log(lead_data, success, error=None, status_code=None, idempotency_key=None, destination=None):
     """Adiciona um log de tentativa de webhook"""
-    global webhook_logs
-    
     log_entry = {
+        # id e origem: o EventRelay dos outros workers repassa o log ao stream deles
+        "id": uuid.uuid4().hex,
+        "origin": webhook_events.stream_id,
         "timestamp": datetime.utcnow().isoformat(),
         "idempotency_key": idempotency_key or "unknown",
         "lead_name": lead_data.nome if lead_data else "Unknown",
         "lead_email": lead_data.email if lead_data else "Unknown",
         "success": success,
         "error": error,
-        "status_code": status_code
+        "status_code": status_code,
+        "destination": destination or DEFAULT_DESTINATION
     }
     
-    # Adicionar no início da lista (mais recente primeiro)
-    webhook_logs.insert(0, log_entry)
-    
-    # Manter apenas os últimos N logs
-    if len(webhook_logs) > max_webhook_logs:
-        webhook_logs = webhook_logs[:max_webhook_logs]
+    # Adicionar no início da lista (mais recente primeiro); o backend mantém
+    # apenas os últimos N logs
+    with tracer.span("webhook_log.write", **{"webhook.destination": log_entry["destination"]}):
+        webhook_logs.push(log_entry)
+        webhook_events.publish("webhook_log", log_entry)
 
-app = FastAPI(title="Investiza Form API", version="1.0.0")
+JSON_RESPONSE_CLASS = get_response_class()
+app = FastAPI(title="Investiza Form API", version="1.0.0", default_response_class=JSON_RESPONSE_CLASS)
+
+def json_response(content, status_code=200):
+    """Renderiza `content` (já composto só de tipos JSON nativos) sem passar pelo jsonable_encoder"""
+    return JSON_RESPONSE_CLASS(content=content, status_code=status_code)
 
 # Middleware para verificar autenticação em endpoints admin
 from fastapi import Security, HTTPException, Depends, Request
@@ -173,13 +348,69 @@ async def get_api_key(
 # Custom exception handler for validation errors
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    logger.error(f"Validation error on {request.url}: {exc.errors()}")
-    logger.error(f"Request body: {await request.body()}")
+    # Sem o corpo nem os valores recebidos no log: podem ser grandes e contêm dados pessoais
+    errors = [{"loc": error.get("loc"), "type": error.get("type"), "msg": error.get("msg")} for error in exc.errors()]
+    logger.error(f"Validation error on {request.method} {request.url.path} "
+                 f"({request.headers.get('content-length', '?')} bytes): {errors}")
     return JSONResponse(
         status_code=422,
         content={"detail": exc.errors()}
     )
 
+# Compressão gzip das respostas (RESPONSE_GZIP_LEVEL=0 desliga); respostas com
+# ETag forte ficam comprimidas em cache até a configuração mudar (on_config_published)
+response_compressor = ResponseCompressor(
+    minimum_size=parse_size(os.getenv("RESPONSE_GZIP_MIN_SIZE", "1k")),
+    level=int(os.getenv("RESPONSE_GZIP_LEVEL", "6")),
+    cache=CompressedResponseCache(max_bytes=parse_size(os.getenv("RESPONSE_GZIP_CACHE_SIZE", "16m"))),
+)
+app.add_middleware(CompressionMiddleware, compressor=response_compressor)
+
+# Limites de tamanho do corpo por rota, aplicados antes do parsing
+# (o CORS é registrado depois para envolver também as respostas 413)
+body_limits = {
+    "/api/form/": parse_size(os.getenv("BODY_LIMIT_FORM", "16k")),
+    "/api/admin/": parse_size(os.getenv("BODY_LIMIT_ADMIN", "1m")),
+    "/api/admin/fundos/bulk": parse_size(os.getenv("BODY_LIMIT_BULK", "8m")),
+}
+app.add_middleware(BodyLimitMiddleware, limits=body_limits, default=parse_size(os.getenv("BODY_LIMIT_DEFAULT", "64k")))
+
+# Controle de admissão: leads têm prioridade sobre admin e debug; o excedente
+# recebe 503 + Retry-After rápido (ADMISSION_MAX_CONCURRENCY=0 desliga)
+admission = AdmissionController(
+    max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", "64")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "256")),
+    classes={
+        "lead": AdmissionClass(
+            priority=0,
+            concurrency=int(os.getenv("ADMISSION_LEAD_CONCURRENCY", "64")),
+            queue_size=int(os.getenv("ADMISSION_LEAD_QUEUE", "256")),
+            max_wait=float(os.getenv("ADMISSION_LEAD_MAX_WAIT", "5")),
+        ),
+        "admin": AdmissionClass(
+            priority=1,
+            concurrency=int(os.getenv("ADMISSION_ADMIN_CONCURRENCY", "8")),
+            queue_size=int(os.getenv("ADMISSION_ADMIN_QUEUE", "32")),
+            max_wait=float(os.getenv("ADMISSION_ADMIN_MAX_WAIT", "2")),
+        ),
+        "debug": AdmissionClass(
+            priority=2,
+            concurrency=int(os.getenv("ADMISSION_DEBUG_CONCURRENCY", "1")),
+            queue_size=int(os.getenv("ADMISSION_DEBUG_QUEUE", "2")),
+            max_wait=float(os.getenv("ADMISSION_DEBUG_MAX_WAIT", "1")),
+        ),
+    },
+)
+app.add_middleware(AdmissionMiddleware, controller=admission, routes=[
+    # Isentas: o stream SSE fica aberto indefinidamente e as métricas têm que
+    # responder justamente quando o serviço está saturado
+    ("/api/admin/webhook-logs/stream", None),
+    ("/api/admin/admission", None),
+    ("/api/form/", "lead"),
+    ("/api/admin/", "admin"),
+    ("/api/debug/", "debug"),
+])
+
 # CORS configuration
 cors_origins = os.getenv("CORS_ORIGINS", "*").split(",")
 app.add_middleware(
@@ -190,6 +421,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profiling amostral por rota (desligado com PROFILE_SAMPLE_RATE=0)
+profiler = SamplingProfiler(
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000,
+)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+# Tracing distribuído (OTLP/JSON): TRACE_EXPORTER=file:/caminho.jsonl ou
+# otlp:http://collector:4318/v1/traces; sem exporter fica desligado. Registrado
+# por último para o span da requisição cobrir também os 413/503 dos middlewares
+_trace_sink = create_sink(os.getenv("TRACE_EXPORTER", ""))
+tracer = Tracer(
+    exporter=BatchSpanExporter(
+        _trace_sink,
+        service_name=os.getenv("OTEL_SERVICE_NAME", "investiza-form-api"),
+        max_batch=int(os.getenv("TRACE_BATCH_SIZE", "512")),
+        max_queue=int(os.getenv("TRACE_MAX_QUEUE", "8192")),
+        flush_interval=float(os.getenv("TRACE_FLUSH_INTERVAL", "5")),
+    ) if _trace_sink is not None else None,
+    sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.1")),
+)
+app.add_middleware(TracingMiddleware, tracer=tracer)
+
+# Monitor do atraso do event loop: detecta handlers que bloqueiam o loop e
+# guarda a pilha do bloqueio (LOOP_MONITOR_INTERVAL=0 desliga).
+# LOOP_MONITOR_STRICT=1 (testes) faz a requisição que bloqueou falhar
+loop_monitor = LoopLagMonitor(
+    interval=float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1")),
+    threshold=float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100")) / 1000,
+    strict=os.getenv("LOOP_MONITOR_STRICT", "0") == "1",
+)
+app.add_middleware(LoopMonitorMiddleware, monitor=loop_monitor)
+
 # Pydantic models for request/response validation
 class LeadData(BaseModel):
     # Dados pessoais
@@ -249,19 +513,91 @@ class FormSubmission(BaseModel):
     score_gamificado: int = Field(default=0)
     meta: Optional[MetaData] = Field(default_factory=lambda: MetaData())
 
+# Ingestão direta dos bytes do corpo: validação pelo parser JSON do pydantic-core
+# (model_validate_json), sem o json.loads + dict intermediário do FastAPI
+RAW_BODY_MODELS = {}
+
+def raw_body_errors(model, body, exc: ValidationError):
+    """Erros no mesmo formato do 422 padrão do FastAPI (o contrato do frontend).
+
+    O modo JSON do pydantic-core nomeia alguns erros de outro jeito (ex.:
+    "valid array" em vez de "valid list", posição do erro de sintaxe). Só no
+    caminho de erro, refaz o que o FastAPI faria: json.loads e validação em
+    modo Python, com os mesmos `loc`, `type`, `msg` e `ctx`.
+    """
+    missing = [{"type": "missing", "loc": ("body",), "msg": "Field required", "input": None,
+                "url": f"https://errors.pydantic.dev/{pydantic_version_short()}/v/missing"}]
+    if not body:
+        return missing
+    try:
+        value = json.loads(body)
+    except json.JSONDecodeError as e:
+        return [{"type": "json_invalid", "loc": ("body", e.pos), "msg": "JSON decode error",
+                 "input": {}, "ctx": {"error": e.msg}}]
+    if value is None:
+        return missing
+    try:
+        model.model_validate(value, from_attributes=True)
+        errors = exc.errors(include_url=True)
+    except ValidationError as e:
+        errors = e.errors(include_url=True)
+    for error in errors:
+        error["loc"] = ("body", *error["loc"])
+    return errors
+
+def raw_json_body(model):
+    """Dependência que valida o corpo bruto da requisição como `model`"""
+    RAW_BODY_MODELS[model.__name__] = model
+
+    async def dependency(request: Request):
+        with tracer.span("http.read_body") as span:
+            body = await request.body()
+            span.set_attribute("http.request.body.size", len(body))
+        with tracer.span(f"{model.__name__}.validate"):
+            try:
+                return model.model_validate_json(body)
+            except ValidationError as e:
+                raise RequestValidationError(raw_body_errors(model, body, e))
+
+    return dependency
+
+def raw_json_body_openapi(model):
+    """openapi_extra documentando o corpo que a dependência `raw_json_body` lê"""
+    return {"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"$ref": f"#/components/schemas/{model.__name__}"}}},
+    }}
+
+def custom_openapi():
+    # Os modelos lidos por raw_json_body não passam pelo FastAPI; registrar os schemas
+    if app.openapi_schema:
+        return app.openapi_schema
+    schema = get_openapi(title=app.title, version=app.version, routes=app.routes)
+    components = schema.setdefault("components", {}).setdefault("schemas", {})
+    for name, model in RAW_BODY_MODELS.items():
+        model_schema = model.model_json_schema(ref_template="#/components/schemas/{model}")
+        components.update(model_schema.pop("$defs", {}))
+        components[name] = model_schema
+    app.openapi_schema = schema
+    return schema
+
+app.openapi = custom_openapi
+
 # Health check endpoint
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
-    return {
+    return json_response({
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
-        "service": "investiza-form-api"
-    }
+        "service": "investiza-form-api",
+        # Prontidão do webhook pela última sondagem (cache, sem chamada externa)
+        "webhook": webhook_prober.readiness()
+    })
 
 # Form submission endpoint (for testing/validation)
-@app.post("/api/form/submit")
-async def submit_form(submission: FormSubmission):
+@app.post("/api/form/submit", openapi_extra=raw_json_body_openapi(FormSubmission))
+async def submit_form(submission: FormSubmission = Depends(raw_json_body(FormSubmission))):
     """
     Endpoint to receive and validate form submissions
     This can be used for testing and validation before sending to n8n
@@ -287,6 +623,38 @@ async def submit_form(submission: FormSubmission):
         logger.error(f"Error processing form submission: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Listas base de valores permitidos na validação do lead; as opções de
+# opcoes_formulario são somadas a elas em cada snapshot da configuração
+LEAD_ALLOWED_VALUES = {
+    "situacao_empresa": ['cnpj_antigo', 'cnpj_novo', 'implantacao', 'pessoa_fisica',
+                         'recuperacao_judicial_homologada', 'recuperacao_judicial_nao_homologada'],
+    "faturamento_renda": ['<10', '10-80', '>80', '>300', 'nao_tem',
+                          'ate_5k', '5k_15k', '15k_50k', 'acima_50k'],
+    "local": ['Nordeste', 'Norte', 'Centro-Oeste', 'Sudeste', 'Sul'],
+    "como_chegou": ['instagram', 'google', 'linkedin', 'facebook', 'youtube',
+                    'whatsapp', 'site', 'indicacao', 'eventos', 'outros'],
+    "segmento": ['Agro', 'Industria_Atacado', 'Construtora',
+                 'Tecnologia', 'Servicos_Financeiros', 'Saude', 'Educacao',
+                 'Servico_Publico', 'Varejo', 'Outros'],
+    "razao": ['Implantacao', 'Ampliacao', 'Giro', 'Financiamento_Ativo',
+              'Modernizacao_Tecnologia', 'Aquisicao', 'Safra_Agro', 'Outros'],
+    "garantia": ['Imovel', 'Veiculo', 'Equipamento', 'Recebiveis',
+                 'CartaFianca', 'Estoque', 'NaoSei', 'Nenhuma'],
+    "tipos_imovel": ['Residencial', 'Comercial', 'Industrial', 'Rural', 'Terreno'],
+}
+
+# Chave em opcoes_formulario -> campo do lead
+OPCOES_LEAD_FIELDS = {
+    "situacao_empresa": "situacao_empresa",
+    "faturamento_renda": "faturamento_renda",
+    "regioes": "local",
+    "como_chegou": "como_chegou",
+    "segmentos": "segmento",
+    "razoes": "razao",
+    "garantias": "garantia",
+    "tipo_imovel": "tipos_imovel",
+}
+
 # Validation endpoint for lead data
 @app.post("/api/form/validate")
 async def validate_lead(lead: LeadData):
@@ -295,23 +663,8 @@ async def validate_lead(lead: LeadData):
     This can be used by the frontend for real-time validation
     """
     try:
-        # Configuração de sanitização e validação
-        # Listas de valores permitidos para validação
-        allowed_situacao_empresa = ['cnpj_antigo', 'cnpj_novo', 'implantacao', 'pessoa_fisica', 
-                                   'recuperacao_judicial_homologada', 'recuperacao_judicial_nao_homologada']
-        allowed_faturamento_renda = ['<10', '10-80', '>80', '>300', 'nao_tem', 
-                                    'ate_5k', '5k_15k', '15k_50k', 'acima_50k']
-        allowed_local = ['Nordeste', 'Norte', 'Centro-Oeste', 'Sudeste', 'Sul']
-        allowed_como_chegou = ['instagram', 'google', 'linkedin', 'facebook', 'youtube', 
-                              'whatsapp', 'site', 'indicacao', 'eventos', 'outros']
-        allowed_segmentos = ['Agro', 'Industria_Atacado', 'Construtora', 
-                            'Tecnologia', 'Servicos_Financeiros', 'Saude', 'Educacao', 
-                            'Servico_Publico', 'Varejo', 'Outros']
-        allowed_razoes = ['Implantacao', 'Ampliacao', 'Giro', 'Financiamento_Ativo',
-                         'Modernizacao_Tecnologia', 'Aquisicao', 'Safra_Agro', 'Outros']
-        allowed_garantias = ['Imovel', 'Veiculo', 'Equipamento', 'Recebiveis', 
-                           'CartaFianca', 'Estoque', 'NaoSei', 'Nenhuma']
-        allowed_tipos_imovel = ['Residencial', 'Comercial', 'Industrial', 'Rural', 'Terreno']
+        # Valores permitidos: listas base + opções do snapshot da configuração
+        allowed = get_config_snapshot().validators
         
         # Funções de sanitização
         def sanitize_string(s, max_length=100):
@@ -347,29 +700,29 @@ async def validate_lead(lead: LeadData):
         lead.razao_outros = sanitize_string(lead.razao_outros, 200)
         
         # Validar campos de enumeração
-        if not validate_enum(lead.situacao_empresa, allowed_situacao_empresa):
+        if not validate_enum(lead.situacao_empresa, allowed["situacao_empresa"]):
             raise HTTPException(status_code=400, detail="Situação da empresa inválida")
             
-        if not validate_enum(lead.faturamento_renda, allowed_faturamento_renda):
+        if not validate_enum(lead.faturamento_renda, allowed["faturamento_renda"]):
             raise HTTPException(status_code=400, detail="Faturamento/renda inválido")
             
-        if not validate_enum(lead.local, allowed_local):
+        if not validate_enum(lead.local, allowed["local"]):
             raise HTTPException(status_code=400, detail="Localização inválida")
             
-        if not validate_enum(lead.como_chegou, allowed_como_chegou):
+        if not validate_enum(lead.como_chegou, allowed["como_chegou"]):
             raise HTTPException(status_code=400, detail="Campo 'como chegou' inválido")
             
         # Validar listas de enumeração
-        if not validate_list_enum(lead.segmento, allowed_segmentos):
+        if not validate_list_enum(lead.segmento, allowed["segmento"]):
             raise HTTPException(status_code=400, detail="Segmentos inválidos")
             
-        if not validate_list_enum(lead.razao, allowed_razoes):
+        if not validate_list_enum(lead.razao, allowed["razao"]):
             raise HTTPException(status_code=400, detail="Razões inválidas")
             
-        if not validate_list_enum(lead.garantia, allowed_garantias):
+        if not validate_list_enum(lead.garantia, allowed["garantia"]):
             raise HTTPException(status_code=400, detail="Garantias inválidas")
             
-        if lead.tipos_imovel and not validate_list_enum(lead.tipos_imovel, allowed_tipos_imovel):
+        if lead.tipos_imovel and not validate_list_enum(lead.tipos_imovel, allowed["tipos_imovel"]):
             raise HTTPException(status_code=400, detail="Tipos de imóvel inválidos")
             
         # Validação básica para campos obrigatórios
@@ -434,31 +787,50 @@ async def validate_lead(lead: LeadData):
         logger.error(f"Error validating lead data: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+def build_form_config(config):
+    """Monta o payload de /api/form/config a partir da configuração"""
+    opcoes = config.get("opcoes_formulario", {})
+    webhook_url = config.get("configuracao", {}).get("webhook_url", "")
+    
+    return {
+        "fields": {
+            "situacao_empresa": [opt["value"] for opt in opcoes.get("situacao_empresa", [])],
+            "faturamento_renda": [opt["value"] for opt in opcoes.get("faturamento_renda", [])],
+            "regioes": [opt["value"] for opt in opcoes.get("regioes", [])],
+            "segmentos": [opt["value"] for opt in opcoes.get("segmentos", [])],
+            "razoes": [opt["value"] for opt in opcoes.get("razoes", [])],
+            "garantias": [opt["value"] for opt in opcoes.get("garantias", [])],
+            "tipo_imovel": [opt["value"] for opt in opcoes.get("tipo_imovel", [])],
+            "como_chegou": [opt["value"] for opt in opcoes.get("como_chegou", [])]
+        },
+        "opcoes_completas": opcoes,
+        "webhook_url": webhook_url
+    }
+
+def preload_config():
+    """Carrega o snapshot da configuração (índices e payloads pré-serializados),
+    ou o recarrega se o arquivo mudou desde o último carregamento.
+
+    Chamado pelo processo mestre (serve.py) antes do fork dos workers, na
+    subida e no reload gradual, para que essas estruturas sejam compartilhadas
+    por copy-on-write.
+    """
+    config_store.reload()
+
 # Get form configuration
 @app.get("/api/form/config")
-async def get_form_config():
+async def get_form_config(request: Request):
     """
     Returns form configuration data like options for dropdowns
     """
     try:
-        config = load_fundos_config()
-        opcoes = config.get("opcoes_formulario", {})
-        webhook_url = config.get("configuracao", {}).get("webhook_url", "")
-        
-        return {
-            "fields": {
-                "situacao_empresa": [opt["value"] for opt in opcoes.get("situacao_empresa", [])],
-                "faturamento_renda": [opt["value"] for opt in opcoes.get("faturamento_renda", [])],
-                "regioes": [opt["value"] for opt in opcoes.get("regioes", [])],
-                "segmentos": [opt["value"] for opt in opcoes.get("segmentos", [])],
-                "razoes": [opt["value"] for opt in opcoes.get("razoes", [])],
-                "garantias": [opt["value"] for opt in opcoes.get("garantias", [])],
-                "tipo_imovel": [opt["value"] for opt in opcoes.get("tipo_imovel", [])],
-                "como_chegou": [opt["value"] for opt in opcoes.get("como_chegou", [])]
-            },
-            "opcoes_completas": opcoes,
-            "webhook_url": webhook_url
-        }
+        # Serializado uma vez por snapshot da configuração; o ETag da versão
+        # permite 304 e o cache da resposta comprimida
+        snapshot = get_config_snapshot()
+        etag = f'"{snapshot.version}-form"'
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        return raw_json_response(snapshot.responses["form_config"], headers={"ETag": etag, "Cache-Control": "no-cache"})
     except Exception as e:
         logger.error(f"Erro ao carregar configuração do formulário: {str(e)}")
         # Fallback para configuração básica
@@ -475,142 +847,302 @@ async def get_form_config():
             "webhook_url": "https://2n8n.ominicrm.com/webhook-test/650b310d-cd0b-465a-849d-7c7a3991572e"
         }
 
-# Webhook proxy endpoint to bypass CORS
-@app.post("/api/form/webhook")
-async def webhook_proxy(submission: FormSubmission):
-    """
-    Proxy endpoint to forward form submissions to n8n webhook
-    This bypasses CORS issues by making the request server-side
-    """
-    import requests
-    import asyncio
-    from concurrent.futures import ThreadPoolExecutor
-    
-    # Log the received submission for debugging
-    logger.info(f"Webhook proxy received submission: {submission.idempotency_key}")
-    logger.info(f"Lead data: {submission.lead}")
-    logger.info(f"Eligibility: {submission.eligibility}")
+DEFAULT_WEBHOOK_URL = "https://2n8n.ominicrm.com/webhook/650b310d-cd0b-465a-849d-7c7a3991572e"
+
+MAX_WEBHOOK_PAYLOAD = 10 * 1024 * 1024  # 10MB em bytes
+
+def build_webhook_headers(body, idempotency_key, source='form-api'):
+    """Monta os headers do envio; a assinatura HMAC cobre exatamente `body`"""
+    # Adicionar headers de segurança
+    headers = {
+        'Content-Type': 'application/json',
+        'X-Request-Id': idempotency_key,
+        'User-Agent': 'Investiza-Form/1.0',
+        'X-Investiza-Source': source
+    }
     
-    # Carregar URL do webhook da configuração
-    config = load_fundos_config()
-    webhook_url = config.get("configuracao", {}).get("webhook_url", "https://2n8n.ominicrm.com/webhook/650b310d-cd0b-465a-849d-7c7a3991572e")
+    # Adicionar um hash HMAC para autenticação (opcional)
+    webhook_secret = os.getenv("WEBHOOK_SECRET", "")
+    if webhook_secret:
+        headers['X-Investiza-Signature'] = sign_payload(body, webhook_secret)
     
-    def send_webhook_request(payload_dict, attempt=1):
-        """Send webhook request with retry logic"""
-        import time  # Importar time localmente para garantir acesso
-        
-        try:
-            # Validar a URL do webhook antes de usar
-            if not webhook_url or not isinstance(webhook_url, str) or not webhook_url.startswith(('http://', 'https://')):
-                logger.error(f"URL de webhook inválida: {webhook_url}")
-                return {"success": False, "error": "URL de webhook inválida ou não configurada"}
-                
-            # Limite de tamanho para payload (10MB)
-            payload_size = len(json.dumps(payload_dict))
-            if payload_size > 10 * 1024 * 1024:  # 10MB em bytes
-                logger.error(f"Payload muito grande para webhook: {payload_size} bytes")
-                return {"success": False, "error": "Payload muito grande para webhook"}
-            
-            # Adicionar headers de segurança
-            headers = {
-                'Content-Type': 'application/json',
-                'X-Request-Id': payload_dict.get('idempotency_key'),
-                'User-Agent': 'Investiza-Form/1.0',
-                'X-Investiza-Timestamp': str(int(time.time())),
-                'X-Investiza-Source': 'form-api'
-            }
-            
-            # Adicionar um hash HMAC para autenticação (opcional)
-            webhook_secret = os.getenv("WEBHOOK_SECRET", "")
-            if webhook_secret:
-                payload_str = json.dumps(payload_dict)
-                hmac_signature = hmac.new(
-                    webhook_secret.encode(), 
-                    payload_str.encode(), 
-                    digestmod=hashlib.sha256
-                ).hexdigest()
-                headers['X-Investiza-Signature'] = hmac_signature
-            
-            response = requests.post(
-                webhook_url,
-                json=payload_dict,
-                headers=headers,
-                timeout=10  # 10 segundos de timeout
-            )
+    return headers
+
+def send_webhook_request(webhook_url, body, headers, attempt=1, breaker=None, timeout=None):
+    """Send webhook request with retry logic
+
+    `body` são os bytes JSON canônicos: os mesmos usados no limite de tamanho,
+    na assinatura (já presente em `headers`) e no corpo enviado. `breaker` é o
+    circuit breaker do destino (padrão: o do webhook principal).
+    """
+    requests = get_requests()
+    breaker = breaker or webhook_breaker
+
+    try:
+        # Validar a URL do webhook antes de usar
+        if not webhook_url or not isinstance(webhook_url, str) or not webhook_url.startswith(('http://', 'https://')):
+            logger.error(f"URL de webhook inválida: {webhook_url}")
+            return {"success": False, "error": "URL de webhook inválida ou não configurada"}
             
+        # Limite de tamanho para payload (10MB)
+        payload_size = len(body)
+        if payload_size > MAX_WEBHOOK_PAYLOAD:
+            logger.error(f"Payload muito grande para webhook: {payload_size} bytes")
+            return {"success": False, "error": "Payload muito grande para webhook"}
+        
+        attempt_headers = dict(headers)
+        attempt_headers['X-Investiza-Timestamp'] = str(int(time.time()))
+        
+        # Um span CLIENT por tentativa; o traceparent vai junto com o X-Request-Id
+        with tracer.span("webhook.send", kind=SPAN_KIND_CLIENT, **{
+            "http.request.method": "POST",
+            "url.full": webhook_url,
+            "webhook.attempt": attempt,
+            "http.request.body.size": payload_size,
+        }) as span:
+            tracer.inject(attempt_headers)
+            try:
+                response = get_webhook_session().post(
+                    webhook_url,
+                    data=body,
+                    headers=attempt_headers,
+                    timeout=timeout or WEBHOOK_TIMEOUT
+                )
+            except requests.RequestException as e:
+                breaker.record_failure(str(e))
+                raise
+        
+            span.set_attribute("http.response.status_code", response.status_code)
             # Registrar informações de resposta para diagnóstico
             logger.info(f"Webhook response: status={response.status_code}, content_length={len(response.text or '')}")
-            
+        
             if response.status_code >= 200 and response.status_code < 300:
+                breaker.record_success()
                 return {"success": True, "status_code": response.status_code}
+            elif response.status_code == 415 and 'Content-Encoding' in headers:
+                # O destino não aceita o corpo comprimido; quem chamou reenvia sem compressão
+                return {"success": False, "unsupported_encoding": True, "status_code": 415, "error": "HTTP 415"}
             elif response.status_code == 404:
                 # Webhook não está ativo no n8n
                 error_msg = "Webhook não está ativo. Você precisa ativar o workflow no n8n primeiro."
                 logger.warning(f"Webhook 404 (não ativo): {response.text}")
+                breaker.record_failure(f"HTTP 404: {error_msg}")
                 raise requests.exceptions.HTTPError(f"HTTP {response.status_code}: {error_msg}")
             else:
                 # Limitar tamanho do log de erro para evitar ataques de log flooding
                 response_text = response.text[:500] + '...' if response.text and len(response.text) > 500 else response.text
                 logger.warning(f"Erro de webhook: HTTP {response.status_code}: {response_text}")
+                if response.status_code >= 500 or response.status_code == 429:
+                    breaker.record_failure(f"HTTP {response.status_code}")
                 raise requests.exceptions.HTTPError(f"HTTP {response.status_code}: {response_text}")
-                
-        except Exception as e:
-            if attempt < 2:
-                time.sleep(attempt * 1)  # Exponential backoff
-                return send_webhook_request(payload_dict, attempt + 1)
             
-            logger.error(f"Webhook failed after {attempt} attempts: {str(e)}")
-            return {"success": False, "error": str(e)}
-    
-    try:
-        # Convert Pydantic model to dict for JSON serialization
-        payload_dict = submission.dict()
-        
-        # Log the webhook attempt
-        logger.info(f"Forwarding to n8n webhook - idempotency_key: {payload_dict.get('idempotency_key')}")
+    except Exception as e:
+        # Não insistir (nem dormir no backoff) se o circuito abriu nesse meio tempo
+        if attempt < 2 and breaker.allow_request():
+            with tracer.span("webhook.backoff", **{"webhook.backoff_seconds": attempt}):
+                time.sleep(attempt * 1)  # Exponential backoff
+            return send_webhook_request(webhook_url, body, headers, attempt + 1, breaker, timeout)
         
-        # Execute webhook request in thread pool to avoid blocking
+        logger.error(f"Webhook failed after {attempt} attempts: {str(e)}")
+        return {"success": False, "error": str(e)}
+
+def send_to_destination(destination, body, idempotency_key, breaker, transforms=None):
+    """Aplica a transformação jq do destino (se houver) e envia; roda no executor.
+
+    A assinatura vale para o JSON transformado (antes do gzip, como o destino o
+    lê após descomprimir); o spool continua guardando o payload canônico. Com
+    `gzip: true` o corpo vai comprimido, a menos que o destino já tenha
+    respondido 415 a um corpo comprimido.
+    """
+    if transforms is not None:
+        body = transforms.apply(destination.name, body)
+    headers = build_webhook_headers(body, idempotency_key)
+    if (destination.gzip and len(body) >= WEBHOOK_GZIP_MIN_SIZE
+            and destination.url not in webhook_gzip_refused):
+        compressed = gzip_bytes(body, WEBHOOK_GZIP_LEVEL)
+        result = send_webhook_request(
+            destination.url, compressed, {**headers, 'Content-Encoding': 'gzip'}, 1, breaker, destination.timeout
+        )
+        if not result.get("unsupported_encoding"):
+            return result
+        logger.warning(f"Destino {destination.name} recusou gzip (HTTP 415); enviando sem compressão a partir de agora")
+        webhook_gzip_refused.add(destination.url)
+    return send_webhook_request(destination.url, body, headers, 1, breaker, destination.timeout)
+
+def spool_submission(body, reason, destination=None):
+    """Guarda a submissão (bytes JSON canônicos) no spool local para reenvio posterior"""
+    try:
+        with tracer.span("webhook.spool", **{"webhook.destination": destination, "webhook.spool_reason": reason}):
+            webhook_spool.append(body, reason, destination)
+        return True
+    except OSError as e:
+        logger.error(f"Erro ao gravar submissão no spool: {e}")
+        return False
+
+def route_submission(submission, snapshot=None):
+    """(destinos, regras aplicadas) da submissão pela tabela de roteamento do snapshot"""
+    snapshot = snapshot or get_config_snapshot()
+    meta = submission.meta
+    utm = {
+        "utm_source": meta.utm_source,
+        "utm_medium": meta.utm_medium,
+        "utm_campaign": meta.utm_campaign,
+    } if meta else None
+    return snapshot.router.route(submission.eligibility.recomendados, submission.lead.local, utm)
+
+async def deliver_webhook(destination, body, submission):
+    """Entrega `body` a um destino; falhas de envio e recusas (circuito/limite) vão para o spool.
+    
+    Retorna {"destination", "status": delivered|queued|failed, ...}.
+    """
+    idempotency_key = submission.idempotency_key
+    breaker = webhook_destinations.breaker(destination.name)
+    limiter = webhook_destinations.limiter(destination.name)
+    
+    # Circuito aberto ou limite de concorrência atingido: ir direto para o spool
+    # em vez de esperar timeouts do destino
+    spool_reason = None
+    if not breaker.allow_request():
+        spool_reason = "circuit_open"
+    elif not limiter.try_acquire():
+        spool_reason = "concurrency_limit"
+        breaker.release_trial()
+    
+    result = {"success": False}
+    started = time.monotonic()
+    if not spool_reason:
+        logger.info(f"Forwarding to webhook {destination.name} - idempotency_key: {idempotency_key}")
         loop = asyncio.get_event_loop()
-        with ThreadPoolExecutor() as executor:
-            future = loop.run_in_executor(executor, send_webhook_request, payload_dict)
-            result = await future
-        
-        if result["success"]:
-            logger.info(f"Webhook forwarded successfully")
-            
-            # Registrar log de sucesso
-            add_webhook_log(
-                lead_data=submission.lead,
-                success=True,
-                status_code=result.get("status_code"),
-                idempotency_key=payload_dict.get('idempotency_key')
-            )
-            
+        with tracer.span("webhook.deliver", **{"webhook.destination": destination.name}) as span:
+            try:
+                result = await loop.run_in_executor(
+                    webhook_executor, tracer.bind(profiler.bind(send_to_destination)),
+                    destination, body, idempotency_key, breaker, get_config_snapshot().transforms
+                )
+            finally:
+                limiter.release(result["success"], time.monotonic() - started)
+                # Envio que não registrou sucesso nem falha (URL inválida, 4xx...)
+                # não pode segurar a vaga de teste do circuito em half_open
+                breaker.release_trial()
+            if not result["success"]:
+                span.set_error(result.get("error"))
+    latency = time.monotonic() - started
+    
+    if result["success"]:
+        webhook_destinations.record(destination.name, "delivered", status_code=result.get("status_code"), latency=latency)
+        add_webhook_log(
+            lead_data=submission.lead,
+            success=True,
+            status_code=result.get("status_code"),
+            idempotency_key=idempotency_key,
+            destination=destination.name
+        )
+        return {"destination": destination.name, "status": "delivered", "status_code": result.get("status_code")}
+    
+    error = result.get("error")
+    if spool_reason:
+        logger.warning(f"Submissão {idempotency_key} para {destination.name} enviada ao spool ({spool_reason})")
+        error = f"Encaminhamento adiado ({spool_reason}); submissão guardada no spool"
+    else:
+        logger.error(f"Webhook forwarding to {destination.name} failed: {error}")
+    webhook_destinations.record(destination.name, "failed" if not spool_reason else "queued", error=error, latency=latency)
+    add_webhook_log(
+        lead_data=submission.lead,
+        success=False,
+        error=error,
+        idempotency_key=idempotency_key,
+        destination=destination.name
+    )
+    return {"destination": destination.name, "status": "queued" if spool_reason else "failed",
+            "reason": spool_reason, "error": result.get("error"), "body": body}
+
+# Webhook proxy endpoint to bypass CORS
+@app.post("/api/form/webhook", openapi_extra=raw_json_body_openapi(FormSubmission))
+async def webhook_proxy(submission: FormSubmission = Depends(raw_json_body(FormSubmission))):
+    """
+    Proxy endpoint to forward form submissions to n8n webhook
+    This bypasses CORS issues by making the request server-side
+    
+    O lead é roteado por `configuracao.webhook_routes` e entregue a todos os
+    destinos em paralelo. Destinos indisponíveis ficam no spool; o lead só é
+    recusado (502/503) se não foi entregue nem guardado para nenhum destino.
+    """
+    # Log the received submission for debugging
+    logger.info(f"Webhook proxy received submission: {submission.idempotency_key}")
+    logger.info(f"Lead data: {submission.lead}")
+    logger.info(f"Eligibility: {submission.eligibility}")
+    
+    try:
+        # Serialização única: os mesmos bytes são medidos, assinados e enviados
+        body = model_to_json_bytes(submission)
+        idempotency_key = submission.idempotency_key
+        destinations, rules = route_submission(submission)
+        
+        deliveries = await asyncio.gather(*(deliver_webhook(destination, body, submission) for destination in destinations))
+        payloads = [delivery.pop("body", None) for delivery in deliveries]
+        
+        async def spool(delivery, payload, reason):
+            # Gravação em disco: fora do event loop
+            if await run_blocking(spool_submission, payload, reason, delivery["destination"]):
+                delivery.update(status="queued", reason=reason)
+            else:
+                delivery.update(status="failed", reason=reason, error="spool indisponível")
+        
+        for delivery, payload in zip(deliveries, payloads):
+            if delivery["status"] == "queued":
+                await spool(delivery, payload, delivery["reason"])
+        
+        # Se algum destino aceitou o lead, os envios que falharam também vão para o
+        # spool, em vez de o cliente reenviar tudo (e duplicar nos que já receberam)
+        accepted = any(d["status"] != "failed" for d in deliveries)
+        if accepted:
+            for delivery, payload in zip(deliveries, payloads):
+                if delivery["status"] == "failed" and not delivery.get("reason"):
+                    await spool(delivery, payload, "delivery_failed")
+        
+        if all(d["status"] == "delivered" for d in deliveries):
+            logger.info(f"Webhook forwarded successfully to {len(deliveries)} destination(s)")
             return {
                 "success": True,
                 "message": "Form submitted successfully to n8n",
-                "idempotency_key": payload_dict.get('idempotency_key'),
-                "webhook_status": result["status_code"]
+                "idempotency_key": idempotency_key,
+                "webhook_status": deliveries[0]["status_code"],
+                "deliveries": deliveries,
+                "rules": rules
             }
-        else:
-            logger.error(f"Webhook forwarding failed: {result['error']}")
-            
-            # Registrar log de erro
-            add_webhook_log(
-                lead_data=submission.lead,
-                success=False,
-                error=result.get('error'),
-                idempotency_key=payload_dict.get('idempotency_key')
+        
+        if accepted:
+            return JSONResponse(
+                status_code=202,
+                content={
+                    "success": True,
+                    "queued": True,
+                    "message": "Form received and queued for delivery",
+                    "idempotency_key": idempotency_key,
+                    "deliveries": deliveries,
+                    "rules": rules
+                }
             )
-            
+        
+        send_errors = [d for d in deliveries if not d.get("reason")]
+        if not send_errors:
+            # Nada entregue e o spool também falhou
             raise HTTPException(
-                status_code=502,
+                status_code=503,
                 detail={
-                    "error": "Failed to forward to webhook",
-                    "message": "Unable to process your submission at this time. Please try again.",
-                    "details": result["error"]
+                    "error": "Webhook temporarily unavailable",
+                    "message": "Unable to process your submission at this time. Please try again."
                 }
             )
+        
+        raise HTTPException(
+            status_code=502,
+            detail={
+                "error": "Failed to forward to webhook",
+                "message": "Unable to process your submission at this time. Please try again.",
+                "details": "; ".join(f"{d['destination']}: {d.get('error')}" for d in send_errors)
+            }
+        )
             
     except HTTPException:
         raise
@@ -645,6 +1177,310 @@ class FundoCreate(BaseModel):
 class FundoUpdate(BaseModel):
     fundo: Fundo
 
+# Snapshot imutável da configuração, recompilado quando o arquivo muda
+def build_config_snapshot(config):
+    """Valida a configuração e monta as estruturas derivadas do snapshot.
+    
+    Levanta ValueError se algum fundo não seguir o schema `Fundo`; nesse caso
+    o ConfigStore mantém o snapshot anterior.
+    """
+    fundos = config.get("fundos", {})
+    if not isinstance(fundos, dict):
+        raise ValueError("'fundos' deve ser um objeto")
+    for fundo_id, fundo_data in fundos.items():
+        try:
+            Fundo.model_validate(fundo_data)
+        except ValidationError as e:
+            raise ValueError(f"Fundo '{fundo_id}' inválido: {e.errors(include_url=False)}")
+    
+    index = EligibilityIndex(fundos)
+    return {
+        "eligibility": index,
+        "catalog": FundCatalog(fundos),
+        "responses": {
+            "form_config": dumps(build_form_config(config)),
+            "admin_fundos": dumps({
+                "success": True,
+                "fundos": fundos,
+                "opcoes_formulario": config.get("opcoes_formulario", {})
+            }),
+        },
+        **build_snapshot_settings(config, index),
+    }
+
+def build_snapshot_settings(config, index):
+    """Partes baratas do snapshot, sempre montadas no próprio processo"""
+    opcoes = config.get("opcoes_formulario", {})
+    validators = {field: frozenset(values) for field, values in LEAD_ALLOWED_VALUES.items()}
+    for opcao, field in OPCOES_LEAD_FIELDS.items():
+        extra = [opt.get("value") for opt in opcoes.get(opcao, []) if isinstance(opt, dict)]
+        validators[field] = validators[field].union(v for v in extra if v)
+    configuracao = config.get("configuracao", {})
+    router = WebhookRouter(
+        configuracao.get("webhook_routes"),
+        config.get("fundos", {}),
+        configuracao.get("webhook_url", DEFAULT_WEBHOOK_URL),
+        WEBHOOK_TIMEOUT,
+    )
+    return {
+        # Parte do ETag das respostas que incluem opcoes_formulario
+        "opcoes_etag": make_etag(dumps(opcoes)),
+        "ranker": Ranker(index, configuracao.get("ranking")),
+        "router": router,
+        # Compilados sob demanda e guardados junto com esta versão da configuração
+        "transforms": PayloadTransformer({
+            name: destination.transform
+            for name, destination in router.destinations.items()
+            if destination.transform
+        }),
+        "validators": validators,
+    }
+
+def snapshot_build_id():
+    """Identifica o código que gera o snapshot compilado (muda a cada deploy)"""
+    digest = hashlib.sha256()
+    for module in ("server.py", "eligibility.py", "fund_catalog.py", "snapshot_file.py", "serialization.py"):
+        st = os.stat(Path(__file__).parent / module)
+        digest.update(f"{module}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return digest.hexdigest()[:12]
+
+def default_snapshot_dir():
+    # /dev/shm é tmpfs: o arquivo mapeado nunca toca o disco
+    base = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+    return os.path.join(base, "investiza-config-snapshots")
+
+# Snapshot compilado em arquivo, mapeado por todos os workers (CONFIG_SNAPSHOT_DIR=off desliga)
+_snapshot_dir_setting = os.getenv("CONFIG_SNAPSHOT_DIR", "")
+snapshot_files = None if _snapshot_dir_setting.lower() == "off" else SnapshotDirectory(
+    _snapshot_dir_setting or default_snapshot_dir(), snapshot_build_id()
+)
+
+def compile_config_snapshot(config, version=None):
+    """Estruturas derivadas da configuração `version`.
+    
+    Com o diretório de snapshots ativo, o primeiro processo que vê a versão
+    compila e grava o arquivo binário; os demais mapeiam o arquivo em vez de
+    validar e recompilar tudo. `config` já chega parseado (ConfigStore) e as
+    tabelas de validação/ranking continuam montadas por processo a partir
+    dele. Sem o diretório, ou se ele falhar, compila em memória.
+    """
+    with tracer.span("config.compile", root=True, **{"config.version": version}) as span:
+        derived = _compile_config_snapshot(config, version)
+        span.set_attribute("config.fundos", len(derived["eligibility"]))
+        return derived
+
+def _compile_config_snapshot(config, version):
+    if snapshot_files is None or version is None:
+        return build_config_snapshot(config)
+    try:
+        snapshot_file = snapshot_files.open_or_build(version, lambda: build_config_snapshot(config))
+    except OSError as e:
+        logger.warning(f"Snapshot compilado indisponível ({e}); compilando em memória")
+        snapshot_file = None
+    if snapshot_file is None:
+        return build_config_snapshot(config)
+    derived = load_derived(snapshot_file)
+    derived.update(build_snapshot_settings(config, derived["eligibility"]))
+    return derived
+
+def on_config_published(snapshot):
+    # Corpos comprimidos da versão anterior não podem ser servidos para a nova
+    if response_compressor.cache is not None:
+        response_compressor.cache.invalidate()
+
+config_store = ConfigStore(get_fundos_config_path, compile_config_snapshot, on_config_published)
+config_watcher = ConfigWatcher(config_store, poll_interval=float(os.getenv("CONFIG_POLL_INTERVAL", "2")))
+
+def get_config_snapshot():
+    """Snapshot atual da configuração (somente leitura)"""
+    return config_store.current()
+
+# Tarefas periódicas de manutenção (SCHEDULER_ENABLED=0 desliga). Jobs exclusivos
+# rodam em um só worker por horário (lock em SCHEDULER_LOCK_DIR)
+scheduler = JobScheduler(
+    os.getenv("SCHEDULER_LOCK_DIR", str(Path(__file__).parent / "data" / "scheduler")),
+    enabled=os.getenv("SCHEDULER_ENABLED", "1") == "1",
+)
+
+def purge_expired_state():
+    """Remove do backend de estado tentativas de login, tokens e contagens expirados"""
+    for namespace in ("login_attempts", "tokens", webhook_rollup.namespace):
+        state_backend.purge_expired(namespace)
+
+def compact_snapshot_files():
+    """Remove snapshots compilados antigos e sobras de gravações interrompidas"""
+    if snapshot_files is None:
+        return {"removed": 0}
+    return {"removed": snapshot_files.prune(stale_after=3600)}
+
+def replay_spool_job(limit=50):
+    """Reenvia o spool quando há itens; destinos com circuito aberto continuam esperando"""
+    if not webhook_spool.count():
+        return {"sent": 0, "failed": 0, "pending": 0}
+    result = replay_webhook_spool(limit)
+    if result["sent"] or result["failed"] or result["dead_lettered"]:
+        logger.info(f"Replay do spool: {result}")
+    return result
+
+scheduler.add("purge-expired-state", purge_expired_state,
+              os.getenv("STATE_PURGE_SCHEDULE", "60"), jitter=5)
+scheduler.add("compact-config-snapshots", compact_snapshot_files,
+              os.getenv("SNAPSHOT_COMPACT_SCHEDULE", "*/15 * * * *"), jitter=30)
+# Cada worker grava as próprias contagens (chave por worker): não exclusivo
+scheduler.add("webhook-stats-rollup", webhook_rollup.flush,
+              os.getenv("WEBHOOK_STATS_SCHEDULE", "60"), jitter=5, exclusive=False)
+# Com a agenda desligada (0) o job continua registrado para o replay manual,
+# que usa o mesmo lock entre workers
+_spool_replay_schedule = os.getenv("WEBHOOK_SPOOL_REPLAY_SCHEDULE", "60")
+scheduler.add("webhook-spool-replay", replay_spool_job,
+              _spool_replay_schedule if _spool_replay_schedule != "0" else None, jitter=10)
+
+if not isinstance(state_backend, MemoryStateBackend) and os.getenv("SSE_RELAY_INTERVAL", "1") != "0":
+    scheduler.add("webhook-log-relay", webhook_log_relay.poll, os.getenv("SSE_RELAY_INTERVAL", "1"), exclusive=False)
+
+def apply_probe_result(name, result):
+    """Registra a sondagem do destino neste worker e ajusta o circuito conforme o resultado.
+
+    Destino fora (falhas seguidas da sonda): o circuito abre já, e os leads vão
+    direto para o spool em vez de esperar o timeout do envio. Quando a sonda
+    volta a responder, o circuito aberto por ela é fechado e o replay do spool
+    retoma as entregas.
+    """
+    _probe_seen[name] = result["at"]
+    previous, state = webhook_prober.record(name, result)
+    breaker = webhook_destinations.breaker(name)
+    if state == "down":
+        breaker.trip(f"Sonda: {result['error']}")
+        if name not in _probe_tripped:
+            _probe_tripped.add(name)
+            logger.warning(f"Destino {name} fora segundo a sonda ({result['error']}); circuito aberto")
+    elif name in _probe_tripped:
+        _probe_tripped.discard(name)
+        breaker.reset()
+        logger.info(f"Destino {name} voltou a responder à sonda; circuito fechado")
+    return state
+
+def probe_webhooks():
+    """Sonda cada destino configurado, aplica o resultado neste worker e o publica
+    no estado compartilhado para os demais (sync_webhook_probes)"""
+    router = get_config_snapshot().router
+    states = {}
+    for name, destination in router.destinations.items():
+        if not destination.url:
+            continue
+        result = probe_url(destination.url, timeout=WEBHOOK_PROBE_TIMEOUT, method=WEBHOOK_PROBE_METHOD)
+        state_backend.set(PROBE_NAMESPACE, name, result)
+        states[name] = apply_probe_result(name, result)
+    for name in state_backend.keys(PROBE_NAMESPACE):
+        if name not in router.destinations:
+            state_backend.delete(PROBE_NAMESPACE, name)
+    webhook_prober.retain(router.destinations)
+    return states
+
+def sync_webhook_probes():
+    """Aplica neste worker as sondagens que outro worker publicou desde a última leitura"""
+    router = get_config_snapshot().router
+    applied = 0
+    for name in router.destinations:
+        result = state_backend.get(PROBE_NAMESPACE, name)
+        if result is None or result.get("at") == _probe_seen.get(name):
+            continue
+        apply_probe_result(name, result)
+        applied += 1
+    webhook_prober.retain(router.destinations)
+    return applied
+
+# Um worker sonda por horário (exclusivo) e publica o resultado no estado
+# compartilhado; os demais o aplicam ao próprio prober e circuitos (por processo)
+if os.getenv("WEBHOOK_PROBE_SCHEDULE", "30") != "0":
+    scheduler.add("webhook-probe", probe_webhooks,
+                  os.getenv("WEBHOOK_PROBE_SCHEDULE", "30"), jitter=5)
+    if not isinstance(state_backend, MemoryStateBackend):
+        scheduler.add("webhook-probe-sync", sync_webhook_probes,
+                      os.getenv("WEBHOOK_PROBE_SYNC_INTERVAL", "5"), exclusive=False)
+
+@asynccontextmanager
+async def lifespan(app):
+    """Inicia watcher, monitor do loop e agendador no worker; para tudo no desligamento"""
+    config_store.current()
+    config_watcher.start()
+    loop_monitor.start()
+    scheduler.start()
+    try:
+        yield
+    finally:
+        await scheduler.stop()
+        webhook_rollup.flush()
+        loop_monitor.stop()
+        config_watcher.stop()
+        if tracer.exporter is not None:
+            tracer.exporter.flush()
+
+app.router.lifespan_context = lifespan
+
+# Estado do snapshot da configuração
+@app.get("/api/admin/config-status")
+async def get_config_status(api_key: str = Depends(get_api_key)):
+    """
+    Retorna a versão ativa da configuração, o modo do watcher e o último erro de validação
+    """
+    return {
+        "success": True,
+        "config": config_store.status(),
+        "watcher": config_watcher.status(),
+        "snapshot_files": snapshot_files.status() if snapshot_files else None
+    }
+
+@app.post("/api/admin/config-reload")
+async def reload_config(api_key: str = Depends(get_api_key)):
+    """
+    Força a releitura do arquivo de configuração
+    """
+    reloaded = await run_blocking(config_store.reload, force=True)
+    return {"success": config_store.last_error is None, "reloaded": reloaded, "config": config_store.status()}
+
+# Chamadas agrupadas (single-flight)
+@app.get("/api/admin/single-flight")
+async def get_single_flight(api_key: str = Depends(get_api_key)):
+    """
+    Retorna, por operação, chamadas recebidas, execuções e quantas foram agrupadas numa execução em andamento
+    """
+    compile_stats = None
+    if snapshot_files is not None:
+        compile_stats = {
+            "writes": snapshot_files.writes,
+            "hits": snapshot_files.hits,
+            "coalesced": snapshot_files.coalesced,
+        }
+    return {
+        "success": True,
+        "config_reload": config_store.reload_flight.snapshot(),
+        "config_compile": compile_stats,
+        "eligibility": eligibility_flight.snapshot(),
+    }
+
+# Métricas do controle de admissão
+@app.get("/api/admin/admission")
+async def get_admission_status(api_key: str = Depends(get_api_key)):
+    """
+    Retorna, por classe de rota, requisições em andamento, profundidade da fila e descartes
+    """
+    return json_response({"success": True, "admission": admission.snapshot()})
+
+@app.get("/api/admin/tracing")
+async def get_tracing_status(api_key: str = Depends(get_api_key)):
+    """
+    Retorna a amostragem do tracing e os contadores do exporter de spans (por worker)
+    """
+    return json_response({"success": True, "tracing": tracer.snapshot()})
+
+@app.get("/api/admin/compression")
+async def get_compression_status(api_key: str = Depends(get_api_key)):
+    """
+    Retorna os contadores da compressão gzip das respostas (por worker) e do cache de corpos comprimidos
+    """
+    return json_response({"success": True, "compression": response_compressor.snapshot()})
+
 # Endpoint de autenticação para admin
 # class LoginRequest(BaseModel):
 #     email: str
@@ -700,6 +1536,10 @@ class FundoUpdate(BaseModel):
 #         "expires_at": expires_at
 #     }
 
+# Validação adicional da URL do webhook para evitar injeção
+WEBHOOK_URL_PATTERN = re.compile(r'^https?://[\w\-\.]+(:\d+)?(/[\w\-\.~:/?#[\]@!\$&\'\(\)\*\+,;=]+)?$')
+WEBHOOK_DOMAIN_PATTERN = re.compile(r"^https?://([^/]+)")
+
 # Admin webhook update endpoint
 @app.post("/api/admin/webhook")
 async def update_webhook(webhook_update: WebhookUpdate, api_key: str = Depends(get_api_key)):
@@ -707,15 +1547,12 @@ async def update_webhook(webhook_update: WebhookUpdate, api_key: str = Depends(g
     Endpoint para admin atualizar URL do webhook
     """
     try:
-        import re
-        
         # Validar se a URL é válida (verificação aprimorada)
         if not webhook_update.webhook_url.startswith(('http://', 'https://')):
             raise HTTPException(status_code=400, detail="URL deve começar com http:// ou https://")
         
         # Validação adicional da URL para evitar injeção
-        url_pattern = re.compile(r'^https?://[\w\-\.]+(:\d+)?(/[\w\-\.~:/?#[\]@!\$&\'\(\)\*\+,;=]+)?$')
-        if not url_pattern.match(webhook_update.webhook_url):
+        if not WEBHOOK_URL_PATTERN.match(webhook_update.webhook_url):
             raise HTTPException(status_code=400, detail="URL contém caracteres inválidos")
             
         # Limitar comprimento da URL
@@ -724,7 +1561,7 @@ async def update_webhook(webhook_update: WebhookUpdate, api_key: str = Depends(g
         
         # Lista de domínios permitidos (opcional)
         allowed_domains = ["2n8n.ominicrm.com", "webhook.site", "api.investiza.com"]
-        url_domain = re.search(r"^https?://([^/]+)", webhook_update.webhook_url)
+        url_domain = WEBHOOK_DOMAIN_PATTERN.search(webhook_update.webhook_url)
         
         if url_domain:
             domain = url_domain.group(1)
@@ -741,16 +1578,14 @@ async def update_webhook(webhook_update: WebhookUpdate, api_key: str = Depends(g
                 # raise HTTPException(status_code=400, detail="Domínio não permitido para webhook")
                 # Opção mais permissiva: apenas registrar o aviso
         
-        # Carregar configuração atual
-        config = load_fundos_config()
-        
         # Sanitizar a URL (extra precaução)
         sanitized_url = webhook_update.webhook_url
-        config["configuracao"]["webhook_url"] = sanitized_url
         
-        # Salvar configuração
-        if not save_fundos_config(config):
-            raise HTTPException(status_code=500, detail="Erro ao salvar configuração")
+        def apply(config):
+            config["configuracao"]["webhook_url"] = sanitized_url
+        
+        # Carregar, alterar e salvar a configuração fora do event loop
+        await run_blocking(edit_fundos_config, apply)
         
         logger.info(f"Webhook URL atualizada para: {sanitized_url}")
         
@@ -772,146 +1607,437 @@ async def get_webhook_logs(api_key: str = Depends(get_api_key)):
     """
     Retorna os logs das tentativas de webhook
     """
+    # range() descarrega o lote pendente e lê o backend (SQLite/Redis): fora do loop
+    return json_response({
+        "success": True,
+        "logs": await run_blocking(webhook_logs.range)
+    })
+
+# Stream (SSE) dos novos logs do webhook
+@app.get("/api/admin/webhook-logs/stream")
+async def stream_webhook_logs(request: Request, last_event_id: Optional[str] = None, api_key: str = Depends(get_api_key)):
+    """
+    Envia cada novo log do webhook como evento SSE `webhook_log`.
+    
+    Retoma a partir do header Last-Event-ID (ou do parâmetro `last_event_id`)
+    enquanto o evento ainda estiver no buffer; caso contrário envia `reset`
+    para o cliente recarregar a lista.
+    """
+    # O assinante só é registrado quando a resposta começa (no gerador)
+    if not webhook_events.has_capacity():
+        raise HTTPException(status_code=503, detail="Muitas conexões abertas no stream de logs", headers={"Retry-After": "10"})
+    
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        webhook_events.stream(resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Estado do circuit breaker / limite de concorrência do webhook
+@app.get("/api/admin/webhook-circuit")
+async def get_webhook_circuit(api_key: str = Depends(get_api_key)):
+    """
+    Retorna o estado do circuit breaker, do limite adaptativo e do spool
+    (`circuit_breaker` e `concurrency` são os do destino padrão; os de cada
+    destino ficam em `destinations`)
+    """
     return {
         "success": True,
-        "logs": webhook_logs
+        "circuit_breaker": webhook_breaker.snapshot(),
+        "destinations": webhook_destinations.snapshot(),
+        "concurrency": webhook_limiter.snapshot(),
+        "spool": webhook_spool.snapshot(),
+        "events": webhook_events.snapshot()
     }
 
+@app.post("/api/admin/webhook-circuit/reset")
+async def reset_webhook_circuit(destino: Optional[str] = None, api_key: str = Depends(get_api_key)):
+    """
+    Fecha o circuit breaker manualmente (ex.: após reativar o workflow no n8n).
+    Sem `destino`, fecha o de todos os destinos.
+    """
+    webhook_destinations.reset(destino)
+    logger.info(f"Circuit breaker do webhook reiniciado manualmente ({destino or 'todos os destinos'})")
+    return {"success": True, "circuit_breaker": webhook_breaker.snapshot(), "destinations": webhook_destinations.snapshot()}
+
+# Tabela de roteamento dos webhooks
+@app.get("/api/admin/webhook-routes")
+async def get_webhook_routes(api_key: str = Depends(get_api_key)):
+    """
+    Retorna destinos e regras compilados de `configuracao.webhook_routes`, o status de entrega
+    e o das transformações jq por destino
+    """
+    snapshot = get_config_snapshot()
+    return json_response({
+        "success": True,
+        "routes": snapshot.router.describe(),
+        "destinations": webhook_destinations.snapshot(),
+        "transforms": snapshot.transforms.status(),
+        "gzip_refused": sorted(webhook_gzip_refused)
+    })
+
+@app.post("/api/admin/webhook-routes/preview", openapi_extra=raw_json_body_openapi(FormSubmission))
+async def preview_webhook_routes(submission: FormSubmission = Depends(raw_json_body(FormSubmission)), api_key: str = Depends(get_api_key)):
+    """
+    Mostra para quais destinos uma submissão seria encaminhada, e o payload após a
+    transformação jq de cada destino que tiver uma, sem enviar nada
+    """
+    snapshot = get_config_snapshot()
+    destinations, rules = route_submission(submission, snapshot)
+    body = model_to_json_bytes(submission)
+    preview = []
+    for d in destinations:
+        item = {"name": d.name, "url": d.url}
+        if d.transform:
+            item["payload"] = loads(snapshot.transforms.apply(d.name, body))
+        preview.append(item)
+    return json_response({
+        "success": True,
+        "rules": rules,
+        "destinations": preview
+    })
+
+def replay_webhook_spool(limit=50):
+    """Reenvia submissões do spool, cada uma ao seu destino, enquanto o circuito do destino permitir.
+
+    A transformação aplicada é a da configuração atual do destino. `limit`
+    conta tentativas de envio: itens de destinos bloqueados nesta rodada são
+    pulados sem consumir o limite, para que não segurem os de outros destinos.
+    Itens ilegíveis ou de destinos que saíram da configuração vão para o
+    dead-letter do spool em vez de voltar à frente da fila a cada rodada.
+    """
+    snapshot = get_config_snapshot()
+    router = snapshot.router
+    sent = failed = dead_lettered = 0
+    blocked = set()  # destinos com circuito aberto ou que falharam nesta rodada
+    for path in webhook_spool.pending():
+        if sent + failed >= limit:
+            break
+        try:
+            meta, body = webhook_spool.read_item(path)
+            idempotency_key = loads(body).get("idempotency_key")
+        except (OSError, ValueError) as e:
+            logger.error(f"Item inválido no spool {path}: {e}; movido para o dead-letter")
+            webhook_spool.dead_letter(path)
+            dead_lettered += 1
+            continue
+        name = meta.get("destination") or DEFAULT_DESTINATION
+        if name in blocked:
+            continue
+        destination = router.destinations.get(name)
+        if destination is None:
+            logger.warning(f"Destino {name} não existe mais na configuração; item {path} movido para o dead-letter")
+            webhook_spool.dead_letter(path)
+            dead_lettered += 1
+            continue
+        breaker = webhook_destinations.breaker(name)
+        if not breaker.allow_request():
+            blocked.add(name)
+            continue
+        try:
+            result = send_to_destination(destination, body, idempotency_key, breaker, snapshot.transforms)
+        finally:
+            breaker.release_trial()
+        if result["success"]:
+            webhook_spool.remove(path)
+            webhook_destinations.record(name, "delivered", status_code=result.get("status_code"))
+            sent += 1
+        else:
+            webhook_destinations.record(name, "failed", error=result.get("error"))
+            failed += 1
+            blocked.add(name)
+    return {"sent": sent, "failed": failed, "dead_lettered": dead_lettered, "pending": webhook_spool.count()}
+
+@app.post("/api/admin/webhook-spool/replay")
+async def replay_spool(limit: int = 50, api_key: str = Depends(get_api_key)):
+    """
+    Reenvia ao webhook as submissões guardadas no spool (pelo job
+    webhook-spool-replay: não concorre com o replay de outro worker)
+    """
+    job = scheduler.jobs["webhook-spool-replay"]
+    if not await scheduler.run(job.name, limit=max(1, min(limit, 500))):
+        raise HTTPException(status_code=409, detail="Replay do spool já em andamento")
+    if job.last_error is not None:
+        raise HTTPException(status_code=500, detail=f"Replay do spool falhou: {job.last_error}")
+    return {"success": True, **job.last_result}
+
+class ProfilingSettings(BaseModel):
+    sample_rate: float = Field(..., ge=0, le=1, description="Fração das requisições amostradas (0 desliga)")
+
+# Profiling amostral (por worker)
+@app.get("/api/admin/profiling")
+async def get_profiling(api_key: str = Depends(get_api_key)):
+    """
+    Resumo do profiling amostral por rota
+    """
+    return {"success": True, **profiler.summary()}
+
+@app.get("/api/admin/profiling/collapsed")
+async def get_profiling_collapsed(route: Optional[str] = None, api_key: str = Depends(get_api_key)):
+    """
+    Pilhas agregadas em formato collapsed (flamegraph.pl / speedscope)
+    """
+    return PlainTextResponse(profiler.collapsed(route))
+
+@app.post("/api/admin/profiling")
+async def update_profiling(settings: ProfilingSettings, api_key: str = Depends(get_api_key)):
+    """
+    Altera a taxa de amostragem deste worker
+    """
+    profiler.sample_rate = settings.sample_rate
+    logger.info(f"Taxa de amostragem do profiling alterada para {settings.sample_rate}")
+    return {"success": True, **profiler.summary()}
+
+@app.post("/api/admin/profiling/reset")
+async def reset_profiling(api_key: str = Depends(get_api_key)):
+    """
+    Descarta as amostras acumuladas
+    """
+    profiler.reset()
+    return {"success": True}
+
+# Atraso do event loop
+@app.get("/api/admin/loop-lag")
+async def get_loop_lag(api_key: str = Depends(get_api_key)):
+    """
+    Retorna o histograma do atraso do event loop e os últimos bloqueios, com rota e pilha
+    """
+    return {"success": True, "loop": loop_monitor.snapshot()}
+
+@app.post("/api/admin/loop-lag/reset")
+async def reset_loop_lag(api_key: str = Depends(get_api_key)):
+    """
+    Zera o histograma e os bloqueios registrados
+    """
+    loop_monitor.reset()
+    return {"success": True}
+
+# Tarefas periódicas
+@app.get("/api/admin/jobs")
+async def get_jobs(api_key: str = Depends(get_api_key)):
+    """
+    Retorna agenda, próxima execução e métricas de duração/falhas de cada job (deste worker)
+    """
+    return {"success": True, "scheduler": scheduler.snapshot()}
+
+@app.post("/api/admin/jobs/{name}/run")
+async def run_job(name: str, api_key: str = Depends(get_api_key)):
+    """
+    Executa um job agora (jobs exclusivos respeitam o lock entre workers)
+    """
+    if name not in scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    ran = await scheduler.run(name)
+    return {"success": True, "ran": ran, "job": scheduler.jobs[name].snapshot()}
+
+# Sonda dos destinos de webhook
+@app.get("/api/admin/webhook-probe")
+async def get_webhook_probe(api_key: str = Depends(get_api_key)):
+    """
+    Retorna, por destino, estado da sonda, latência por fase (DNS, conexão, TLS, primeiro byte) e histórico recente
+    """
+    return {"success": True, "probe": webhook_prober.snapshot(), "tripped": sorted(_probe_tripped)}
+
+# Entregas do webhook por hora
+@app.get("/api/admin/webhook-stats")
+async def get_webhook_stats(hours: int = 24, api_key: str = Depends(get_api_key)):
+    """
+    Retorna entregas por hora, destino e status (delivered/queued/failed), somadas entre os workers
+    """
+    await run_blocking(webhook_rollup.flush)
+    stats = await run_blocking(webhook_rollup.totals, max(1, min(hours, 24 * 31)))
+    return {"success": True, "hours": stats}
+
 # Endpoint para testar webhook
 @app.post("/api/debug/webhook-test")
 async def test_webhook(api_key: str = Depends(get_api_key)):
     """
-    Testa a conexão com o webhook configurado
+    Testa a conexão com o webhook configurado com a mesma sonda do job
+    webhook-probe (HEAD numa conexão nova): não dispara o workflow do n8n
+    nem entra no log de envios
     """
-    try:
-        # Criar um payload de teste
-        test_data = {
-            "idempotency_key": str(uuid.uuid4()),
-            "timestamp": datetime.utcnow().isoformat(),
-            "test": True,
-            "message": "Webhook test message from Investiza Form"
-        }
-        
-        # Carregar URL do webhook
-        config = load_fundos_config()
-        webhook_url = config.get("configuracao", {}).get("webhook_url", "https://2n8n.ominicrm.com/webhook/650b310d-cd0b-465a-849d-7c7a3991572e")
-        
-        if not webhook_url:
-            logger.error("URL de webhook não configurada")
-            return {"success": False, "error": "URL de webhook não configurada"}
-        
-        # Importar time localmente para evitar erros de escopo
-        import time
-        current_time = int(time.time())
-        
-        # Enviar teste
-        try:
-            logger.info(f"Enviando teste para webhook: {webhook_url}")
-            
-            response = requests.post(
-                webhook_url,
-                json=test_data,
-                headers={
-                    "Content-Type": "application/json",
-                    "User-Agent": "Investiza-Form/1.0",
-                    "X-Investiza-Test": "true",
-                    "X-Investiza-Timestamp": str(current_time),
-                    "X-Investiza-Source": "admin-panel"
-                },
-                timeout=10  # Timeout aumentado para 10 segundos
-            )
-            
-            # Registramos informações mesmo se o status não for 2xx
-            logger.info(f"Resposta do webhook: Status {response.status_code} - {response.text[:100]}")
-            
-            # Apenas para status codes 4xx e 5xx
-            if response.status_code >= 400:
-                logger.warning(f"Webhook respondeu com erro: {response.status_code} - {response.text[:200]}")
-            else:
-                response.raise_for_status()
-            
-            # Registrar no log de webhook
-            add_webhook_log(
-                lead_data=None,
-                success=response.status_code < 400,
-                status_code=response.status_code,
-                idempotency_key=test_data["idempotency_key"]
-            )
-            
-            return {
-                "success": response.status_code < 400,
-                "status_code": response.status_code,
-                "response": response.text[:200],
-                "message": "Webhook testado com sucesso"
-            }
-            
-        except requests.RequestException as e:
-            # Registrar no log do sistema
-            error_msg = f"Erro na requisição ao webhook: {str(e)}"
-            logger.error(error_msg)
-            
-            # Adicionar aos logs de webhook
-            add_webhook_log(
-                lead_data=None,
-                success=False,
-                error=error_msg,
-                idempotency_key=test_data["idempotency_key"]
-            )
-            
-            return {
-                "success": False,
-                "error": error_msg
-            }
-        
-    except Exception as e:
-        error_msg = f"Erro inesperado ao testar webhook: {str(e)}"
-        logger.error(error_msg)
-        return {
-            "success": False,
-            "error": error_msg
-        }
+    webhook_url = get_config_snapshot().configuracao.get("webhook_url", DEFAULT_WEBHOOK_URL)
+    if not webhook_url:
+        logger.error("URL de webhook não configurada")
+        return {"success": False, "error": "URL de webhook não configurada"}
+
+    result = await run_blocking(probe_url, webhook_url, timeout=WEBHOOK_PROBE_TIMEOUT, method=WEBHOOK_PROBE_METHOD)
+    if result["ok"]:
+        logger.info(f"Teste do webhook: HTTP {result['status_code']} em {result['total_ms']} ms")
+    else:
+        logger.warning(f"Teste do webhook falhou: {result['error']}")
+    return {
+        "success": result["ok"],
+        "status_code": result["status_code"],
+        "error": result["error"],
+        "probe": result,
+        "message": "Webhook acessível" if result["ok"] else "Webhook inacessível",
+    }
+
+# Tamanho de página das listagens administrativas
+ADMIN_FUNDOS_DEFAULT_PAGE = 50
+ADMIN_FUNDOS_MAX_PAGE = 500
 
 # Get all fundos
 @app.get("/api/admin/fundos")
-async def get_fundos(api_key: str = Depends(get_api_key)):
+async def get_fundos(
+    request: Request,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    tipo: Optional[str] = None,
+    ativo: Optional[bool] = None,
+    regiao: Optional[str] = None,
+    segmento: Optional[str] = None,
+    fields: Optional[str] = None,
+    include_opcoes: bool = True,
+    api_key: str = Depends(get_api_key)
+):
     """
-    Retorna todos os fundos com seus critérios
+    Retorna os fundos com seus critérios.
+    
+    Sem parâmetros, devolve o mapa completo (formato original). Com `limit`,
+    `cursor` ou algum filtro, devolve uma página em ordem de id com
+    `next_cursor`; `fields` restringe os campos de cada fundo (ex.:
+    `nome,ativo,criterios.regioes`) e `include_opcoes=false` omite
+    `opcoes_formulario`. Responde 304 quando o If-None-Match confere.
     """
     try:
-        config = load_fundos_config()
-        return {
-            "success": True,
-            "fundos": config.get("fundos", {}),
-            "opcoes_formulario": config.get("opcoes_formulario", {})
+        snapshot = get_config_snapshot()
+        if_none_match = request.headers.get("if-none-match")
+        
+        legacy = (limit is None and cursor is None and fields is None and include_opcoes
+                  and tipo is None and ativo is None and regiao is None and segmento is None)
+        if legacy:
+            etag = f'"{snapshot.version}"'
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+            return raw_json_response(snapshot.responses["admin_fundos"], headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+        
+        if limit is not None and not 1 <= limit <= ADMIN_FUNDOS_MAX_PAGE:
+            raise HTTPException(status_code=400, detail=f"limit deve estar entre 1 e {ADMIN_FUNDOS_MAX_PAGE}")
+        try:
+            after = decode_cursor(cursor) if cursor else None
+            projection = parse_fields(fields) if fields else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # O ETag da página depende só da versão da configuração e dos parâmetros
+        etag = make_etag(f"{snapshot.version}|{request.url.query}".encode("utf-8"))
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        catalog = snapshot.catalog
+        mask = catalog.filter_mask(tipo=tipo, ativo=ativo, regiao=regiao, segmento=segmento)
+        page_ids, next_id, total = catalog.page(mask, after=after, limit=limit or ADMIN_FUNDOS_DEFAULT_PAGE)
+        
+        # Sem projeção, reaproveita o JSON pré-serializado de cada fundo
+        if projection is None:
+            items = [dumps(fund_id) + b":" + catalog.fund_json[fund_id] for fund_id in page_ids]
+        else:
+            items = [dumps(fund_id) + b":" + dumps(project(snapshot.fundos[fund_id], projection)) for fund_id in page_ids]
+        meta = {
+            "total": total,
+            "count": len(page_ids),
+            "next_cursor": encode_cursor(next_id) if next_id is not None else None
         }
+        if include_opcoes:
+            meta["opcoes_formulario"] = snapshot.opcoes_formulario
+        body = b'{"success":true,"fundos":{' + b",".join(items) + b"}," + dumps(meta)[1:]
+        return raw_json_response(body, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao carregar fundos: {str(e)}")
         raise HTTPException(status_code=500, detail="Erro interno do servidor")
 
 # Get specific fundo
 @app.get("/api/admin/fundos/{fundo_id}")
-async def get_fundo(fundo_id: str, api_key: str = Depends(get_api_key)):
+async def get_fundo(
+    fundo_id: str,
+    request: Request,
+    fields: Optional[str] = None,
+    include_opcoes: bool = True,
+    api_key: str = Depends(get_api_key)
+):
     """
-    Retorna dados de um fundo específico
+    Retorna dados de um fundo específico (ETag por fundo; 304 se não mudou)
     """
     try:
-        config = load_fundos_config()
-        fundos = config.get("fundos", {})
+        snapshot = get_config_snapshot()
+        fundos = snapshot.fundos
         
         if fundo_id not in fundos:
             raise HTTPException(status_code=404, detail="Fundo não encontrado")
         
-        return {
+        try:
+            projection = parse_fields(fields) if fields else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # ETag do fundo; com opcoes_formulario (padrão) a representação também
+        # depende das opções, e cada projeção tem ETag próprio
+        etag = snapshot.catalog.fund_etags[fundo_id]
+        if projection is not None or include_opcoes:
+            opcoes_etag = snapshot.opcoes_etag if include_opcoes else ""
+            etag = make_etag(f"{etag}|{fields or ''}|{opcoes_etag}".encode("utf-8"))
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        content = {
             "success": True,
-            "fundo": fundos[fundo_id],
-            "opcoes_formulario": config.get("opcoes_formulario", {})
+            "fundo": project(fundos[fundo_id], projection) if projection is not None else fundos[fundo_id]
         }
+        if include_opcoes:
+            content["opcoes_formulario"] = snapshot.opcoes_formulario
+        response = json_response(content)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Erro ao carregar fundo {fundo_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Erro interno do servidor")
 
+# Sanitizar e validar o ID do fundo
+def sanitize_id(id_string):
+    if not isinstance(id_string, str):
+        raise HTTPException(status_code=400, detail="ID do fundo deve ser uma string")
+    
+    # Permitir apenas caracteres alfanuméricos e sublinhados, limitar comprimento
+    sanitized = "".join(c for c in id_string if c.isalnum() or c == '_')
+    if len(sanitized) > 30:
+        sanitized = sanitized[:30]
+    
+    # Verificar se o ID sanitizado é válido
+    if not sanitized or sanitized != id_string:
+        raise HTTPException(status_code=400, detail="ID do fundo contém caracteres inválidos")
+        
+    return sanitized
+
+# Sanitizar e validar o nome do fundo
+def sanitize_nome(nome):
+    if not isinstance(nome, str):
+        raise HTTPException(status_code=400, detail="Nome do fundo deve ser uma string")
+    
+    # Permitir apenas caracteres alfanuméricos, espaços e pontuação comum
+    sanitized = "".join(c for c in nome if c.isalnum() or c.isspace() or c in '-_.,()&')
+    if len(sanitized) > 100:
+        sanitized = sanitized[:100]
+    
+    # Verificar se o nome sanitizado é válido
+    if not sanitized or sanitized != nome:
+        raise HTTPException(status_code=400, detail="Nome do fundo contém caracteres inválidos")
+        
+    return sanitized
+
+TIPOS_FUNDO_VALIDOS = ["constitucional", "privado", "desenvolvimento", "pf"]
+
+def validate_tipo_fundo(tipo):
+    if tipo not in TIPOS_FUNDO_VALIDOS:
+        raise HTTPException(status_code=400, detail=f"Tipo de fundo inválido. Deve ser um dos seguintes: {', '.join(TIPOS_FUNDO_VALIDOS)}")
+
 # Create new fundo
 @app.post("/api/admin/fundos")
 async def create_fundo(fundo_create: FundoCreate, api_key: str = Depends(get_api_key)):
@@ -919,60 +2045,24 @@ async def create_fundo(fundo_create: FundoCreate, api_key: str = Depends(get_api
     Cria um novo fundo
     """
     try:
-        # Sanitizar e validar o ID do fundo
-        def sanitize_id(id_string):
-            if not isinstance(id_string, str):
-                raise HTTPException(status_code=400, detail="ID do fundo deve ser uma string")
-            
-            # Permitir apenas caracteres alfanuméricos e sublinhados, limitar comprimento
-            sanitized = "".join(c for c in id_string if c.isalnum() or c == '_')
-            if len(sanitized) > 30:
-                sanitized = sanitized[:30]
-            
-            # Verificar se o ID sanitizado é válido
-            if not sanitized or sanitized != id_string:
-                raise HTTPException(status_code=400, detail="ID do fundo contém caracteres inválidos")
-                
-            return sanitized
-        
-        # Sanitizar e validar o nome do fundo
-        def sanitize_nome(nome):
-            if not isinstance(nome, str):
-                raise HTTPException(status_code=400, detail="Nome do fundo deve ser uma string")
-            
-            # Permitir apenas caracteres alfanuméricos, espaços e pontuação comum
-            sanitized = "".join(c for c in nome if c.isalnum() or c.isspace() or c in '-_.,()&')
-            if len(sanitized) > 100:
-                sanitized = sanitized[:100]
-            
-            # Verificar se o nome sanitizado é válido
-            if not sanitized or sanitized != nome:
-                raise HTTPException(status_code=400, detail="Nome do fundo contém caracteres inválidos")
-                
-            return sanitized
-        
         # Aplicar sanitização
         fundo_id = sanitize_id(fundo_create.id)
         fundo_create.fundo.nome = sanitize_nome(fundo_create.fundo.nome)
         
-        config = load_fundos_config()
-        fundos = config.get("fundos", {})
-        
-        if fundo_id in fundos:
-            raise HTTPException(status_code=400, detail="Fundo já existe")
-        
-        # Validar tipo do fundo
-        tipos_validos = ["constitucional", "privado", "desenvolvimento", "pf"]
-        if fundo_create.fundo.tipo not in tipos_validos:
-            raise HTTPException(status_code=400, detail=f"Tipo de fundo inválido. Deve ser um dos seguintes: {', '.join(tipos_validos)}")
-        
-        # Adicionar novo fundo
-        fundos[fundo_id] = fundo_create.fundo.dict()
-        config["fundos"] = fundos
+        def apply(config):
+            fundos = config.get("fundos", {})
+            
+            if fundo_id in fundos:
+                raise HTTPException(status_code=400, detail="Fundo já existe")
+            
+            # Validar tipo do fundo
+            validate_tipo_fundo(fundo_create.fundo.tipo)
+            
+            # Adicionar novo fundo
+            fundos[fundo_id] = fundo_create.fundo.dict()
+            config["fundos"] = fundos
         
-        # Salvar configuração
-        if not save_fundos_config(config):
-            raise HTTPException(status_code=500, detail="Erro ao salvar configuração")
+        await run_blocking(edit_fundos_config, apply)
         
         logger.info(f"Novo fundo criado: {fundo_id}")
         
@@ -988,6 +2078,166 @@ async def create_fundo(fundo_create: FundoCreate, api_key: str = Depends(get_api
         logger.error(f"Erro ao criar fundo: {str(e)}")
         raise HTTPException(status_code=500, detail="Erro interno do servidor")
 
+# Importação/atualização em lote
+BULK_MAX_ITEMS = 5000
+BULK_CSV_LIST_SEPARATOR = "|"
+
+class BulkFundoItem(BaseModel):
+    id: str = Field(..., description="ID único do fundo")
+    fundo: Fundo
+
+class BulkFundosRequest(BaseModel):
+    items: List[Dict[str, Any]] = Field(..., description="Itens no formato de FundoCreate ({id, fundo})")
+    mode: str = Field(default="upsert", description="create, update ou upsert")
+    all_or_nothing: bool = Field(default=True, description="Se algum item falhar, nada é gravado")
+    dry_run: bool = Field(default=False, description="Só valida e informa o resultado de cada item, sem gravar")
+
+def parse_fundos_csv(text):
+    """Converte CSV (id,nome,tipo,ativo,<critérios>) em itens {id, fundo}.
+
+    Listas de critérios usam "|" como separador (ex.: Nordeste|Norte).
+    """
+    import csv
+    import io
+    
+    items = []
+    for row in csv.DictReader(io.StringIO(text)):
+        row = {(k or "").strip(): (v or "").strip() for k, v in row.items()}
+        criterios = {
+            field: [v.strip() for v in row[field].split(BULK_CSV_LIST_SEPARATOR) if v.strip()]
+            for field in CriteriosFundo.model_fields
+            if field in row
+        }
+        fundo = {"nome": row.get("nome", ""), "tipo": row.get("tipo", ""), "criterios": criterios}
+        if row.get("ativo"):
+            fundo["ativo"] = row["ativo"].lower() in ("1", "true", "sim", "s", "yes")
+        items.append({"id": row.get("id", ""), "fundo": fundo})
+    return items
+
+def validate_bulk_item(raw, mode, fundos, seen):
+    """Valida um item do lote; retorna (id, dados do fundo, ação) ou levanta HTTPException"""
+    try:
+        item = BulkFundoItem.model_validate(raw)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    
+    fundo_id = sanitize_id(item.id)
+    item.fundo.nome = sanitize_nome(item.fundo.nome)
+    validate_tipo_fundo(item.fundo.tipo)
+    
+    if fundo_id in seen:
+        raise HTTPException(status_code=400, detail="ID repetido no lote")
+    exists = fundo_id in fundos
+    if mode == "create" and exists:
+        raise HTTPException(status_code=400, detail="Fundo já existe")
+    if mode == "update" and not exists:
+        raise HTTPException(status_code=404, detail="Fundo não encontrado")
+    return fundo_id, item.fundo.model_dump(), "updated" if exists else "created"
+
+@app.post("/api/admin/fundos/bulk")
+async def bulk_fundos(
+    request: Request,
+    mode: Optional[str] = None,
+    all_or_nothing: Optional[bool] = None,
+    dry_run: Optional[bool] = None,
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Cria/atualiza vários fundos numa única gravação do arquivo de configuração.
+    
+    Aceita JSON (`{"items": [{"id", "fundo"}], "mode", "all_or_nothing"}`) ou
+    CSV (`Content-Type: text/csv`, com `mode`/`all_or_nothing`/`dry_run` na
+    query). Retorna o resultado de cada item; com `dry_run` só valida.
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    try:
+        if "csv" in content_type:
+            bulk = BulkFundosRequest(items=parse_fundos_csv(body.decode("utf-8-sig")))
+        else:
+            bulk = BulkFundosRequest.model_validate_json(body)
+    except (ValidationError, UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Lote inválido: {e}")
+    
+    # Parâmetros da query têm precedência (únicos disponíveis no CSV)
+    mode = mode or bulk.mode
+    if all_or_nothing is None:
+        all_or_nothing = bulk.all_or_nothing
+    if dry_run is None:
+        dry_run = bulk.dry_run
+    if mode not in ("create", "update", "upsert"):
+        raise HTTPException(status_code=400, detail="mode deve ser create, update ou upsert")
+    if not bulk.items:
+        raise HTTPException(status_code=400, detail="Lote vazio")
+    if len(bulk.items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Lote excede o limite de {BULK_MAX_ITEMS} itens")
+    
+    def apply_bulk():
+        with config_edit_lock:
+            config = load_fundos_config()
+            fundos = config.setdefault("fundos", {})
+            
+            results = []
+            changes = {}
+            for position, raw in enumerate(bulk.items):
+                raw_id = raw.get("id") if isinstance(raw, dict) else None
+                try:
+                    fundo_id, fundo_data, action = validate_bulk_item(raw, mode, fundos, changes)
+                except HTTPException as e:
+                    results.append({"index": position, "id": raw_id, "status": "error", "error": e.detail})
+                    continue
+                changes[fundo_id] = fundo_data
+                results.append({"index": position, "id": fundo_id, "status": action})
+            
+            failed = sum(1 for r in results if r["status"] == "error")
+            # Uma única gravação atômica (e uma única recompilação do snapshot)
+            if changes and not dry_run and not (failed and all_or_nothing):
+                fundos.update(changes)
+                if not save_fundos_config(config):
+                    raise HTTPException(status_code=500, detail="Erro ao salvar configuração")
+            return results, changes, failed
+    
+    try:
+        # Validação de milhares de itens e a gravação ficam fora do event loop
+        results, changes, failed = await run_blocking(apply_bulk)
+        # Prévia: status de cada item como se o lote fosse aplicado
+        if dry_run:
+            return {
+                "success": failed == 0,
+                "dry_run": True,
+                "applied": 0,
+                "valid": len(changes),
+                "failed": failed,
+                "results": results
+            }
+        
+        if failed and all_or_nothing:
+            for r in results:
+                if r["status"] != "error":
+                    r["status"] = "skipped"
+            return JSONResponse(status_code=400, content={
+                "success": False,
+                "message": f"{failed} item(ns) inválido(s); nenhuma alteração gravada",
+                "applied": 0,
+                "failed": failed,
+                "results": results
+            })
+        
+        logger.info(f"Lote de fundos aplicado: {len(changes)} alterado(s), {failed} com erro")
+        
+        return {
+            "success": failed == 0,
+            "applied": len(changes),
+            "failed": failed,
+            "version": get_config_snapshot().version,
+            "results": results
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao aplicar lote de fundos: {str(e)}")
+        raise HTTPException(status_code=500, detail="Erro interno do servidor")
+
 # Update fundo
 @app.put("/api/admin/fundos/{fundo_id}")
 async def update_fundo(fundo_id: str, fundo_update: FundoUpdate, api_key: str = Depends(get_api_key)):
@@ -995,26 +2245,25 @@ async def update_fundo(fundo_id: str, fundo_update: FundoUpdate, api_key: str =
     Atualiza um fundo existente
     """
     try:
-        config = load_fundos_config()
-        fundos = config.get("fundos", {})
-        
-        if fundo_id not in fundos:
-            raise HTTPException(status_code=404, detail="Fundo não encontrado")
-        
-        # Atualizar fundo
-        fundos[fundo_id] = fundo_update.fundo.dict()
-        config["fundos"] = fundos
+        def apply(config):
+            fundos = config.get("fundos", {})
+            
+            if fundo_id not in fundos:
+                raise HTTPException(status_code=404, detail="Fundo não encontrado")
+            
+            # Atualizar fundo
+            fundos[fundo_id] = fundo_update.fundo.dict()
+            config["fundos"] = fundos
+            return fundos[fundo_id]
         
-        # Salvar configuração
-        if not save_fundos_config(config):
-            raise HTTPException(status_code=500, detail="Erro ao salvar configuração")
+        fundo = await run_blocking(edit_fundos_config, apply)
         
         logger.info(f"Fundo atualizado: {fundo_id}")
         
         return {
             "success": True,
             "message": "Fundo atualizado com sucesso",
-            "fundo": fundos[fundo_id]
+            "fundo": fundo
         }
         
     except HTTPException:
@@ -1030,19 +2279,17 @@ async def delete_fundo(fundo_id: str, api_key: str = Depends(get_api_key)):
     Desativa um fundo (não remove, apenas marca como inativo)
     """
     try:
-        config = load_fundos_config()
-        fundos = config.get("fundos", {})
-        
-        if fundo_id not in fundos:
-            raise HTTPException(status_code=404, detail="Fundo não encontrado")
+        def apply(config):
+            fundos = config.get("fundos", {})
+            
+            if fundo_id not in fundos:
+                raise HTTPException(status_code=404, detail="Fundo não encontrado")
+            
+            # Desativar fundo
+            fundos[fundo_id]["ativo"] = False
+            config["fundos"] = fundos
         
-        # Desativar fundo
-        fundos[fundo_id]["ativo"] = False
-        config["fundos"] = fundos
-        
-        # Salvar configuração
-        if not save_fundos_config(config):
-            raise HTTPException(status_code=500, detail="Erro ao salvar configuração")
+        await run_blocking(edit_fundos_config, apply)
         
         logger.info(f"Fundo desativado: {fundo_id}")
         
@@ -1057,131 +2304,145 @@ async def delete_fundo(fundo_id: str, api_key: str = Depends(get_api_key)):
         logger.error(f"Erro ao desativar fundo {fundo_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Erro interno do servidor")
 
+def eligibility_signature(lead, explain):
+    """Chave do resultado da avaliação: só os campos do lead que entram nela.
+
+    As listas mantêm a ordem recebida, que aparece nos motivos da resposta.
+    """
+    return (
+        explain,
+        lead.situacao_empresa,
+        lead.faturamento_renda,
+        lead.local,
+        tuple(lead.segmento),
+        tuple(lead.razao),
+        tuple(lead.garantia),
+        lead.tipo_imovel if "Imovel" in lead.garantia else None,
+    )
+
+def evaluate_eligibility(snapshot, lead, explain):
+    """Resposta de /api/admin/avaliar-elegibilidade para `lead` na configuração `snapshot`"""
+    # Mapeamento para termos descritivos de faturamento/renda
+    faturamento_map = {
+        '<10': 'até R$ 10 milhões',
+        '10-80': 'R$ 10 a R$ 80 milhões',
+        '>80': 'R$ 80 a R$ 300 milhões',
+        '>300': 'acima de R$ 300 milhões',
+        'nao_tem': 'ainda não fatura/não tem renda comprovável',
+        'ate_5k': 'até R$ 5.000',
+        '5k_15k': 'R$ 5.000 a R$ 15.000',
+        '15k_50k': 'R$ 15.000 a R$ 50.000',
+        'acima_50k': 'acima de R$ 50.000',
+    }
+
+    index = snapshot.eligibility
+    
+    recomendados = []
+    possiveis_atipicos = []
+    nao_elegiveis = []
+    
+    # Compilar situação da empresa com recuperação judicial
+    situacao_empresa = lead.situacao_empresa
+    if situacao_empresa == 'recuperacao_judicial':
+        # Aqui assumirei que existe um campo separado na estrutura do lead
+        situacao_empresa = f"recuperacao_judicial_homologada"  # Por simplicidade
+    
+    lead_values = {
+        "situacao_empresa": (situacao_empresa,),
+        "faturamento_renda": (lead.faturamento_renda,),
+        "regioes": (lead.local,),
+        "segmentos": lead.segmento,
+        "razoes": lead.razao,
+        "garantias": lead.garantia,
+    }
+    # Tipo imóvel só se aplica quando a garantia inclui imóvel
+    if "Imovel" in lead.garantia:
+        lead_values["tipo_imovel"] = (lead.tipo_imovel,)
+    
+    motivos = {
+        "situacao_empresa": f"Situação empresarial '{situacao_empresa}' não aceita",
+        "faturamento_renda": f"Faturamento/renda '{faturamento_map.get(lead.faturamento_renda, lead.faturamento_renda)}' não aceita",
+        "regioes": f"Região '{lead.local}' não atendida",
+        "segmentos": f"Segmentos {lead.segmento} não aceitos",
+        "razoes": f"Razões {lead.razao} não aceitas",
+        "garantias": f"Garantias {lead.garantia} não aceitas",
+        "tipo_imovel": f"Tipo de imóvel '{lead.tipo_imovel}' não aceito",
+    }
+    
+    with tracer.span("eligibility.evaluate", **{"eligibility.fundos": len(index)}) as span:
+        explicit = index.explicit_masks(lead_values)
+        masks = index.masks(lead_values, explicit)
+        eligible, first_failure = index.evaluate(lead_values, masks)
+        near_miss = near_miss_mask(index, masks)
+        span.set_attribute("eligibility.elegiveis", bin(eligible).count("1"))
+    
+    # Recomendados e quase elegíveis ordenados por score
+    ranker = snapshot.ranker
+    for pos, score in ranker.rank(eligible, explicit):
+        recomendados.append({
+            "id": index.fund_ids[pos],
+            "nome": index.names[pos],
+            "motivo": "Atende todos os critérios estabelecidos",
+            "score": score
+        })
+    for pos, score in ranker.rank(near_miss, explicit):
+        failed = first_failure[pos]
+        possiveis_atipicos.append({
+            "id": index.fund_ids[pos],
+            "nome": index.names[pos],
+            "motivo": f"Atende todos os critérios exceto um: {motivos[failed]}",
+            "dimensao": failed,
+            "score": score
+        })
+    
+    # Demais reprovados, na ordem dos fundos na configuração
+    for pos in iter_bits(index.all_mask & ~eligible & ~near_miss):
+        nao_elegiveis.append({
+            "id": index.fund_ids[pos],
+            "nome": index.names[pos],
+            "motivo": motivos[first_failure[pos]]
+        })
+    
+    if explain:
+        failures = index.failure_masks(masks)
+        for item in possiveis_atipicos + nao_elegiveis:
+            pos = index.positions[item["id"]]
+            item["falhas"] = [
+                {
+                    "dimensao": dimension,
+                    "motivo": motivos[dimension],
+                    "valor_lead": list(lead_values[dimension]),
+                    "aceitos": list(index.accepted[pos][dimension])
+                }
+                for dimension in failed_dimensions(failures[pos])
+            ]
+    
+    return {
+        "success": True,
+        "elegibilidade": {
+            "recomendados": recomendados,
+            "possiveis_atipicos": possiveis_atipicos,
+            "nao_elegiveis": nao_elegiveis,
+            "top_k": [item["id"] for item in recomendados[:ranker.top_k]]
+        }
+    }
+
+# Avaliações idênticas simultâneas (ex.: aba Preview do painel) compartilham uma execução
+eligibility_flight = AsyncSingleFlight()
+
 # Avaliar elegibilidade dinâmica
 @app.post("/api/admin/avaliar-elegibilidade")
-async def avaliar_elegibilidade(lead: LeadData, api_key: str = Depends(get_api_key)):
-    """Avalia elegibilidade baseado nos critérios dinâmicos dos fundos"""
+async def avaliar_elegibilidade(lead: LeadData, explain: bool = False, api_key: str = Depends(get_api_key)):
+    """Avalia elegibilidade baseado nos critérios dinâmicos dos fundos.
+    
+    Com `explain=true`, cada fundo reprovado traz em `falhas` todos os
+    critérios não atendidos (dimensão, valor do lead e valores aceitos).
+    """
     try:
-        # Mapeamento para termos descritivos de faturamento/renda
-        faturamento_map = {
-            '<10': 'até R$ 10 milhões',
-            '10-80': 'R$ 10 a R$ 80 milhões',
-            '>80': 'R$ 80 a R$ 300 milhões',
-            '>300': 'acima de R$ 300 milhões',
-            'nao_tem': 'ainda não fatura/não tem renda comprovável',
-            'ate_5k': 'até R$ 5.000',
-            '5k_15k': 'R$ 5.000 a R$ 15.000',
-            '15k_50k': 'R$ 15.000 a R$ 50.000',
-            'acima_50k': 'acima de R$ 50.000',
-        }
-
-        config = load_fundos_config()
-        fundos = config.get("fundos", {})
-        
-        recomendados = []
-        possiveis_atipicos = []
-        nao_elegiveis = []
-        
-        # Compilar situação da empresa com recuperação judicial
-        situacao_empresa = lead.situacao_empresa
-        if situacao_empresa == 'recuperacao_judicial':
-            # Aqui assumirei que existe um campo separado na estrutura do lead
-            situacao_empresa = f"recuperacao_judicial_homologada"  # Por simplicidade
-        
-        for fundo_id, fundo_data in fundos.items():
-            if not fundo_data.get("ativo", True):
-                continue
-                
-            criterios = fundo_data.get("criterios", {})
-            nome_fundo = fundo_data.get("nome", fundo_id)
-            
-            # Verificar critérios
-            matched = True
-            motivo_rejeicao = ""
-            
-            # Situação empresa
-            situacoes_aceitas = criterios.get("situacao_empresa", [])
-            if situacoes_aceitas and "todos" not in situacoes_aceitas:
-                if situacao_empresa not in situacoes_aceitas:
-                    matched = False
-                    motivo_rejeicao = f"Situação empresarial '{situacao_empresa}' não aceita"
-            
-            # Faturamento/Renda
-            if matched:
-                faturamentos_aceitos = criterios.get("faturamento_renda", [])
-                if faturamentos_aceitos and "todos" not in faturamentos_aceitas:
-                    if lead.faturamento_renda not in faturamentos_aceitos:
-                        matched = False
-                        motivo_rejeicao = f"Faturamento/renda '{faturamento_map.get(lead.faturamento_renda, lead.faturamento_renda)}' não aceita"
-            
-            # Região
-            if matched:
-                regioes_aceitas = criterios.get("regioes", [])
-                if regioes_aceitas and "todos" not in regioes_aceitas:
-                    if lead.local not in regioes_aceitas:
-                        matched = False
-                        motivo_rejeicao = f"Região '{lead.local}' não atendida"
-            
-            # Segmentos
-            if matched:
-                segmentos_aceitos = criterios.get("segmentos", [])
-                if segmentos_aceitos and "todos" not in segmentos_aceitas:
-                    # Verificar se pelo menos um segmento do lead está nos aceitos
-                    segmentos_match = any(seg in segmentos_aceitas for seg in lead.segmento)
-                    if not segmentos_match:
-                        matched = False
-                        motivo_rejeicao = f"Segmentos {lead.segmento} não aceitos"
-            
-            # Razões
-            if matched:
-                razoes_aceitas = criterios.get("razoes", [])
-                if razoes_aceitas and "todos" not in razoes_aceitas:
-                    # Verificar se pelo menos uma razão do lead está nas aceitas
-                    razoes_match = any(razao in razoes_aceitas for razao in lead.razao)
-                    if not razoes_match:
-                        matched = False
-                        motivo_rejeicao = f"Razões {lead.razao} não aceitas"
-            
-            # Garantias
-            if matched:
-                garantias_aceitas = criterios.get("garantias", [])
-                if garantias_aceitas and "todos" not in garantias_aceitas:
-                    # Verificar se pelo menos uma garantia do lead está nas aceitas
-                    garantias_match = any(gar in garantias_aceitas for gar in lead.garantia)
-                    if not garantias_match:
-                        matched = False
-                        motivo_rejeicao = f"Garantias {lead.garantia} não aceitas"
-            
-            # Tipo imóvel (se aplicável)
-            if matched and "Imovel" in lead.garantia:
-                tipos_imovel_aceitos = criterios.get("tipo_imovel", [])
-                if tipos_imovel_aceitos:
-                    if not lead.tipo_imovel or lead.tipo_imovel not in tipos_imovel_aceitos:
-                        matched = False
-                        motivo_rejeicao = f"Tipo de imóvel '{lead.tipo_imovel}' não aceito"
-            
-            # Classificar resultado
-            if matched:
-                recomendados.append({
-                    "id": fundo_id,
-                    "nome": nome_fundo,
-                    "motivo": "Atende todos os critérios estabelecidos"
-                })
-            else:
-                nao_elegiveis.append({
-                    "id": fundo_id,
-                    "nome": nome_fundo,
-                    "motivo": motivo_rejeicao
-                })
-        
-        return {
-            "success": True,
-            "elegibilidade": {
-                "recomendados": recomendados,
-                "possiveis_atipicos": possiveis_atipicos,
-                "nao_elegiveis": nao_elegiveis
-            }
-        }
+        snapshot = get_config_snapshot()
+        key = (snapshot.generation, eligibility_signature(lead, explain))
+        result = await eligibility_flight.do(key, run_blocking, evaluate_eligibility, snapshot, lead, explain)
+        return json_response(result)
         
     except Exception as e:
         logger.error(f"Erro ao avaliar elegibilidade: {str(e)}")
@@ -1215,6 +2476,7 @@ static_dir = "/app/static"
 static_files_dir = "/app/static/static"  # Os arquivos CSS/JS estão aqui
 if os.path.exists(static_files_dir):
     # Servir arquivos estáticos do frontend (CSS, JS)
+    from fastapi.staticfiles import StaticFiles
     app.mount("/static", StaticFiles(directory=static_files_dir), name="static")
 
 # Servir o index.html na rota raiz
@@ -0,0 +1,121 @@
+"""
+Single-flight: chamadas concorrentes com a mesma chave esperam uma única
+execução em andamento em vez de repetir o trabalho.
+
+O primeiro chamador de uma chave (líder) executa a função; quem chega com a
+mesma chave enquanto ela roda recebe o mesmo resultado (ou a mesma exceção).
+Não é cache: terminada a execução, a próxima chamada executa de novo. A
+chave precisa identificar o resultado por completo (ex.: versão da
+configuração + assinatura normalizada do lead).
+
+`SingleFlight` é para threads (ConfigStore, executor); `AsyncSingleFlight`
+para corrotinas no event loop, onde a execução roda numa task própria: se o
+líder for cancelado (cliente desconectou), os demais continuam esperando o
+mesmo resultado.
+"""
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class _Stats:
+    def __init__(self):
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_waiters = 0
+
+    def snapshot(self, in_flight):
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / self.calls, 3) if self.calls else None,
+            "errors": self.errors,
+            "max_waiters": self.max_waiters,
+            "in_flight": in_flight,
+        }
+
+
+class SingleFlight(_Stats):
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                self.max_waiters = max(self.max_waiters, call.waiters)
+
+        if leader:
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+                self.errors += 1
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def snapshot(self):
+        with self._lock:
+            return super().snapshot(len(self._calls))
+
+
+class AsyncSingleFlight(_Stats):
+    """Versão para o event loop (sem locks, como o AdmissionController)"""
+
+    def __init__(self):
+        super().__init__()
+        self._tasks = {}  # chave -> [task, chamadores que entraram depois do líder]
+
+    async def do(self, key, fn, *args, **kwargs):
+        """`fn(*args, **kwargs)` deve retornar um awaitable"""
+        self.calls += 1
+        entry = self._tasks.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            entry = self._tasks[key] = [task, 0]
+            self.executions += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+            entry[1] += 1
+            self.max_waiters = max(self.max_waiters, entry[1])
+        return await asyncio.shield(entry[0])
+
+    def _finish(self, key, task):
+        entry = self._tasks.get(key)
+        if entry is not None and entry[0] is task:
+            del self._tasks[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def snapshot(self):
+        return super().snapshot(len(self._tasks))
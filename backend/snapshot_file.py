@@ -0,0 +1,394 @@
+"""
+Formato binário do snapshot compilado da configuração, mapeado em memória.
+
+Um arquivo por versão da configuração guarda o que é caro de montar e igual
+em todos os workers: o índice de elegibilidade (tabelas de vocabulário e
+bitsets por dimensão/valor), o catálogo de fundos (JSON e ETag de cada
+fundo, máscaras dos filtros) e as respostas pré-serializadas. O primeiro
+processo que precisa da versão valida, compila e grava o arquivo; os demais
+(e os workers novos) fazem `mmap` somente leitura em vez de repetir a
+validação e a compilação.
+
+O que fica de fato compartilhado no page cache são os blobs grandes: o JSON
+de cada fundo, as respostas pré-serializadas e os valores aceitos por fundo
+(modo explain), servidos como fatias do mapeamento sem cópia. Cada worker
+continua lendo e parseando o `fundos_criterios.json` (o snapshot guarda a
+configuração congelada e as tabelas de validação/ranking, montadas a partir
+dela) e desempacota os bitsets em `int` do próprio processo, porque o AND
+das máscaras no caminho quente precisa de inteiros Python. Essas cópias por
+worker são pequenas (`width` bytes por máscara) e o desempacotamento é
+linear no tamanho da seção.
+
+Layout (inteiros little-endian):
+
+    MAGIC (8 bytes) | tamanho do meta (u32) | meta JSON | padding até 8
+    | seções de dados, cada uma alinhada em 8 bytes
+
+O meta JSON traz a tabela de seções (`nome -> [offset, tamanho]`, com offset
+relativo ao início dos dados) e os metadados de cada estrutura (ids,
+vocabulário, ordem das máscaras). Bitsets ocupam `width` bytes cada, com
+`width` suficiente para o número de fundos.
+"""
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from eligibility import DIMENSIONS, EligibilityIndex
+from fund_catalog import FundCatalog
+from serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"IVZSNAP\x01"
+_HEADER = struct.Struct("<8sI")
+_ALIGN = 8
+
+
+def _aligned(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def mask_width(count):
+    """Bytes por bitset para `count` fundos"""
+    return max(1, (count + 7) // 8)
+
+
+def pack_masks(masks, width):
+    return b"".join(mask.to_bytes(width, "little") for mask in masks)
+
+
+def unpack_masks(view, width):
+    return [int.from_bytes(view[i:i + width], "little") for i in range(0, len(view), width)]
+
+
+class SnapshotFile:
+    """Arquivo de snapshot mapeado em memória (somente leitura).
+
+    As fatias devolvidas por `section` são memoryviews do mapeamento, sem
+    cópia; o mapeamento vive enquanto alguma delas estiver em uso.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        if len(self._mmap) < _HEADER.size:
+            raise ValueError(f"{path}: arquivo truncado")
+        magic, meta_len = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: não é um snapshot ({magic!r})")
+        meta_end = _HEADER.size + meta_len
+        self.meta = loads(bytes(self._view[_HEADER.size:meta_end]))
+        self._data_start = _aligned(meta_end)
+        if self._data_start + self.meta["data_size"] != len(self._mmap):
+            raise ValueError(f"{path}: arquivo truncado")
+
+    @property
+    def size(self):
+        return len(self._mmap)
+
+    def section(self, name):
+        offset, length = self.meta["sections"][name]
+        start = self._data_start + offset
+        return self._view[start:start + length]
+
+
+def write_snapshot_file(path, meta, sections):
+    """Grava o arquivo de forma atômica (temporário + rename)"""
+    table = {}
+    offset = 0
+    for name, data in sections.items():
+        table[name] = [offset, len(data)]
+        offset = _aligned(offset + len(data))
+    meta_bytes = dumps({**meta, "sections": table, "data_size": offset})
+
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=path.name, suffix=".tmp")
+    try:
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, len(meta_bytes)))
+            f.write(meta_bytes)
+            f.write(b"\0" * (_aligned(_HEADER.size + len(meta_bytes)) - _HEADER.size - len(meta_bytes)))
+            for data in sections.values():
+                f.write(data)
+                f.write(b"\0" * (_aligned(len(data)) - len(data)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# -- índice de elegibilidade ------------------------------------------------
+
+def dump_eligibility(index):
+    """(meta, bitsets, JSON dos valores aceitos por fundo) do EligibilityIndex"""
+    width = mask_width(len(index))
+    vocab = {dimension: list(index.by_value[dimension]) for dimension in DIMENSIONS}
+    masks = []
+    for dimension in DIMENSIONS:
+        masks.append(index.accepts_all[dimension])
+        masks.extend(index.by_value[dimension][value] for value in vocab[dimension])
+    meta = {
+        "fund_ids": list(index.fund_ids),
+        "names": list(index.names),
+        "tipos": list(index.tipos),
+        "vocab": vocab,
+        "width": width,
+    }
+    accepted = dumps([[list(accepted[dimension]) for dimension in DIMENSIONS] for accepted in index.accepted])
+    return meta, pack_masks(masks, width), accepted
+
+
+class _MappedAccepted:
+    """`EligibilityIndex.accepted` lido do arquivo só quando usado (modo explain)"""
+
+    def __init__(self, view):
+        self._view = view
+        self._rows = None
+
+    def __len__(self):
+        return len(self._load())
+
+    def __getitem__(self, pos):
+        return self._load()[pos]
+
+    def _load(self):
+        if self._rows is None:
+            self._rows = tuple(dict(zip(DIMENSIONS, map(tuple, row))) for row in loads(bytes(self._view)))
+        return self._rows
+
+
+def load_eligibility(meta, bitsets, accepted):
+    """EligibilityIndex do arquivo; as máscaras viram `int` deste processo"""
+    index = EligibilityIndex.__new__(EligibilityIndex)
+    index.fund_ids = tuple(meta["fund_ids"])
+    index.names = tuple(meta["names"])
+    index.tipos = tuple(meta["tipos"])
+    index.positions = {fid: pos for pos, fid in enumerate(index.fund_ids)}
+    index.all_mask = (1 << len(index.fund_ids)) - 1
+    index.accepted = _MappedAccepted(accepted)
+    masks = iter(unpack_masks(bitsets, meta["width"]))
+    index.accepts_all = {}
+    index.by_value = {}
+    for dimension in DIMENSIONS:
+        index.accepts_all[dimension] = next(masks)
+        index.by_value[dimension] = {value: next(masks) for value in meta["vocab"][dimension]}
+    return index
+
+
+# -- catálogo de fundos -----------------------------------------------------
+
+def dump_catalog(catalog):
+    """(meta, bitsets, JSON concatenado dos fundos) do FundCatalog"""
+    width = mask_width(len(catalog.ids))
+    tipos = list(catalog.tipo_masks)
+    vocab = {dimension: list(by_value) for dimension, by_value in catalog.value_masks.items()}
+    masks = [catalog.ativo_mask]
+    masks.extend(catalog.tipo_masks[tipo] for tipo in tipos)
+    for dimension, values in vocab.items():
+        masks.append(catalog.wildcard_masks[dimension])
+        masks.extend(catalog.value_masks[dimension][value] for value in values)
+
+    offsets = []
+    position = 0
+    for fund_id in catalog.ids:
+        length = len(catalog.fund_json[fund_id])
+        offsets.append([position, length])
+        position += length
+    meta = {
+        "ids": list(catalog.ids),
+        "etags": [catalog.fund_etags[fund_id] for fund_id in catalog.ids],
+        "offsets": offsets,
+        "tipos": tipos,
+        "vocab": vocab,
+        "width": width,
+    }
+    blob = b"".join(bytes(catalog.fund_json[fund_id]) for fund_id in catalog.ids)
+    return meta, pack_masks(masks, width), blob
+
+
+def load_catalog(meta, bitsets, blob):
+    """FundCatalog do arquivo: JSON dos fundos em fatias do mapeamento,
+    máscaras desempacotadas em `int` deste processo"""
+    catalog = FundCatalog.__new__(FundCatalog)
+    catalog.ids = tuple(meta["ids"])
+    catalog.all_mask = (1 << len(catalog.ids)) - 1
+    catalog.fund_json = {
+        fund_id: blob[offset:offset + length]
+        for fund_id, (offset, length) in zip(catalog.ids, meta["offsets"])
+    }
+    catalog.fund_etags = dict(zip(catalog.ids, meta["etags"]))
+    masks = iter(unpack_masks(bitsets, meta["width"]))
+    catalog.ativo_mask = next(masks)
+    catalog.tipo_masks = {tipo: next(masks) for tipo in meta["tipos"]}
+    catalog.value_masks = {}
+    catalog.wildcard_masks = {}
+    for dimension, values in meta["vocab"].items():
+        catalog.wildcard_masks[dimension] = next(masks)
+        catalog.value_masks[dimension] = {value: next(masks) for value in values}
+    return catalog
+
+
+# -- diretório de snapshots -------------------------------------------------
+
+class SnapshotDirectory:
+    """Arquivos de snapshot por versão num diretório compartilhado pelos workers.
+
+    `build_id` entra no nome do arquivo: muda quando o código que gera as
+    estruturas muda, para não reaproveitar um arquivo de outra versão do app.
+    """
+
+    def __init__(self, directory, build_id, keep=4):
+        self.directory = Path(directory)
+        self.build_id = build_id
+        self.keep = keep
+        self.hits = 0
+        self.writes = 0
+        self.errors = 0
+        self.coalesced = 0
+
+    def path_for(self, version):
+        return self.directory / f"{version}-{self.build_id}.snap"
+
+    @contextmanager
+    def lock(self, version):
+        """Lock exclusivo por versão: só um processo compila, os outros esperam e mapeiam.
+
+        Entrega True se precisou esperar outro processo.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / f"{version}-{self.build_id}.lock", "a+b") as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                waited = False
+            except BlockingIOError:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                waited = True
+            try:
+                yield waited
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def open_or_build(self, version, build_fn):
+        """SnapshotFile da versão, compilando com `build_fn()` e gravando se ainda não existir.
+
+        Single-flight entre processos: quem encontra o lock ocupado espera a
+        compilação em andamento e mapeia o arquivo dela (conta em `coalesced`).
+        """
+        with self.lock(version) as waited:
+            snapshot_file = self.open(version)
+            if snapshot_file is None:
+                self.write(version, build_fn())
+                snapshot_file = self.open(version)
+            elif waited:
+                self.coalesced += 1
+        return snapshot_file
+
+    def open(self, version):
+        """SnapshotFile da versão, ou None se não existir/for inválido"""
+        path = self.path_for(version)
+        try:
+            snapshot_file = SnapshotFile(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            self.errors += 1
+            logger.warning(f"Snapshot {path} ignorado: {e}")
+            return None
+        self.hits += 1
+        return snapshot_file
+
+    def write(self, version, derived):
+        """Grava as estruturas compiladas de `derived` e remove arquivos antigos"""
+        eligibility_meta, eligibility_bits, eligibility_accepted = dump_eligibility(derived["eligibility"])
+        catalog_meta, catalog_bits, catalog_json = dump_catalog(derived["catalog"])
+        sections = {
+            "eligibility.bitsets": eligibility_bits,
+            "eligibility.accepted": eligibility_accepted,
+            "catalog.bitsets": catalog_bits,
+            "catalog.json": catalog_json,
+        }
+        responses = derived.get("responses", {})
+        for name, body in responses.items():
+            sections[f"response.{name}"] = bytes(body)
+        meta = {
+            "version": version,
+            "build_id": self.build_id,
+            "eligibility": eligibility_meta,
+            "catalog": catalog_meta,
+            "responses": list(responses),
+        }
+        write_snapshot_file(self.path_for(version), meta, sections)
+        self.writes += 1
+        self.prune()
+
+    def prune(self, stale_after=None):
+        """Mantém os `keep` arquivos mais recentes. Com `stale_after` (segundos),
+        remove também temporários de gravações interrompidas e locks sem
+        arquivo (versões que nunca chegaram a ser gravadas) mais antigos que isso"""
+        files = sorted(self.directory.glob("*.snap"), key=lambda p: p.stat().st_mtime, reverse=True)
+        removed = 0
+        for old in files[self.keep:]:
+            try:
+                old.unlink()
+                old.with_suffix(".lock").unlink()
+                removed += 1
+            except OSError:
+                pass
+        if stale_after is not None:
+            cutoff = time.time() - stale_after
+            leftovers = list(self.directory.glob("*.tmp"))
+            leftovers += [lock for lock in self.directory.glob("*.lock") if not lock.with_suffix(".snap").exists()]
+            for path in leftovers:
+                try:
+                    if path.stat().st_mtime < cutoff:
+                        path.unlink()
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def status(self):
+        return {
+            "directory": str(self.directory),
+            "build_id": self.build_id,
+            "hits": self.hits,
+            "writes": self.writes,
+            "errors": self.errors,
+            "coalesced": self.coalesced,
+        }
+
+
+def load_derived(snapshot_file):
+    """Índice, catálogo e respostas de um SnapshotFile.
+
+    Respostas e JSON dos fundos são fatias do mapeamento; as máscaras são
+    copiadas para inteiros do processo (ver docstring do módulo).
+    """
+    meta = snapshot_file.meta
+    return {
+        "eligibility": load_eligibility(
+            meta["eligibility"],
+            snapshot_file.section("eligibility.bitsets"),
+            snapshot_file.section("eligibility.accepted"),
+        ),
+        "catalog": load_catalog(
+            meta["catalog"],
+            snapshot_file.section("catalog.bitsets"),
+            snapshot_file.section("catalog.json"),
+        ),
+        "responses": {name: snapshot_file.section(f"response.{name}") for name in meta["responses"]},
+    }
@@ -0,0 +1,534 @@
+"""
+Backend de estado compartilhado entre workers.
+
+Guarda tokens, tentativas de login e logs do webhook fora da memória do
+processo, para que vários workers do uvicorn enxerguem o mesmo estado.
+
+Backends disponíveis (variável STATE_BACKEND_URL):
+- memory://                    dicionários no próprio processo (padrão, 1 worker)
+- sqlite:////caminho/state.db  arquivo SQLite em modo WAL; use um caminho em
+                               /dev/shm para ter o estado em memória compartilhada
+- redis://host:6379/0          servidor Redis (requer o pacote `redis`)
+- fakeredis://                 implementação em processo do protocolo Redis, para testes
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections.abc import MutableMapping
+
+
+class StateBackend:
+    """Interface comum dos backends de estado.
+
+    Valores são dicts JSON-serializáveis. `ttl` é em segundos.
+    """
+
+    def get(self, namespace, key):
+        raise NotImplementedError
+
+    def set(self, namespace, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, namespace, key):
+        raise NotImplementedError
+
+    def keys(self, namespace):
+        raise NotImplementedError
+
+    def incr(self, namespace, key, ttl):
+        """Incrementa um contador com janela fixa de `ttl` segundos.
+
+        Retorna (contagem, timestamp do início da janela).
+        """
+        raise NotImplementedError
+
+    def purge_expired(self, namespace):
+        """Remove entradas expiradas do namespace"""
+
+    def list_push_many(self, name, items, maxlen):
+        """Insere itens no início da lista (o último item fica mais recente) e corta em `maxlen`"""
+        raise NotImplementedError
+
+    def list_range(self, name, limit):
+        """Retorna até `limit` itens, mais recente primeiro"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryStateBackend(StateBackend):
+    """Estado em dicionários do processo (não compartilhado entre workers)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._kv = {}      # namespace -> {key: (value, expires_at)}
+        self._lists = {}   # name -> [itens, mais recente primeiro]
+
+    def _bucket(self, namespace):
+        return self._kv.setdefault(namespace, {})
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._bucket(namespace).get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._bucket(namespace)[key]
+                return None
+            return value
+
+    def set(self, namespace, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._bucket(namespace)[key] = (value, expires_at)
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._bucket(namespace).pop(key, None)
+
+    def keys(self, namespace):
+        now = time.time()
+        with self._lock:
+            return [k for k, (_, exp) in self._bucket(namespace).items() if exp is None or exp > now]
+
+    def incr(self, namespace, key, ttl):
+        now = time.time()
+        with self._lock:
+            bucket = self._bucket(namespace)
+            entry = bucket.get(key)
+            if entry is None or (entry[1] is not None and entry[1] <= now):
+                value = {"count": 1, "timestamp": now}
+                bucket[key] = (value, now + ttl)
+            else:
+                value = entry[0]
+                value["count"] += 1
+            return value["count"], value["timestamp"]
+
+    def purge_expired(self, namespace):
+        now = time.time()
+        with self._lock:
+            bucket = self._bucket(namespace)
+            for key in [k for k, (_, exp) in bucket.items() if exp is not None and exp <= now]:
+                del bucket[key]
+
+    def list_push_many(self, name, items, maxlen):
+        with self._lock:
+            current = self._lists.get(name, [])
+            self._lists[name] = (list(reversed(items)) + current)[:maxlen]
+
+    def list_range(self, name, limit):
+        with self._lock:
+            return list(self._lists.get(name, [])[:limit])
+
+
+class SQLiteStateBackend(StateBackend):
+    """Estado em um arquivo SQLite (WAL) compartilhado pelos workers da máquina"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS kv (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE TABLE IF NOT EXISTS lists (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                value TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS lists_name_id ON lists (name, id);
+            """
+        )
+
+    def _conn(self):
+        # Conexões não podem atravessar um fork: cada processo/thread abre a sua
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            import sqlite3
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace, key):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), expires_at),
+        )
+
+    def delete(self, namespace, key):
+        self._conn().execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def keys(self, namespace):
+        rows = self._conn().execute(
+            "SELECT key FROM kv WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, time.time()),
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def incr(self, namespace, key, ttl):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, now),
+            ).fetchone()
+            if row is None:
+                value = {"count": 1, "timestamp": now}
+                expires_at = now + ttl
+            else:
+                value = json.loads(row[0])
+                value["count"] += 1
+                expires_at = value["timestamp"] + ttl
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), expires_at),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value["count"], value["timestamp"]
+
+    def purge_expired(self, namespace):
+        self._conn().execute(
+            "DELETE FROM kv WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+            (namespace, time.time()),
+        )
+
+    def list_push_many(self, name, items, maxlen):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO lists (name, value) VALUES (?, ?)",
+                [(name, json.dumps(item)) for item in items],
+            )
+            conn.execute(
+                "DELETE FROM lists WHERE name = ? AND id <= ("
+                "SELECT id FROM lists WHERE name = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (name, name, maxlen),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def list_range(self, name, limit):
+        rows = self._conn().execute(
+            "SELECT value FROM lists WHERE name = ? ORDER BY id DESC LIMIT ?", (name, limit)
+        ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class RedisStateBackend(StateBackend):
+    """Estado em um servidor compatível com o protocolo Redis.
+
+    Usa apenas um subconjunto pequeno de comandos (HSET/HGETALL/HINCRBY/
+    HSETNX/PEXPIRE/DEL/SCAN/LPUSH/LTRIM/LRANGE em pipeline), implementado
+    também por `FakeRedis`.
+    """
+
+    def __init__(self, client, prefix="investiza"):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, namespace, key):
+        return f"{self.prefix}:{namespace}:{key}"
+
+    @staticmethod
+    def _text(value):
+        return value.decode() if isinstance(value, bytes) else value
+
+    def _decode(self, data):
+        data = {self._text(k): self._text(v) for k, v in data.items()}
+        if not data:
+            return None
+        if "v" in data:
+            return json.loads(data["v"])
+        return {"count": int(data["count"]), "timestamp": float(data["timestamp"])}
+
+    def get(self, namespace, key):
+        return self._decode(self.client.hgetall(self._key(namespace, key)))
+
+    def set(self, namespace, key, value, ttl=None):
+        k = self._key(namespace, key)
+        pipe = self.client.pipeline()
+        pipe.delete(k)
+        pipe.hset(k, "v", json.dumps(value))
+        if ttl:
+            pipe.pexpire(k, int(ttl * 1000))
+        pipe.execute()
+
+    def delete(self, namespace, key):
+        self.client.delete(self._key(namespace, key))
+
+    def keys(self, namespace):
+        prefix = self._key(namespace, "")
+        return [self._text(k)[len(prefix):] for k in self.client.scan_iter(match=prefix + "*")]
+
+    def incr(self, namespace, key, ttl):
+        k = self._key(namespace, key)
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.hsetnx(k, "timestamp", now)
+        pipe.hincrby(k, "count", 1)
+        pipe.hget(k, "timestamp")
+        created, count, started = pipe.execute()
+        if created:
+            self.client.pexpire(k, int(ttl * 1000))
+        return int(count), float(self._text(started))
+
+    def list_push_many(self, name, items, maxlen):
+        k = self._key("list", name)
+        pipe = self.client.pipeline()
+        pipe.lpush(k, *[json.dumps(item) for item in items])
+        pipe.ltrim(k, 0, maxlen - 1)
+        pipe.execute()
+
+    def list_range(self, name, limit):
+        return [json.loads(v) for v in self.client.lrange(self._key("list", name), 0, limit - 1)]
+
+
+class FakeRedis:
+    """Implementação em processo do subconjunto de comandos Redis usado por RedisStateBackend"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data = {}
+        self._expires = {}
+
+    def _alive(self, key):
+        exp = self._expires.get(key)
+        if exp is not None and exp <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._data[key]) if self._alive(key) else {}
+
+    def hget(self, key, field):
+        with self._lock:
+            return self._data[key].get(field) if self._alive(key) else None
+
+    def hset(self, key, field, value):
+        with self._lock:
+            self._alive(key)
+            self._data.setdefault(key, {})[field] = str(value)
+            return 1
+
+    def hsetnx(self, key, field, value):
+        with self._lock:
+            self._alive(key)
+            h = self._data.setdefault(key, {})
+            if field in h:
+                return 0
+            h[field] = str(value)
+            return 1
+
+    def hincrby(self, key, field, amount=1):
+        with self._lock:
+            self._alive(key)
+            h = self._data.setdefault(key, {})
+            h[field] = str(int(h.get(field, 0)) + amount)
+            return int(h[field])
+
+    def pexpire(self, key, ms):
+        with self._lock:
+            if not self._alive(key):
+                return 0
+            self._expires[key] = time.time() + ms / 1000.0
+            return 1
+
+    def delete(self, *keys):
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._alive(key):
+                    removed += 1
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return removed
+
+    def scan_iter(self, match="*"):
+        prefix = match.rstrip("*")
+        with self._lock:
+            return [k for k in list(self._data) if k.startswith(prefix) and self._alive(k)]
+
+    def lpush(self, key, *values):
+        with self._lock:
+            self._alive(key)
+            lst = self._data.setdefault(key, [])
+            for value in values:
+                lst.insert(0, value)
+            return len(lst)
+
+    def ltrim(self, key, start, end):
+        with self._lock:
+            if self._alive(key):
+                self._data[key] = self._data[key][start:end + 1]
+            return True
+
+    def lrange(self, key, start, end):
+        with self._lock:
+            if not self._alive(key):
+                return []
+            return list(self._data[key][start:end + 1])
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self._client = client
+        self._calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._calls.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self._client._lock:
+            return [method(*args, **kwargs) for method, args, kwargs in self._calls]
+
+
+class StateNamespace(MutableMapping):
+    """Visão tipo dict de um namespace do backend (ex.: `valid_tokens[token] = {...}`)"""
+
+    def __init__(self, backend, namespace, ttl=None):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def __getitem__(self, key):
+        value = self.backend.get(self.namespace, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.backend.set(self.namespace, key, value, self.ttl)
+
+    def __delitem__(self, key):
+        self.backend.delete(self.namespace, key)
+
+    def __iter__(self):
+        return iter(self.backend.keys(self.namespace))
+
+    def __len__(self):
+        return len(self.backend.keys(self.namespace))
+
+
+class BatchedStateList:
+    """Lista limitada no backend com escrita em lotes.
+
+    `push` só acumula em memória e nunca grava: o lote é gravado pela thread
+    de fundo, acordada quando atinge `batch_size` itens ou após
+    `flush_interval` segundos, em uma única transação/pipeline. Assim `push`
+    pode ser chamado do event loop. Leituras (`range`) descarregam o lote
+    pendente antes e fazem I/O no backend: no loop, usar via executor.
+    """
+
+    def __init__(self, backend, name, maxlen, batch_size=20, flush_interval=0.5):
+        self.backend = backend
+        self.name = name
+        self.maxlen = maxlen
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = []
+        self._flusher = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        atexit.register(self.flush)
+
+    def push(self, item):
+        with self._lock:
+            self._pending.append(item)
+            full = len(self._pending) >= self.batch_size
+        self._ensure_flusher()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self.backend.list_push_many(self.name, batch, self.maxlen)
+
+    def range(self, limit=None):
+        self.flush()
+        return self.backend.list_range(self.name, limit or self.maxlen)
+
+    def __len__(self):
+        return len(self.range())
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._run, name=f"state-flush-{self.name}", daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self.flush()
+
+
+def create_state_backend(url):
+    """Cria o backend a partir de uma URL (ver docstring do módulo)"""
+    url = url or "memory://"
+    if url.startswith("memory://"):
+        return MemoryStateBackend()
+    if url.startswith("sqlite:///"):
+        # Mesma convenção do SQLAlchemy: sqlite:///relativo.db, sqlite:////absoluto.db
+        return SQLiteStateBackend(url[len("sqlite:///"):])
+    if url.startswith("fakeredis://"):
+        return RedisStateBackend(FakeRedis())
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("STATE_BACKEND_URL usa Redis, mas o pacote 'redis' não está instalado") from e
+        return RedisStateBackend(redis.Redis.from_url(url))
+    raise ValueError(f"STATE_BACKEND_URL não suportada: {url}")
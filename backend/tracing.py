@@ -0,0 +1,555 @@
+"""
+Tracing distribuído compatível com OpenTelemetry, sem dependências.
+
+Cada requisição HTTP vira um span SERVER (TracingMiddleware), com filhos
+para as etapas que importam (leitura e validação do corpo, carga da
+configuração, elegibilidade, cada tentativa de envio ao webhook e o
+backoff, gravação de logs). O contexto segue o W3C Trace Context: um
+`traceparent` recebido é continuado e o header é propagado ao n8n em cada
+envio, junto com o X-Request-Id.
+
+Amostragem "parent-based": se o chamador mandou `traceparent`, vale a
+decisão dele; senão, uma fração TRACE_SAMPLE_RATE das requisições é
+gravada. Requisições não amostradas só carregam o contexto para a
+propagação (ids gerados sob demanda) e `span()` devolve um escopo nulo,
+então o custo fica em torno de um microssegundo por requisição
+(benchmarks/bench_tracing.py).
+
+Spans terminados vão para uma fila limitada e uma thread os exporta em lote
+no formato OTLP/JSON (`{"resourceSpans": [...]}`): uma linha por lote num
+arquivo (lido pelo receiver `otlpjsonfile` do OpenTelemetry Collector) ou
+POST para um endpoint OTLP/HTTP (`.../v1/traces`). Se a fila enche, os
+spans excedentes são descartados e contados, nunca bloqueiam a requisição.
+"""
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span = contextvars.ContextVar("tracing_span", default=None)
+
+
+def _new_trace_id():
+    return f"{random.getrandbits(128):032x}"
+
+
+def _new_span_id():
+    return f"{random.getrandbits(64):016x}"
+
+
+def parse_traceparent(value):
+    """(trace_id, span_id, sampled) de um header traceparent, ou None se inválido"""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    trace_id, span_id, flags = parts[1], parts[2], parts[3]
+    if len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2:
+        return None
+    try:
+        int(trace_id, 16), int(span_id, 16)
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id.lower(), span_id.lower(), sampled
+
+
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes):
+    return [{"key": key, "value": _attribute_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class Span:
+    """Span gravado (amostrado)"""
+
+    __slots__ = ("tracer", "trace_id", "span_id", "parent_id", "name", "kind",
+                 "start_ns", "end_ns", "attributes", "events", "status", "status_message", "tracestate")
+    recording = True
+
+    def __init__(self, tracer, trace_id, parent_id, name, kind, tracestate=None):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = _new_span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.tracestate = tracestate
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = {}
+        self.events = []
+        self.status = 0
+        self.status_message = None
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def add_event(self, name, **attributes):
+        self.events.append((time.time_ns(), name, attributes))
+
+    def set_error(self, message):
+        self.status = STATUS_ERROR
+        self.status_message = str(message)[:500]
+
+    def end(self):
+        if not self.end_ns:
+            self.end_ns = time.time_ns()
+            self.tracer.exporter.submit(self)
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _attributes(self.attributes),
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.tracestate:
+            span["traceState"] = self.tracestate
+        if self.events:
+            span["events"] = [
+                {"timeUnixNano": str(ts), "name": name, "attributes": _attributes(attrs)}
+                for ts, name, attrs in self.events
+            ]
+        if self.status:
+            span["status"] = {"code": self.status, "message": self.status_message or ""}
+        return span
+
+
+class _UnsampledSpan:
+    """Contexto de uma requisição não amostrada: só serve para propagar o trace.
+
+    Os ids só são gerados se alguém pedir o `traceparent` (envio ao webhook).
+    """
+
+    __slots__ = ("_trace_id", "_span_id", "parent_id", "tracestate")
+    recording = False
+
+    def __init__(self, trace_id=None, parent_id=None, tracestate=None):
+        self._trace_id = trace_id
+        self._span_id = None
+        self.parent_id = parent_id
+        self.tracestate = tracestate
+
+    @property
+    def trace_id(self):
+        if self._trace_id is None:
+            self._trace_id = _new_trace_id()
+        return self._trace_id
+
+    @property
+    def span_id(self):
+        if self._span_id is None:
+            self._span_id = _new_span_id()
+        return self._span_id
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-00"
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, message):
+        pass
+
+    def end(self):
+        pass
+
+
+class _NoopSpan:
+    """Devolvido por `span()` fora de um trace amostrado"""
+
+    __slots__ = ()
+    recording = False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def add_event(self, name, **attributes):
+        pass
+
+    def set_error(self, message):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _SpanScope:
+    """Context manager de um span filho: ativa no contexto, fecha e marca erro"""
+
+    __slots__ = ("span", "token")
+
+    def __init__(self, span):
+        self.span = span
+        self.token = None
+
+    def __enter__(self):
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self.token)
+        if exc is not None:
+            self.span.set_error(f"{exc_type.__name__}: {exc}")
+            self.span.add_event("exception", **{"exception.type": exc_type.__name__, "exception.message": str(exc)[:500]})
+        self.span.end()
+        return False
+
+
+class _NoopScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        return NOOP_SPAN
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SCOPE = _NoopScope()
+
+
+# -- exportação ---------------------------------------------------------------
+
+class FileSink:
+    """Uma linha OTLP/JSON por lote (formato do receiver otlpjsonfile)"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, payload):
+        with open(self.path, "ab") as f:
+            f.write(payload + b"\n")
+
+    def describe(self):
+        return f"file:{self.path}"
+
+
+class OTLPHttpSink:
+    """POST OTLP/HTTP com corpo JSON para um collector (ex.: http://collector:4318/v1/traces)"""
+
+    def __init__(self, url, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+        self._session = None
+
+    def export(self, payload):
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        response = self._session.post(self.url, data=payload, timeout=self.timeout,
+                                      headers={"Content-Type": "application/json"})
+        response.raise_for_status()
+
+    def after_fork(self):
+        # Conexões keep-alive do processo pai não são reaproveitadas no filho
+        self._session = None
+
+    def describe(self):
+        return f"otlp:{self.url}"
+
+
+def create_sink(spec):
+    """`file:/caminho.jsonl` ou `otlp:http://host:4318/v1/traces`; None/"" desliga"""
+    if not spec:
+        return None
+    kind, _, target = spec.partition(":")
+    if kind == "file" and target:
+        return FileSink(target)
+    if kind == "otlp" and target.startswith(("http://", "https://")):
+        return OTLPHttpSink(target)
+    raise ValueError(f"TRACE_EXPORTER inválido: {spec!r} (use file:/caminho ou otlp:http://...)")
+
+
+class BatchSpanExporter:
+    """Fila limitada de spans terminados, exportada em lote por uma thread.
+
+    A thread é do processo que a iniciou: num worker criado por fork (ex.:
+    gunicorn com preload) ela não existe, então `submit` inicia outra quando
+    o PID muda ou a thread morreu. No filho, a fila, o lock e o evento são
+    recriados logo após o fork, sem os spans do pai nem um lock que a thread
+    do pai possa ter deixado preso.
+    """
+
+    def __init__(self, sink, service_name, max_batch=512, max_queue=8192, flush_interval=5.0):
+        self.sink = sink
+        self.service_name = service_name
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self._queue = deque()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.exported = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_error = None
+        self.export_ms = 0.0
+        if hasattr(os, "register_at_fork"):
+            after_fork = weakref.WeakMethod(self._after_fork)
+            os.register_at_fork(after_in_child=lambda: after_fork() and after_fork()())
+
+    def _after_fork(self):
+        self._queue = deque()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        if hasattr(self.sink, "after_fork"):
+            self.sink.after_fork()
+
+    def submit(self, span):
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append(span)
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            self._start()
+        if len(self._queue) >= self.max_batch:
+            self._wake.set()
+
+    def _start(self):
+        with self._lock:
+            thread = self._thread
+            if thread is None or self._pid != os.getpid() or not thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _encode(self, spans):
+        return dumps({"resourceSpans": [{
+            "resource": {"attributes": _attributes({
+                "service.name": self.service_name,
+                "process.pid": os.getpid(),
+            })},
+            "scopeSpans": [{
+                "scope": {"name": "investiza.tracing"},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]})
+
+    def flush(self):
+        """Exporta tudo o que está na fila, em lotes de até `max_batch`"""
+        with self._lock:
+            while self._queue:
+                batch = []
+                while self._queue and len(batch) < self.max_batch:
+                    batch.append(self._queue.popleft())
+                started = time.perf_counter()
+                try:
+                    self.sink.export(self._encode(batch))
+                    self.exported += len(batch)
+                    self.batches += 1
+                except Exception as e:
+                    # Sem retry: o lote é perdido, a aplicação segue
+                    self.errors += 1
+                    self.dropped += len(batch)
+                    self.last_error = str(e)[:500]
+                    logger.warning(f"Falha ao exportar {len(batch)} spans para {self.sink.describe()}: {self.last_error}")
+                self.export_ms += (time.perf_counter() - started) * 1000
+
+    def snapshot(self):
+        return {
+            "sink": self.sink.describe(),
+            "queued": len(self._queue),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "export_ms": round(self.export_ms, 1),
+        }
+
+
+# -- tracer -------------------------------------------------------------------
+
+class Tracer:
+    """Cria spans e decide a amostragem; sem exporter, fica desligado"""
+
+    def __init__(self, exporter=None, sample_rate=0.1):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.started = 0
+        self.sampled = 0
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    def start_trace(self, name, traceparent=None, tracestate=None, kind=SPAN_KIND_SERVER):
+        """Span raiz da requisição, continuando o `traceparent` recebido se houver"""
+        self.started += 1
+        parent = parse_traceparent(traceparent) if traceparent else None
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id, tracestate = None, None, None
+            sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled:
+            return _UnsampledSpan(trace_id, parent_id, tracestate)
+        self.sampled += 1
+        return Span(self, trace_id or _new_trace_id(), parent_id, name, kind, tracestate)
+
+    def activate(self, span):
+        return _current_span.set(span)
+
+    def deactivate(self, token):
+        _current_span.reset(token)
+
+    def current(self):
+        return _current_span.get()
+
+    def span(self, name, kind=SPAN_KIND_INTERNAL, root=False, **attributes):
+        """Context manager de um span filho do atual.
+
+        Fora de um trace amostrado devolve um escopo nulo. Com `root=True`, sem
+        trace ativo (threads de fundo) abre um trace próprio, sujeito à amostragem.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            if not (root and self.enabled):
+                return _NOOP_SCOPE
+            span = self.start_trace(name, kind=kind)
+            if not span.recording:
+                return _NOOP_SCOPE
+        elif not parent.recording:
+            return _NOOP_SCOPE
+        else:
+            span = Span(self, parent.trace_id, parent.span_id, name, kind, parent.tracestate)
+        span.attributes.update(attributes)
+        return _SpanScope(span)
+
+    def inject(self, headers):
+        """Acrescenta traceparent/tracestate do span atual em `headers` (dict)"""
+        span = _current_span.get()
+        if span is not None:
+            headers["traceparent"] = span.traceparent
+            if span.tracestate:
+                headers["tracestate"] = span.tracestate
+        return headers
+
+    def bind(self, fn):
+        """Envolve `fn` para rodar com o contexto de trace atual (ex.: no executor)"""
+        span = _current_span.get()
+        if span is None:
+            return fn
+
+        def bound(*args, **kwargs):
+            token = _current_span.set(span)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current_span.reset(token)
+        return bound
+
+    def snapshot(self):
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "traces": self.started,
+            "sampled": self.sampled,
+            "exporter": self.exporter.snapshot() if self.exporter is not None else None,
+        }
+
+
+class TracingMiddleware:
+    """Middleware ASGI que abre o span SERVER de cada requisição HTTP"""
+
+    def __init__(self, app, tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = tracestate = None
+        for name, value in scope.get("headers", ()):
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+            elif name == b"tracestate":
+                tracestate = value.decode("latin-1")
+        # Nome definitivo (com a rota) só no fim, e só se o span for gravado
+        span = self.tracer.start_trace(scope["method"], traceparent, tracestate)
+        token = self.tracer.activate(span)
+        if not span.recording:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.tracer.deactivate(token)
+            return
+
+        status_code = None
+
+        async def traced_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, traced_send)
+        except Exception as e:
+            span.set_error(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            self.tracer.deactivate(token)
+            route = getattr(scope.get("route"), "path", None)
+            span.name = f"{scope['method']} {route or scope['path']}"
+            span.attributes.update({
+                "http.request.method": scope["method"],
+                "url.path": scope["path"],
+                "http.route": route,
+                "http.response.status_code": status_code,
+            })
+            if status_code is not None and status_code >= 500:
+                span.status = STATUS_ERROR
+            span.end()
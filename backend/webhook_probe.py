@@ -0,0 +1,197 @@
+"""
+Sonda sintética dos destinos de webhook, em segundo plano.
+
+`probe_url` abre uma conexão nova ao destino e mede cada fase: DNS,
+conexão TCP, handshake TLS e o primeiro byte da resposta a um HEAD (não
+dispara o workflow do n8n, que só reage ao POST). A conexão é sempre nova,
+e não a do pool do envio: numa conexão keep-alive reaproveitada, conexão e
+TLS não apareceriam. Qualquer resposta abaixo de 500 conta como destino
+acessível; 5xx, timeout, recusa de conexão e erro de certificado, como
+falha.
+
+`WebhookProber` guarda as últimas `window` sondagens de cada destino e
+classifica o destino em `up`, `degraded` (falhas recentes ou lento) ou
+`down` (`failure_threshold` falhas seguidas). O resumo geral de prontidão
+é recalculado a cada sondagem e lido pronto, em O(1), pelo /api/health.
+"""
+import socket
+import ssl
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from urllib.parse import urlsplit
+
+UP = "up"
+DEGRADED = "degraded"
+DOWN = "down"
+UNKNOWN = "unknown"
+_SEVERITY = {UNKNOWN: 0, UP: 1, DEGRADED: 2, DOWN: 3}
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def probe_url(url, timeout=5.0, method="HEAD", user_agent="Investiza-Form-Probe/1.0"):
+    """Sonda `url` numa conexão nova; retorna o tempo de cada fase (ms) e o status HTTP"""
+    result = {
+        "at": datetime.utcnow().isoformat(),
+        "ok": False, "status_code": None, "error": None,
+        "dns_ms": None, "connect_ms": None, "tls_ms": None, "ttfb_ms": None, "total_ms": None,
+    }
+    start = time.perf_counter()
+    try:
+        parts = urlsplit(url)
+        secure = parts.scheme == "https"
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"URL inválida para sondagem: {url}")
+        host = parts.hostname
+        port = parts.port or (443 if secure else 80)
+        deadline = start + timeout
+
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        mark = time.perf_counter()
+        result["dns_ms"] = _ms(mark - start)
+
+        sock = socket.create_connection(addresses[0][4][:2], timeout=max(0.001, deadline - mark))
+        try:
+            now = time.perf_counter()
+            result["connect_ms"] = _ms(now - mark)
+            mark = now
+            if secure:
+                sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+                now = time.perf_counter()
+                result["tls_ms"] = _ms(now - mark)
+                mark = now
+
+            target = parts.path or "/"
+            if parts.query:
+                target += "?" + parts.query
+            request = (f"{method} {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                       f"User-Agent: {user_agent}\r\nConnection: close\r\n\r\n")
+            sock.settimeout(max(0.001, deadline - time.perf_counter()))
+            sock.sendall(request.encode("latin-1"))
+            head = sock.recv(1)
+            if not head:
+                raise ConnectionError("conexão fechada sem resposta")
+            result["ttfb_ms"] = _ms(time.perf_counter() - mark)
+            while b"\r\n" not in head and len(head) < 1024:
+                chunk = sock.recv(1024)
+                if not chunk:
+                    break
+                head += chunk
+        finally:
+            sock.close()
+
+        status_line = head.split(b"\r\n", 1)[0].split()
+        if len(status_line) < 2 or not status_line[0].startswith(b"HTTP/"):
+            raise ValueError("resposta HTTP inválida")
+        result["status_code"] = int(status_line[1])
+        result["ok"] = result["status_code"] < 500
+        if not result["ok"]:
+            result["error"] = f"HTTP {result['status_code']}"
+    except (OSError, ValueError) as e:
+        result["error"] = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+    result["total_ms"] = _ms(time.perf_counter() - start)
+    return result
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class WebhookProber:
+    """Janela de sondagens por destino e resumo de prontidão pré-calculado"""
+
+    def __init__(self, window=20, failure_threshold=3, slow_ms=2000.0):
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._results = {}  # destino -> deque das últimas sondagens
+        self._summaries = {}
+        self._readiness = {"status": UNKNOWN, "ready": True, "checked_at": None, "destinations": {}}
+
+    def record(self, name, result):
+        """Registra uma sondagem; retorna (estado anterior, estado novo) do destino"""
+        with self._lock:
+            results = self._results.setdefault(name, deque(maxlen=self.window))
+            previous = self._summaries.get(name, {}).get("state", UNKNOWN)
+            results.append(result)
+            summary = self._summaries[name] = self._summarize(results)
+            self._update_readiness(result["at"])
+            return previous, summary["state"]
+
+    def retain(self, names):
+        """Descarta destinos que saíram da configuração"""
+        with self._lock:
+            for name in [name for name in self._results if name not in names]:
+                del self._results[name]
+                del self._summaries[name]
+            self._update_readiness(self._readiness["checked_at"])
+
+    def _summarize(self, results):
+        consecutive = 0
+        for result in reversed(results):
+            if result["ok"]:
+                break
+            consecutive += 1
+        failures = sum(1 for result in results if not result["ok"])
+        ok = [result for result in results if result["ok"]]
+        last = results[-1]
+        if consecutive >= self.failure_threshold:
+            state = DOWN
+        elif failures or (last["ok"] and last["total_ms"] > self.slow_ms):
+            state = DEGRADED
+        else:
+            state = UP
+        latency = {
+            phase: {
+                "p50": _percentile([r[phase] for r in ok if r[phase] is not None], 0.5),
+                "p95": _percentile([r[phase] for r in ok if r[phase] is not None], 0.95),
+            }
+            for phase in ("dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "total_ms")
+        }
+        return {
+            "state": state,
+            "consecutive_failures": consecutive,
+            "samples": len(results),
+            "failures": failures,
+            "availability": round(1 - failures / len(results), 3),
+            "latency_ms": latency,
+            "last": last,
+        }
+
+    def _update_readiness(self, checked_at):
+        states = {name: summary["state"] for name, summary in self._summaries.items()}
+        worst = max(states.values(), key=_SEVERITY.get, default=UNKNOWN)
+        # Pronto enquanto nenhum destino estiver fora; sem sondagens ainda, assume pronto
+        self._readiness = {"status": worst, "ready": worst != DOWN, "checked_at": checked_at, "destinations": states}
+
+    def readiness(self):
+        """Resumo já calculado na última sondagem (leitura O(1) para o /api/health)"""
+        return self._readiness
+
+    def state(self, name):
+        with self._lock:
+            return self._summaries.get(name, {}).get("state", UNKNOWN)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "window": self.window,
+                "failure_threshold": self.failure_threshold,
+                "slow_ms": self.slow_ms,
+                "readiness": self._readiness,
+                "destinations": {
+                    name: {**summary, "history": [
+                        {key: result[key] for key in ("at", "ok", "status_code", "total_ms")}
+                        for result in self._results[name]
+                    ]}
+                    for name, summary in self._summaries.items()
+                },
+            }
@@ -0,0 +1,442 @@
+"""
+Resiliência na entrega de webhooks: circuit breaker, limite adaptativo de
+concorrência (AIMD), status por destino, contagem horária das entregas e
+spool local para submissões que não podem ser encaminhadas no momento.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+class CircuitBreaker:
+    """Circuit breaker com janela deslizante de taxa de falhas.
+
+    Estados:
+    - closed: requisições passam normalmente; abre quando a taxa de falhas
+      da janela ultrapassa o limite (com um mínimo de amostras)
+    - open: requisições são recusadas até `open_seconds` se passarem
+    - half_open: permite até `half_open_max_calls` chamadas de teste; um
+      sucesso fecha o circuito, uma falha reabre
+
+    Quem obteve permissão e não registra sucesso nem falha (envio recusado
+    antes de chegar ao destino, resposta 4xx) devolve a vaga de teste com
+    `release_trial()`; vagas não devolvidas expiram após `open_seconds`, para
+    o circuito nunca ficar preso em half_open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, window_seconds=60.0, min_requests=5, failure_rate_threshold=0.5,
+                 open_seconds=30.0, half_open_max_calls=1):
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.failure_rate_threshold = failure_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._window = deque()  # (timestamp, sucesso)
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._trial_started = 0.0
+        self._times_opened = 0
+        self._rejected = 0
+        self._last_error = None
+
+    def _prune(self, now):
+        cutoff = now - self.window_seconds
+        while self._window and self._window[0][0] < cutoff:
+            self._window.popleft()
+
+    def _failure_rate(self):
+        if not self._window:
+            return 0.0
+        failures = sum(1 for _, ok in self._window if not ok)
+        return failures / len(self._window)
+
+    def _open(self, now):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._half_open_calls = 0
+        self._times_opened += 1
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def _maybe_half_open(self, now):
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+
+    def allow_request(self):
+        """Retorna True se uma chamada ao destino pode ser feita agora"""
+        now = time.monotonic()
+        with self._lock:
+            self._maybe_half_open(now)
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN:
+                if (self._half_open_calls >= self.half_open_max_calls
+                        and now - self._trial_started >= self.open_seconds):
+                    self._half_open_calls = 0  # chamadas de teste sem resultado
+                if self._half_open_calls < self.half_open_max_calls:
+                    self._half_open_calls += 1
+                    self._trial_started = now
+                    return True
+            self._rejected += 1
+            return False
+
+    def release_trial(self):
+        """Devolve a vaga de teste de uma chamada que não registrou resultado"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_success(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._window.clear()
+            self._window.append((now, True))
+            self._prune(now)
+
+    def record_failure(self, error=None):
+        now = time.monotonic()
+        with self._lock:
+            self._last_error = error
+            if self._state == self.HALF_OPEN:
+                self._open(now)
+                return
+            self._window.append((now, False))
+            self._prune(now)
+            if (self._state == self.CLOSED
+                    and len(self._window) >= self.min_requests
+                    and self._failure_rate() >= self.failure_rate_threshold):
+                self._open(now)
+
+    def trip(self, error=None):
+        """Abre o circuito imediatamente (ex.: sinal externo de indisponibilidade)"""
+        with self._lock:
+            self._last_error = error
+            if self._state != self.OPEN:
+                self._open(time.monotonic())
+
+    def reset(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._window.clear()
+            self._half_open_calls = 0
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            self._maybe_half_open(now)
+            self._prune(now)
+            retry_in = None
+            if self._state == self.OPEN:
+                retry_in = max(0.0, round(self.open_seconds - (now - self._opened_at), 1))
+            return {
+                "state": self._state,
+                "window_requests": len(self._window),
+                "window_failures": sum(1 for _, ok in self._window if not ok),
+                "failure_rate": round(self._failure_rate(), 3),
+                "failure_rate_threshold": self.failure_rate_threshold,
+                "min_requests": self.min_requests,
+                "window_seconds": self.window_seconds,
+                "open_seconds": self.open_seconds,
+                "retry_in_seconds": retry_in,
+                "times_opened": self._times_opened,
+                "rejected": self._rejected,
+                "last_error": self._last_error,
+            }
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limite de requisições em andamento ajustado por AIMD.
+
+    Cada resposta bem sucedida abaixo de `latency_threshold` aumenta o limite
+    em 1/limite (aumento aditivo de ~1 por "rodada"); falhas ou respostas
+    lentas multiplicam o limite por `backoff_ratio`. Chamadas acima do limite
+    são recusadas imediatamente em vez de enfileiradas.
+    """
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=32,
+                 latency_threshold=2.0, backoff_ratio=0.5):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_threshold = latency_threshold
+        self.backoff_ratio = backoff_ratio
+
+        self._lock = threading.Lock()
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._rejected = 0
+        self._completed = 0
+
+    @property
+    def limit(self):
+        with self._lock:
+            return int(self._limit)
+
+    def try_acquire(self):
+        with self._lock:
+            if self._in_flight >= int(self._limit):
+                self._rejected += 1
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, success, latency):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._completed += 1
+            if success and latency < self.latency_threshold:
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+            else:
+                self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "latency_threshold": self.latency_threshold,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+
+class DestinationTracker:
+    """Circuit breaker, limite de concorrência e status de entrega por destino de webhook.
+
+    Breakers e limitadores são criados sob demanda com `breaker_factory` e
+    `limiter_factory`, então um destino lento reduz só o próprio limite;
+    `seed` e `limiter_seed` permitem registrar os já existentes (ex.: os do
+    destino padrão). Com `rollup`, cada resultado também entra na contagem horária.
+    """
+
+    def __init__(self, breaker_factory, seed=None, rollup=None, limiter_factory=None, limiter_seed=None):
+        self.breaker_factory = breaker_factory
+        self.limiter_factory = limiter_factory or AdaptiveConcurrencyLimiter
+        self.rollup = rollup
+        self._lock = threading.Lock()
+        self._breakers = dict(seed or {})
+        self._limiters = dict(limiter_seed or {})
+        self._stats = {}
+
+    def breaker(self, name):
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = self.breaker_factory()
+            return breaker
+
+    def limiter(self, name):
+        with self._lock:
+            limiter = self._limiters.get(name)
+            if limiter is None:
+                limiter = self._limiters[name] = self.limiter_factory()
+            return limiter
+
+    def record(self, name, status, status_code=None, error=None, latency=None):
+        """Registra o resultado de uma entrega (`delivered`, `queued` ou `failed`)"""
+        with self._lock:
+            stats = self._stats.setdefault(name, {
+                "delivered": 0, "queued": 0, "failed": 0,
+                "last_status": None, "last_status_code": None, "last_error": None,
+                "last_at": None, "last_latency_ms": None,
+            })
+            stats[status] += 1
+            stats["last_status"] = status
+            stats["last_status_code"] = status_code
+            stats["last_at"] = datetime.utcnow().isoformat()
+            if error is not None:
+                stats["last_error"] = error
+            if latency is not None:
+                stats["last_latency_ms"] = round(latency * 1000, 1)
+        if self.rollup is not None:
+            self.rollup.record(name, status)
+
+    def reset(self, name=None):
+        with self._lock:
+            breakers = [self._breakers[name]] if name in self._breakers else list(self._breakers.values())
+        for breaker in breakers:
+            breaker.reset()
+
+    def snapshot(self):
+        with self._lock:
+            names = set(self._breakers) | set(self._limiters) | set(self._stats)
+            stats = {name: dict(self._stats.get(name, {})) for name in names}
+            breakers = dict(self._breakers)
+            limiters = dict(self._limiters)
+        return {
+            name: {
+                **stats[name],
+                "circuit_breaker": breakers[name].snapshot() if name in breakers else None,
+                "concurrency": limiters[name].snapshot() if name in limiters else None,
+            }
+            for name in sorted(names)
+        }
+
+
+class DeliveryRollup:
+    """Entregas por hora (UTC), destino e status, somadas entre os workers.
+
+    `record` só incrementa contadores na memória do worker (caminho do envio);
+    `flush`, chamado periodicamente pelo agendador, grava as horas no backend
+    de estado numa chave por worker (`<hora>|<pid>`), então os workers nunca
+    disputam a mesma chave. `totals` soma as chaves de todos os workers.
+    """
+
+    def __init__(self, backend, namespace="webhook_stats", retention=7 * 86400):
+        self.backend = backend
+        self.namespace = namespace
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._hours = {}  # hora -> {destino: {status: contagem}}
+
+    def record(self, destination, status):
+        hour = datetime.utcnow().strftime("%Y-%m-%dT%H")
+        with self._lock:
+            counts = self._hours.setdefault(hour, {}).setdefault(destination, {})
+            counts[status] = counts.get(status, 0) + 1
+
+    def flush(self):
+        """Grava as horas acumuladas; horas já encerradas saem da memória depois de gravadas"""
+        current = datetime.utcnow().strftime("%Y-%m-%dT%H")
+        with self._lock:
+            hours = {hour: {dest: dict(counts) for dest, counts in dests.items()}
+                     for hour, dests in self._hours.items()}
+        for hour, dests in hours.items():
+            self.backend.set(self.namespace, f"{hour}|{os.getpid()}", dests, ttl=self.retention)
+        with self._lock:
+            for hour in hours:
+                if hour < current:
+                    self._hours.pop(hour, None)
+        return {"hours": len(hours)}
+
+    def totals(self, hours=24):
+        """Contagens somadas por hora, da mais recente para a mais antiga"""
+        since = (datetime.utcnow() - timedelta(hours=hours - 1)).strftime("%Y-%m-%dT%H")
+        merged = {}
+        for key in self.backend.keys(self.namespace):
+            hour = key.split("|", 1)[0]
+            if hour < since:
+                continue
+            for dest, counts in (self.backend.get(self.namespace, key) or {}).items():
+                target = merged.setdefault(hour, {}).setdefault(dest, {})
+                for status, count in counts.items():
+                    target[status] = target.get(status, 0) + count
+        return [{"hour": hour, "destinations": merged[hour]} for hour in sorted(merged, reverse=True)]
+
+
+class WebhookSpool:
+    """Spool em disco para submissões não encaminhadas (um arquivo JSON por item)"""
+
+    _PAYLOAD_MARKER = b',"payload":'
+
+    DEAD_LETTER = "dead-letter"
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.dead_letter_directory = self.directory / self.DEAD_LETTER
+        self._lock = threading.Lock()
+
+    def _ensure_dir(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def append(self, body, reason, destination=None):
+        """Grava a submissão no spool de forma atômica e retorna o caminho
+
+        `body` são os bytes JSON exatos que seriam enviados ao webhook; eles são
+        embutidos sem reserialização para que o reenvio use os mesmos bytes.
+        `destination` é o nome do destino de webhook (None = padrão).
+        """
+        self._ensure_dir()
+        meta = json.dumps({
+            "spooled_at": datetime.utcnow().isoformat(),
+            "reason": reason,
+            "destination": destination,
+        }, ensure_ascii=False)
+        content = meta[:-1].encode("utf-8") + self._PAYLOAD_MARKER + body + b"}"
+        name = f"{time.time_ns()}_{uuid.uuid4().hex[:8]}.json"
+        final_path = self.directory / name
+        tmp_path = self.directory / f".{name}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, final_path)
+        return final_path
+
+    def pending(self, limit=None):
+        """Lista os itens pendentes, mais antigos primeiro"""
+        if not self.directory.exists():
+            return []
+        paths = sorted(p for p in self.directory.glob("*.json") if not p.name.startswith("."))
+        return paths[:limit] if limit else paths
+
+    def count(self):
+        return len(self.pending())
+
+    def read(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def read_payload(self, path):
+        """Retorna os bytes originais do payload guardado"""
+        return self.read_item(path)[1]
+
+    def read_item(self, path):
+        """(metadados, bytes originais do payload) do item guardado"""
+        with open(path, "rb") as f:
+            raw = f.read()
+        index = raw.find(self._PAYLOAD_MARKER)
+        if index < 0 or not raw.endswith(b"}"):
+            raise ValueError("Formato de item de spool inválido")
+        meta = json.loads(raw[:index] + b"}")
+        return meta, raw[index + len(self._PAYLOAD_MARKER):-1]
+
+    def remove(self, path):
+        with self._lock:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def dead_letter(self, path):
+        """Tira o item da fila, movendo-o para o subdiretório dead-letter (fora
+        de `pending`), onde fica para inspeção manual. Retorna o novo caminho"""
+        path = Path(path)
+        target = self.dead_letter_directory / path.name
+        with self._lock:
+            self.dead_letter_directory.mkdir(parents=True, exist_ok=True)
+            try:
+                os.replace(path, target)
+            except FileNotFoundError:
+                return None
+        return target
+
+    def dead_letters(self):
+        if not self.dead_letter_directory.exists():
+            return []
+        return sorted(self.dead_letter_directory.glob("*.json"))
+
+    def snapshot(self):
+        return {
+            "directory": str(self.directory),
+            "pending": self.count(),
+            "dead_letter": len(self.dead_letters()),
+        }
@@ -0,0 +1,177 @@
+"""
+Roteamento dos leads para os destinos de webhook.
+
+`configuracao.webhook_routes` define destinos nomeados e regras:
+
+    {
+      "destinos": {
+        "constitucionais": {"url": "https://...", "timeout": 10, "gzip": true},
+        "crm": {"url": "https://...", "transform": "{nome: .lead.nome, email: .lead.email}"}
+      },
+      "regras": [
+        {"nome": "fundos constitucionais",
+         "quando": {"fundos": ["BNB_FNE", "BASA_FNO", "FCO_BB"]},
+         "destinos": ["constitucionais"]},
+        {"quando": {"tipos": ["privado", "pf"], "utm_source": ["google"]},
+         "destinos": ["crm", "default"], "parar": true}
+      ],
+      "padrao": ["default"]
+    }
+
+Condições de uma regra (todas precisam casar; dentro de cada lista basta um
+valor): `fundos` e `tipos` olham os fundos recomendados do lead, `regioes` o
+`local` do lead e `utm_source`/`utm_medium`/`utm_campaign` o `meta`. Todas as
+regras que casam somam seus destinos, na ordem das regras, até uma com
+`"parar": true`; sem nenhuma regra casando vale `padrao`. O destino
+`default` sempre existe e aponta para `configuracao.webhook_url`. `transform`
+(opcional) é um programa jq aplicado ao payload do destino
+(ver webhook_transforms) e `gzip: true` envia o corpo com
+Content-Encoding: gzip.
+
+As regras são compiladas em máscaras de bits por condição/valor (bit i =
+regra i), como o índice de elegibilidade: rotear um lead custa alguns
+lookups e ANDs, independente do número de regras.
+"""
+from collections import namedtuple
+
+from eligibility import iter_bits
+from webhook_transforms import validate_program
+
+DEFAULT_DESTINATION = "default"
+
+# Condições aceitas em "quando"; fundos/tipos usam os fundos recomendados
+ROUTE_CONDITIONS = ("fundos", "tipos", "regioes", "utm_source", "utm_medium", "utm_campaign")
+
+Destination = namedtuple("Destination", ("name", "url", "timeout", "transform", "gzip"))
+
+
+def _valid_url(url):
+    return isinstance(url, str) and url.startswith(("http://", "https://"))
+
+
+class WebhookRouter:
+    """Tabela de roteamento compilada a partir de configuracao.webhook_routes"""
+
+    def __init__(self, routes, fundos, default_url, default_timeout):
+        routes = routes or {}
+        if not isinstance(routes, dict):
+            raise ValueError("configuracao.webhook_routes deve ser um objeto")
+
+        self.destinations = {DEFAULT_DESTINATION: Destination(DEFAULT_DESTINATION, default_url, default_timeout, None, False)}
+        for name, spec in (routes.get("destinos") or {}).items():
+            if not isinstance(spec, dict):
+                raise ValueError(f"webhook_routes.destinos.{name} deve ser um objeto")
+            # "default" pode ser declarado só para ganhar timeout/transform; a URL continua a webhook_url
+            url = spec.get("url", default_url if name == DEFAULT_DESTINATION else None)
+            if not _valid_url(url):
+                raise ValueError(f"webhook_routes.destinos.{name}: 'url' http(s) obrigatória")
+            try:
+                timeout = float(spec.get("timeout", default_timeout))
+            except (TypeError, ValueError):
+                raise ValueError(f"webhook_routes.destinos.{name}: timeout inválido")
+            transform = spec.get("transform")
+            if transform is not None:
+                validate_program(transform, f"webhook_routes.destinos.{name}")
+            use_gzip = spec.get("gzip", False)
+            if not isinstance(use_gzip, bool):
+                raise ValueError(f"webhook_routes.destinos.{name}: gzip deve ser true/false")
+            self.destinations[name] = Destination(name, url, timeout, transform, use_gzip)
+
+        self.default = self._destination_list(routes.get("padrao") or [DEFAULT_DESTINATION], "padrao")
+
+        rules = routes.get("regras") or []
+        if not isinstance(rules, list):
+            raise ValueError("webhook_routes.regras deve ser uma lista")
+        self.rules = []
+        self.unconstrained = {condition: 0 for condition in ROUTE_CONDITIONS}
+        self.by_value = {condition: {} for condition in ROUTE_CONDITIONS}
+        for pos, rule in enumerate(rules):
+            if not isinstance(rule, dict):
+                raise ValueError(f"webhook_routes.regras[{pos}] deve ser um objeto")
+            name = rule.get("nome") or f"regra_{pos}"
+            conditions = rule.get("quando") or {}
+            unknown = set(conditions) - set(ROUTE_CONDITIONS)
+            if unknown:
+                raise ValueError(f"webhook_routes.regras[{pos}]: condições desconhecidas {sorted(unknown)}")
+            bit = 1 << pos
+            for condition in ROUTE_CONDITIONS:
+                values = conditions.get(condition)
+                if not values:
+                    self.unconstrained[condition] |= bit
+                    continue
+                if isinstance(values, str):
+                    values = [values]
+                for value in values:
+                    table = self.by_value[condition]
+                    table[value] = table.get(value, 0) | bit
+            destinations = self._destination_list(rule.get("destinos"), f"regras[{pos}].destinos")
+            self.rules.append((name, destinations, bool(rule.get("parar", False))))
+
+        self.all_rules = (1 << len(self.rules)) - 1
+        # Máscara das regras de "tipos" que cada fundo satisfaz, resolvida na compilação
+        tipo_masks = self.by_value["tipos"]
+        self.fund_tipo_mask = {
+            fund_id: tipo_masks.get(data.get("tipo"), 0)
+            for fund_id, data in (fundos or {}).items()
+        }
+
+    def _destination_list(self, names, where):
+        if not isinstance(names, (list, tuple)) or not names:
+            raise ValueError(f"webhook_routes.{where} deve ser uma lista de destinos")
+        unknown = [name for name in names if name not in self.destinations]
+        if unknown:
+            raise ValueError(f"webhook_routes.{where}: destinos desconhecidos {unknown}")
+        return tuple(self.destinations[name] for name in dict.fromkeys(names))
+
+    def match(self, recomendados=(), regiao=None, utm=None):
+        """Posições das regras que casam com o lead"""
+        utm = utm or {}
+        matched = self.all_rules
+
+        mask = self.unconstrained["fundos"]
+        fundos = self.by_value["fundos"]
+        for fund_id in recomendados:
+            mask |= fundos.get(fund_id, 0)
+        matched &= mask
+
+        mask = self.unconstrained["tipos"]
+        for fund_id in recomendados:
+            mask |= self.fund_tipo_mask.get(fund_id, 0)
+        matched &= mask
+
+        for condition, value in (
+            ("regioes", regiao),
+            ("utm_source", utm.get("utm_source")),
+            ("utm_medium", utm.get("utm_medium")),
+            ("utm_campaign", utm.get("utm_campaign")),
+        ):
+            matched &= self.unconstrained[condition] | self.by_value[condition].get(value, 0)
+        return matched
+
+    def route(self, recomendados=(), regiao=None, utm=None):
+        """(destinos, nomes das regras aplicadas) para o lead"""
+        destinations = {}
+        applied = []
+        for pos in iter_bits(self.match(recomendados, regiao, utm)):
+            name, rule_destinations, stop = self.rules[pos]
+            applied.append(name)
+            for destination in rule_destinations:
+                destinations.setdefault(destination.name, destination)
+            if stop:
+                break
+        if not applied:
+            return self.default, applied
+        return tuple(destinations.values()), applied
+
+    def describe(self):
+        return {
+            "destinos": {
+                name: {"url": d.url, "timeout": d.timeout, "transform": d.transform, "gzip": d.gzip}
+                for name, d in self.destinations.items()
+            },
+            "regras": [
+                {"nome": name, "destinos": [d.name for d in destinations], "parar": stop}
+                for name, destinations, stop in self.rules
+            ],
+            "padrao": [d.name for d in self.default],
+        }
@@ -0,0 +1,123 @@
+"""
+Transformações jq do payload por destino de webhook.
+
+Cada destino em `configuracao.webhook_routes.destinos` pode ter um programa
+jq em `transform`, aplicado ao payload canônico (os bytes JSON da
+FormSubmission) antes do envio. O programa precisa produzir exatamente um
+valor JSON; se não compilar, falhar ou produzir zero/vários valores, o
+destino recebe o payload canônico sem transformação (fallback) e o erro
+fica registrado no status.
+
+O módulo `jq` só é importado quando algum destino com transformação é
+usado, fora do caminho de inicialização. Cada programa é compilado uma vez
+por versão da configuração (o `PayloadTransformer` pertence ao snapshot) e
+reutilizado por todas as requisições.
+"""
+import logging
+import threading
+import time
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+MAX_PROGRAM_LENGTH = 8192
+
+_jq = None
+
+
+def get_jq():
+    """Importa `jq` sob demanda"""
+    global _jq
+    if _jq is None:
+        import jq
+        _jq = jq
+    return _jq
+
+
+def validate_program(program, where):
+    """Validação estrutural (sem compilar, para não importar jq na carga da configuração)"""
+    if not isinstance(program, str) or not program.strip():
+        raise ValueError(f"{where}: transform deve ser um programa jq (string)")
+    if len(program) > MAX_PROGRAM_LENGTH:
+        raise ValueError(f"{where}: transform excede {MAX_PROGRAM_LENGTH} caracteres")
+
+
+class _Stats:
+    __slots__ = ("applied", "fallbacks", "total_seconds", "compile_ms", "last_error")
+
+    def __init__(self):
+        self.applied = 0
+        self.fallbacks = 0
+        self.total_seconds = 0.0
+        self.compile_ms = None
+        self.last_error = None
+
+
+class PayloadTransformer:
+    """Programas jq por destino, compilados sob demanda e guardados para a versão da configuração"""
+
+    def __init__(self, programs):
+        self.programs = dict(programs)
+        self._compiled = {}
+        self._lock = threading.Lock()
+        self._stats = {name: _Stats() for name in self.programs}
+
+    def __contains__(self, name):
+        return name in self.programs
+
+    def _program(self, name):
+        compiled = self._compiled.get(name)
+        if compiled is not None:
+            return compiled
+        with self._lock:
+            compiled = self._compiled.get(name)
+            if compiled is None:
+                started = time.perf_counter()
+                try:
+                    compiled = get_jq().compile(self.programs[name])
+                except (ValueError, ImportError) as e:
+                    # Guardado como exceção para não recompilar a cada lead
+                    compiled = e
+                self._stats[name].compile_ms = round((time.perf_counter() - started) * 1000, 2)
+                self._compiled[name] = compiled
+        return compiled
+
+    def apply(self, name, body):
+        """Bytes a enviar ao destino `name`: `body` transformado, ou o próprio `body` (fallback)"""
+        if name not in self.programs:
+            return body
+        stats = self._stats[name]
+        program = self._program(name)
+        started = time.perf_counter()
+        try:
+            if isinstance(program, Exception):
+                raise program
+            results = program.input_text(bytes(body).decode("utf-8")).all()
+            if len(results) != 1:
+                raise ValueError(f"o programa produziu {len(results)} valores (esperado 1)")
+            transformed = dumps(results[0])
+        except Exception as e:
+            stats.fallbacks += 1
+            error = str(e)[:500]
+            # Um programa quebrado falha em todo lead: loga só quando o erro muda
+            if error != stats.last_error:
+                logger.warning(f"Transformação jq do destino {name} falhou; enviando payload original: {error}")
+            stats.last_error = error
+            return body
+        stats.applied += 1
+        stats.total_seconds += time.perf_counter() - started
+        return transformed
+
+    def status(self):
+        return {
+            name: {
+                "compiled": name in self._compiled and not isinstance(self._compiled[name], Exception),
+                "compile_ms": stats.compile_ms,
+                "applied": stats.applied,
+                "fallbacks": stats.fallbacks,
+                "avg_us": round(stats.total_seconds / stats.applied * 1e6, 1) if stats.applied else None,
+                "last_error": stats.last_error,
+            }
+            for name, stats in self._stats.items()
+        }
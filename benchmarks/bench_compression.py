@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark da compressão gzip (compression.gzip_bytes) para escolher os
+limiares RESPONSE_GZIP_MIN_SIZE/WEBHOOK_GZIP_MIN_SIZE e o nível.
+
+Para corpos reais do app, de tamanhos variados (lead no formato de
+MODELO_JSON_ENTREGA.json, /api/form/config, páginas e mapa completo de
+/api/admin/fundos, recortes do mapa para tamanhos intermediários), mede por
+nível de compressão o tempo de CPU e a razão de compressão, e compara com o
+tempo de transmissão economizado num link de `--mbps` megabits/s:
+compensa comprimir quando o tempo de rede economizado passa do custo de CPU.
+
+Uso: python benchmarks/bench_compression.py [--mbps 20] [--levels 1,6,9] [--repeat 20]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from compression import gzip_bytes  # noqa: E402
+from server import FormSubmission, get_config_snapshot  # noqa: E402
+from serialization import dumps, model_to_json_bytes  # noqa: E402
+
+MODELO_PATH = Path(__file__).resolve().parent.parent / "MODELO_JSON_ENTREGA.json"
+
+
+def sample_bodies():
+    snapshot = get_config_snapshot()
+    modelo = json.loads(MODELO_PATH.read_text(encoding="utf-8"))
+    bodies = {
+        "lead": model_to_json_bytes(FormSubmission.model_validate(modelo)),
+        "form_config": bytes(snapshot.responses["form_config"]),
+        "admin_fundos": bytes(snapshot.responses["admin_fundos"]),
+    }
+    # Recortes do mapa de fundos para cobrir a faixa entre um lead e o mapa completo
+    fundos = list(snapshot.fundos.items())
+    for count in (1, 3, 10):
+        bodies[f"fundos[{count}]"] = dumps({"success": True, "fundos": dict(fundos[:count])})
+    bodies["small_json"] = dumps({"success": True, "status": "ok", "version": snapshot.version})
+    return dict(sorted(bodies.items(), key=lambda item: len(item[1])))
+
+
+def cpu_us(body, level, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        gzip_bytes(body, level)
+        best = min(best, time.perf_counter() - start)
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mbps", type=float, default=20.0, help="banda de saída do container (megabits/s)")
+    parser.add_argument("--levels", default="1,6,9")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",")]
+    bytes_per_us = args.mbps * 1e6 / 8 / 1e6
+
+    print(f"link de {args.mbps:g} Mbit/s; 'ganho' = transmissão economizada - CPU de compressão")
+    print(f"{'corpo':14s} {'bytes':>8s} " + " ".join(f"{'nível ' + str(level):>26s}" for level in levels))
+    break_even = {level: None for level in levels}
+    for name, body in sample_bodies().items():
+        cells = []
+        for level in levels:
+            compressed = len(gzip_bytes(body, level))
+            cost = cpu_us(body, level, args.repeat)
+            gain = (len(body) - compressed) / bytes_per_us - cost
+            if gain > 0 and (break_even[level] is None or len(body) < break_even[level]):
+                break_even[level] = len(body)
+            cells.append(f"{compressed / len(body):5.2f}x {cost:7.1f}µs {gain / 1000:+8.2f}ms")
+        print(f"{name:14s} {len(body):8d} " + " ".join(f"{cell:>26s}" for cell in cells))
+
+    print("menor corpo em que comprimir compensou: " + ", ".join(
+        f"nível {level}: {size if size is not None else '-'} bytes" for level, size in break_even.items()
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark da avaliação de elegibilidade por lead.
+
+Compara, para o catálogo real e para catálogos sintéticos maiores:
+- loop: o laço original por fundo, parando no primeiro critério reprovado
+- primeira falha: índice compilado (`evaluate`), mesmo resultado do loop
+- todas as falhas: índice compilado (`failure_masks`), usado por explain=true
+- ranking: máscaras + primeira falha + quase elegíveis + score dos elegíveis
+
+E, com o catálogo real, /api/admin/avaliar-elegibilidade com explain
+desligado e ligado: só o handler e a requisição completa (validação,
+serialização e ASGI via TestClient).
+
+Uso: python benchmarks/bench_eligibility.py [--leads 500] [--scale 1 10 100]
+"""
+import asyncio
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from eligibility import DIMENSIONS, EligibilityIndex, Ranker, near_miss_mask  # noqa: E402
+
+CONFIG_PATH = Path(__file__).resolve().parent.parent / "fundos_criterios.json"
+
+
+def loop_first_failure(fundos, lead_values):
+    """Laço original por fundo (com os nomes de variáveis corrigidos)"""
+    result = []
+    for fundo_id, fundo_data in fundos.items():
+        if not fundo_data.get("ativo", True):
+            continue
+        criterios = fundo_data.get("criterios", {})
+        failed = None
+        for dimension in DIMENSIONS:
+            if dimension not in lead_values:
+                continue
+            aceitos = criterios.get(dimension, [])
+            if not aceitos or (dimension != "tipo_imovel" and "todos" in aceitos):
+                continue
+            if not any(value in aceitos for value in lead_values[dimension]):
+                failed = dimension
+                break
+        result.append((fundo_id, failed))
+    return result
+
+
+def scaled_catalog(fundos, scale):
+    return {f"{fundo_id}_{i}": data for i in range(scale) for fundo_id, data in fundos.items()}
+
+
+def random_leads(opcoes, count):
+    values = {key: [opt["value"] for opt in options] for key, options in opcoes.items()}
+    leads = []
+    for _ in range(count):
+        lead = {
+            "situacao_empresa": (random.choice(values["situacao_empresa"]),),
+            "faturamento_renda": (random.choice(values["faturamento_renda"]),),
+            "regioes": (random.choice(values["regioes"]),),
+            "segmentos": tuple(random.sample(values["segmentos"], random.randint(1, 3))),
+            "razoes": tuple(random.sample(values["razoes"], random.randint(1, 2))),
+            "garantias": tuple(random.sample(values["garantias"], random.randint(1, 2))),
+        }
+        if "Imovel" in lead["garantias"]:
+            lead["tipo_imovel"] = (random.choice(values["tipo_imovel"]),)
+        leads.append(lead)
+    return leads
+
+
+def per_lead_us(fn, leads, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for lead in leads:
+            fn(lead)
+        best = min(best, time.perf_counter() - start)
+    return best / len(leads) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leads", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+
+    random.seed(42)
+    config = json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
+    leads = random_leads(config["opcoes_formulario"], args.leads)
+
+    print(f"{'fundos':>7}{'loop (µs)':>12}{'1ª falha (µs)':>15}{'todas (µs)':>13}{'ranking (µs)':>14}{'todas/1ª':>10}")
+    for scale in args.scale:
+        fundos = scaled_catalog(config["fundos"], scale)
+        index = EligibilityIndex(fundos)
+        ranker = Ranker(index)
+
+        # Os dois caminhos têm que concordar antes de medir
+        for lead in leads[:50]:
+            _, first = index.evaluate(lead)
+            expected = loop_first_failure(fundos, lead)
+            assert [first.get(pos) for pos in range(len(index))] == [failed for _, failed in expected]
+
+        def first_failure(lead):
+            return index.evaluate(lead)
+
+        def all_failures(lead):
+            masks = index.masks(lead)
+            return index.failure_masks(masks)
+
+        def ranking(lead):
+            explicit = index.explicit_masks(lead)
+            masks = index.masks(lead, explicit)
+            eligible, first = index.evaluate(lead, masks)
+            near_miss_mask(index, masks)
+            return ranker.rank(eligible, explicit)
+
+        loop = per_lead_us(lambda lead: loop_first_failure(fundos, lead), leads, args.repeat)
+        first = per_lead_us(first_failure, leads, args.repeat)
+        every = per_lead_us(all_failures, leads, args.repeat)
+        ranked = per_lead_us(ranking, leads, args.repeat)
+        print(f"{len(index):>7}{loop:>12.1f}{first:>15.1f}{every:>13.1f}{ranked:>14.1f}{every / first:>9.2f}x")
+
+    bench_handler(config, leads, args.repeat)
+
+
+def bench_handler(config, leads, repeat):
+    import server
+
+    payloads = []
+    for lead in leads:
+        payloads.append(server.LeadData(
+            nome="Lead Teste", email="teste@exemplo.com", whatsapp="11999999999", como_chegou="google",
+            situacao_empresa=lead["situacao_empresa"][0],
+            faturamento_renda=lead["faturamento_renda"][0],
+            local=lead["regioes"][0],
+            segmento=list(lead["segmentos"]),
+            razao=list(lead["razoes"]),
+            garantia=list(lead["garantias"]),
+            tipo_imovel=lead.get("tipo_imovel", (None,))[0],
+        ))
+
+    async def run(explain):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for payload in payloads:
+                await server.avaliar_elegibilidade(payload, explain=explain, api_key=server.ADMIN_API_KEY)
+            best = min(best, time.perf_counter() - start)
+        return best / len(payloads) * 1e6
+
+    off = asyncio.run(run(False))
+    on = asyncio.run(run(True))
+    print(f"\navaliar-elegibilidade, {len(config['fundos'])} fundos")
+    print(f"  handler:             explain=false {off:8.1f} µs | explain=true {on:8.1f} µs ({on / off:.2f}x)")
+
+    from fastapi.testclient import TestClient
+
+    bodies = [payload.model_dump() for payload in payloads]
+    headers = {"X-API-Key": server.ADMIN_API_KEY}
+    with TestClient(server.app) as client:
+        def request(explain):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for body in bodies:
+                    client.post("/api/admin/avaliar-elegibilidade", params={"explain": explain}, json=body, headers=headers)
+                best = min(best, time.perf_counter() - start)
+            return best / len(bodies) * 1e6
+
+        off = request(False)
+        on = request(True)
+    print(f"  requisição completa: explain=false {off:8.1f} µs | explain=true {on:8.1f} µs ({on / off:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
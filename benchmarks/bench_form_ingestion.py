@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark da ingestão de FormSubmission em /api/form/webhook e /api/form/submit.
+
+Compara, com payloads no formato de MODELO_JSON_ENTREGA.json:
+- dict: json.loads do corpo + model_validate do dict (o caminho do FastAPI
+  para um parâmetro de corpo do tipo BaseModel)
+- bytes: model_validate_json direto dos bytes (dependência raw_json_body)
+
+E a serialização para o webhook a partir do modelo validado: model_dump +
+json.dumps contra model_to_json_bytes (sem dict intermediário).
+
+Uso: python benchmarks/bench_form_ingestion.py [--payloads 500] [--repeat 5]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from server import FormSubmission  # noqa: E402
+from serialization import model_to_json_bytes  # noqa: E402
+
+MODELO_PATH = Path(__file__).resolve().parent.parent / "MODELO_JSON_ENTREGA.json"
+
+
+def make_payloads(count):
+    modelo = json.loads(MODELO_PATH.read_text(encoding="utf-8"))
+    payloads = []
+    for i in range(count):
+        payload = json.loads(json.dumps(modelo))
+        payload["idempotency_key"] = str(uuid.uuid4())
+        payload["lead"]["nome"] = f"Lead {i}"
+        payload["lead"]["email"] = f"lead{i}@exemplo.com"
+        payload["score_gamificado"] = random.randint(0, 800)
+        payloads.append(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+    return payloads
+
+
+def per_payload_us(fn, payloads, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        for body in payloads:
+            fn(body)
+        best = min(best, time.process_time() - start)
+    return best / len(payloads) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payloads", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(42)
+    payloads = make_payloads(args.payloads)
+
+    # Os dois caminhos têm que produzir o mesmo modelo antes de medir
+    for body in payloads[:20]:
+        assert FormSubmission.model_validate(json.loads(body)) == FormSubmission.model_validate_json(body)
+
+    via_dict = per_payload_us(lambda body: FormSubmission.model_validate(json.loads(body)), payloads, args.repeat)
+    via_bytes = per_payload_us(FormSubmission.model_validate_json, payloads, args.repeat)
+
+    models = [FormSubmission.model_validate_json(body) for body in payloads]
+    encode_dict = per_payload_us(lambda m: json.dumps(m.model_dump(by_alias=True)).encode("utf-8"), models, args.repeat)
+    encode_bytes = per_payload_us(model_to_json_bytes, models, args.repeat)
+
+    print(f"{len(payloads)} payloads de ~{sum(map(len, payloads)) // len(payloads)} bytes (CPU por requisição)")
+    print(f"  validação:   dict {via_dict:7.1f} µs | bytes {via_bytes:7.1f} µs | economia {via_dict - via_bytes:6.1f} µs ({via_dict / via_bytes:.2f}x)")
+    print(f"  serialização: dict {encode_dict:6.1f} µs | bytes {encode_bytes:7.1f} µs | economia {encode_dict - encode_bytes:6.1f} µs ({encode_dict / encode_bytes:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark de serialização das respostas JSON por rota.
+
+Compara, para os payloads de cada rota:
+- antes: jsonable_encoder + JSONResponse padrão (json.dumps da stdlib)
+- depois: jsonable_encoder + FastJSONResponse (orjson)
+- direto: FastJSONResponse sem jsonable_encoder (rotas que devolvem a Response pronta)
+- pré-serializado: bytes do snapshot da configuração (só o custo de montar a Response)
+
+Uso: python benchmarks/bench_json_responses.py [--number 2000]
+"""
+import argparse
+import sys
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import server  # noqa: E402
+from serialization import FastJSONResponse, raw_json_response  # noqa: E402
+
+
+def route_payloads():
+    config = server.load_fundos_config()
+    opcoes = config.get("opcoes_formulario", {})
+    form_config = {
+        "fields": {key: [opt["value"] for opt in values] for key, values in opcoes.items()},
+        "opcoes_completas": opcoes,
+        "webhook_url": config.get("configuracao", {}).get("webhook_url", ""),
+    }
+    admin_fundos = {
+        "success": True,
+        "fundos": config.get("fundos", {}),
+        "opcoes_formulario": opcoes,
+    }
+    logs = {
+        "success": True,
+        "logs": [
+            {
+                "timestamp": datetime.utcnow().isoformat(),
+                "idempotency_key": f"key-{i}",
+                "lead_name": "João Silva Santos",
+                "lead_email": "joao.silva@example.com",
+                "success": i % 3 != 0,
+                "error": None if i % 3 else "HTTP 404: Webhook não está ativo",
+                "status_code": 200 if i % 3 else None,
+            }
+            for i in range(server.max_webhook_logs)
+        ],
+    }
+    health = {"status": "healthy", "timestamp": datetime.utcnow().isoformat(), "service": "investiza-form-api"}
+    # Rotas estáticas: o corpo pré-serializado é o do snapshot da configuração
+    responses = server.get_config_snapshot().responses
+    return {
+        "/api/form/config": (form_config, responses["form_config"]),
+        "/api/admin/fundos": (admin_fundos, responses["admin_fundos"]),
+        "/api/admin/webhook-logs": (logs, None),
+        "/api/health": (health, None),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'rota':<28}{'bytes':>8}{'antes (µs)':>13}{'orjson (µs)':>13}{'direto (µs)':>13}{'pré (µs)':>11}{'ganho':>8}")
+    for route, (payload, prerendered) in route_payloads().items():
+        before = timeit.timeit(lambda: JSONResponse(jsonable_encoder(payload)), number=args.number)
+        after = timeit.timeit(lambda: FastJSONResponse(jsonable_encoder(payload)), number=args.number)
+        direct = timeit.timeit(lambda: FastJSONResponse(payload), number=args.number)
+        size = len(FastJSONResponse(payload).body)
+        pre = None
+        if prerendered is not None:
+            pre = timeit.timeit(lambda: raw_json_response(prerendered), number=args.number)
+        best = pre if pre is not None else direct
+        per = lambda t: t / args.number * 1e6  # noqa: E731
+        pre_str = f"{per(pre):>11.1f}" if pre is not None else f"{'-':>11}"
+        print(f"{route:<28}{size:>8}{per(before):>13.1f}{per(after):>13.1f}{per(direct):>13.1f}{pre_str}{before / best:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
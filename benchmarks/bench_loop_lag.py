@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark do efeito de uma chamada bloqueante no event loop (loop_monitor.py).
+
+Sobe um receptor HTTP local que responde em `--delay` segundos, aponta o
+webhook de uma cópia temporária de fundos_criterios.json para ele e chama o
+app ASGI direto: enquanto POST /api/debug/webhook-test espera o receptor,
+requisições GET /api/health agendadas ao longo da espera medem a latência
+que veem a partir do horário agendado. Compara o requests.post síncrono
+dentro do handler (como era) com o envio via run_blocking (executor), e
+mostra o atraso do loop medido pelo LoopLagMonitor em cada caso.
+
+Uso: python benchmarks/bench_loop_lag.py [--delay 0.3] [--rounds 5] [--probes 20]
+"""
+import argparse
+import asyncio
+import http.server
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "backend"))
+
+
+class SlowReceiver(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.3
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header("content-length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+async def call(app, method, path, headers=()):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": list(headers), "client": ("127.0.0.1", 5000), "server": ("testserver", 80),
+    }
+    status = None
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def probe(app, planned, results):
+    """GET /api/health agendado para `planned`; a latência conta a partir do horário
+    agendado, incluindo o tempo em que o loop bloqueado não deixou a requisição começar"""
+    await asyncio.sleep(max(0.0, planned - time.perf_counter()))
+    await call(app, "GET", "/api/health")
+    results.append((time.perf_counter() - planned) * 1000)
+
+
+async def round_trip(server, probes, delay):
+    """Um webhook-test com `probes` GET /api/health distribuídos durante a espera"""
+    headers = [(b"x-api-key", server.ADMIN_API_KEY.encode())]
+    start = time.perf_counter()
+    latencies = []
+    pending = [probe(server.app, start + delay * (i + 1) / (probes + 1), latencies) for i in range(probes)]
+    status, *_ = await asyncio.gather(call(server.app, "POST", "/api/debug/webhook-test", headers), *pending)
+    assert status == 200
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delay", type=float, default=0.3, help="tempo de resposta do receptor (s)")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--probes", type=int, default=20)
+    args = parser.parse_args()
+
+    SlowReceiver.delay = args.delay
+    receiver = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SlowReceiver)
+    threading.Thread(target=receiver.serve_forever, daemon=True).start()
+
+    workdir = tempfile.mkdtemp(prefix="bench_loop_lag_")
+    config = json.loads((ROOT / "fundos_criterios.json").read_text(encoding="utf-8"))
+    config.setdefault("configuracao", {})["webhook_url"] = f"http://127.0.0.1:{receiver.server_port}/webhook"
+    config_path = Path(workdir) / "fundos_criterios.json"
+    config_path.write_text(json.dumps(config), encoding="utf-8")
+    os.environ["FUNDOS_CONFIG_PATH"] = str(config_path)
+    os.environ["WEBHOOK_SPOOL_DIR"] = str(Path(workdir) / "spool")
+
+    import server  # noqa: E402
+    server.logger.disabled = True
+
+    run_blocking = server.run_blocking
+
+    async def run_inline(fn, *fn_args, **kwargs):
+        return fn(*fn_args, **kwargs)
+
+    async def scenario(name, runner):
+        server.run_blocking = runner
+        server.loop_monitor.reset()
+        latencies = []
+        for _ in range(args.rounds):
+            latencies += await round_trip(server, args.probes, args.delay)
+        latencies.sort()
+        lag = server.loop_monitor.snapshot()
+        print(f"  {name:26s} health p50 {latencies[len(latencies) // 2]:7.1f} ms  "
+              f"max {latencies[-1]:7.1f} ms  | lag máx {lag['lag']['max_ms']:7.1f} ms, bloqueios {lag['stalls']}")
+
+    async def run():
+        server.loop_monitor.start()
+        print(f"webhook-test com receptor de {args.delay * 1000:g} ms; {args.probes} GET /api/health por envio")
+        await scenario("requests.post no loop", run_inline)
+        await scenario("run_blocking (executor)", run_blocking)
+        server.loop_monitor.stop()
+
+    asyncio.run(run())
+    receiver.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark do single-flight (single_flight.py) em POST /api/admin/avaliar-elegibilidade.
+
+Chama o app ASGI direto com rajadas de `--concurrency` avaliações
+simultâneas: todas do mesmo lead (como a aba Preview do painel repetindo a
+mesma consulta) ou de leads distintos. Compara o tempo por rajada e o número
+de avaliações executadas com o agrupamento ligado e desligado (execução
+direta no executor, sem agrupar).
+
+Uso: python benchmarks/bench_single_flight.py [--concurrency 30] [--bursts 20]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+from single_flight import AsyncSingleFlight  # noqa: E402
+
+MODELO_PATH = Path(__file__).resolve().parent.parent / "MODELO_JSON_ENTREGA.json"
+
+
+class NoFlight(AsyncSingleFlight):
+    """Mesma interface, sem agrupar: cada chamada executa"""
+
+    async def do(self, key, fn, *args, **kwargs):
+        self.calls += 1
+        self.executions += 1
+        return await fn(*args, **kwargs)
+
+
+async def call(body):
+    path = "/api/admin/avaliar-elegibilidade"
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"explain=true",
+        "headers": [(b"content-type", b"application/json"), (b"x-api-key", server.ADMIN_API_KEY.encode())],
+        "client": ("127.0.0.1", 5000), "server": ("testserver", 80),
+    }
+    sent = False
+    status = None
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await server.app(scope, receive, send)
+    return status
+
+
+async def bursts(bodies, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        statuses = await asyncio.gather(*[call(body) for body in bodies])
+        assert set(statuses) == {200}, statuses
+    return (time.perf_counter() - start) / count * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=30,
+                        help="até ADMISSION_ADMIN_CONCURRENCY + ADMISSION_ADMIN_QUEUE (40), senão 503")
+    parser.add_argument("--bursts", type=int, default=20)
+    args = parser.parse_args()
+
+    lead = json.loads(MODELO_PATH.read_text(encoding="utf-8"))["lead"]
+    same = [json.dumps(lead).encode()] * args.concurrency
+    distinct = [json.dumps({**lead, "local": local}).encode()
+                for local in ("Nordeste", "Norte", "Sudeste", "Sul", "Centro-Oeste")]
+    distinct = (distinct * args.concurrency)[:args.concurrency]
+    server.logger.disabled = True
+
+    async def run():
+        await bursts(same[:1], 1)  # aquece snapshot e caches
+        print(f"rajadas de {args.concurrency} avaliações simultâneas (explain=true), média de {args.bursts}")
+        for name, bodies in (("mesmo lead", same), ("5 leads distintos", distinct)):
+            for label, flight in (("sem agrupar", NoFlight()), ("single-flight", AsyncSingleFlight())):
+                server.eligibility_flight = flight
+                elapsed = await bursts(bodies, args.bursts)
+                print(f"  {name:18s} {label:14s} {elapsed:8.2f} ms/rajada  "
+                      f"execuções {flight.executions:5d} de {flight.calls}")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
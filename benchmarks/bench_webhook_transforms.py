@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark das transformações jq por destino de webhook (webhook_transforms).
+
+Mede, com payloads no formato de MODELO_JSON_ENTREGA.json serializados como
+no envio (model_to_json_bytes):
+- o custo por lead de PayloadTransformer.apply para programas típicos
+  (identidade, projeção para CRM, achatamento para data lake)
+- compilação a cada lead (o que o cache por versão da configuração evita)
+  contra o programa já compilado
+- o caminho de fallback (programa que falha em tempo de execução)
+
+Uso: python benchmarks/bench_webhook_transforms.py [--payloads 500] [--repeat 5]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from server import FormSubmission  # noqa: E402
+from serialization import model_to_json_bytes  # noqa: E402
+from webhook_transforms import PayloadTransformer, get_jq  # noqa: E402
+
+MODELO_PATH = Path(__file__).resolve().parent.parent / "MODELO_JSON_ENTREGA.json"
+
+PROGRAMS = {
+    "identidade": ".",
+    "crm": (
+        "{nome: .lead.nome, email: .lead.email, whatsapp: .lead.whatsapp, empresa: .lead.nome_empresa,"
+        " origem: .meta.utm_source, fundos: .eligibility.recomendados, score: .score_gamificado}"
+    ),
+    "datalake": (
+        "{id: .idempotency_key, ts: .timestamp}"
+        " + (.lead | with_entries(.key |= \"lead_\" + .))"
+        " + {fundos: (.eligibility.recomendados | join(\",\")), n_fundos: (.eligibility.recomendados | length)}"
+    ),
+    # .lead é um objeto: falha em tempo de execução, todo lead cai no fallback
+    "falha": ".lead | tonumber",
+}
+
+
+def make_bodies(count):
+    modelo = json.loads(MODELO_PATH.read_text(encoding="utf-8"))
+    bodies = []
+    for i in range(count):
+        payload = json.loads(json.dumps(modelo))
+        payload["idempotency_key"] = str(uuid.uuid4())
+        payload["lead"]["nome"] = f"Lead {i}"
+        payload["lead"]["email"] = f"lead{i}@exemplo.com"
+        payload["score_gamificado"] = random.randint(0, 800)
+        bodies.append(model_to_json_bytes(FormSubmission.model_validate(payload)))
+    return bodies
+
+
+def per_body_us(fn, bodies, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        for body in bodies:
+            fn(body)
+        best = min(best, time.process_time() - start)
+    return best / len(bodies) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payloads", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(42)
+    bodies = make_bodies(args.payloads)
+    transformer = PayloadTransformer(PROGRAMS)
+
+    # Os programas válidos precisam transformar de fato (sem cair no fallback)
+    for name in ("crm", "datalake"):
+        assert transformer.apply(name, bodies[0]) != bodies[0], name
+    assert transformer.apply("falha", bodies[0]) is bodies[0]
+
+    print(f"{len(bodies)} payloads de ~{sum(map(len, bodies)) // len(bodies)} bytes (CPU por lead)")
+    for name in PROGRAMS:
+        cost = per_body_us(lambda body: transformer.apply(name, body), bodies, args.repeat)
+        output = len(transformer.apply(name, bodies[0]))
+        print(f"  {name:10s} {cost:7.1f} µs/lead  saída {output:5d} bytes")
+
+    jq = get_jq()
+    program = PROGRAMS["crm"]
+    compiled = jq.compile(program)
+    sample = bodies[:50]
+    every_time = per_body_us(lambda body: jq.compile(program).input_text(body.decode()).all(), sample, args.repeat)
+    cached = per_body_us(lambda body: compiled.input_text(body.decode()).all(), sample, args.repeat)
+    print(f"  crm compilando a cada lead {every_time:7.1f} µs | compilado uma vez {cached:7.1f} µs ({every_time / cached:.1f}x)")
+
+    status = transformer.status()
+    print("  compilação por versão da configuração: " + ", ".join(
+        f"{name} {stats['compile_ms']} ms" for name, stats in status.items()
+    ))
+
+
+if __name__ == "__main__":
+    main()
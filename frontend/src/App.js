@@ -97,6 +97,16 @@ const AdminLogin = ({ onLogin }) => {
     const [showAddFundo, setShowAddFundo] = useState(false);
     const [tempFundo, setTempFundo] = useState({});
     const [webhookLogs, setWebhookLogs] = useState([]); // Logs do webhook
+    const [previewLead, setPreviewLead] = useState({
+      situacao_empresa: 'cnpj_antigo',
+      faturamento_renda: '10-80',
+      local: 'Sudeste',
+      segmento: 'Tecnologia',
+      razao: 'Ampliacao',
+      garantia: 'Imovel',
+      tipo_imovel: 'Comercial'
+    }); // Lead simulado na aba Preview
+    const [previewResult, setPreviewResult] = useState(null);
     
 
     // Estados para critérios
@@ -114,6 +124,24 @@ const AdminLogin = ({ onLogin }) => {
     }
   }, [adminKey, adminAuthError]);
 
+  // Logs do webhook em tempo real (SSE) enquanto a aba de logs estiver aberta
+  useEffect(() => {
+    if (activeTab !== 'logs' || !adminKey) return undefined;
+
+    loadWebhookLogs();
+    // EventSource não envia headers; a chave vai no parâmetro admin_key
+    const source = new EventSource(`/api/admin/webhook-logs/stream?admin_key=${encodeURIComponent(adminKey)}`);
+    source.addEventListener('webhook_log', (event) => {
+      const log = JSON.parse(event.data);
+      setWebhookLogs((prev) => [log, ...prev].slice(0, 100));
+    });
+    // Eventos perdidos (buffer do servidor excedido): recarregar a lista completa
+    source.addEventListener('reset', () => loadWebhookLogs());
+    source.addEventListener('overflow', () => loadWebhookLogs());
+
+    return () => source.close();
+  }, [activeTab, adminKey]);
+
   const loadFundosFromBackend = async (key) => {
     setLoading(true);
     setError('');
@@ -172,6 +200,19 @@ const AdminLogin = ({ onLogin }) => {
     }
   };
 
+  // Recarrega só o fundo alterado (ETag: 304 quando nada mudou)
+  const refreshFundo = async (id) => {
+    const response = await fetch(`/api/admin/fundos/${id}?include_opcoes=false`, {
+      headers: { 'X-API-Key': adminKey },
+    });
+    if (!response.ok) {
+      await loadFundosFromBackend(adminKey);
+      return;
+    }
+    const data = await response.json();
+    setFundos((prev) => ({ ...prev, [id]: data.fundo }));
+  };
+
   // Carregar critérios do fundo selecionado
   useEffect(() => {
     if (selectedFundo && fundos[selectedFundo]) {
@@ -301,7 +342,7 @@ const AdminLogin = ({ onLogin }) => {
         throw new Error('Erro ao salvar critérios');
       }
 
-      await loadFundosFromBackend(adminKey);
+      await refreshFundo(selectedFundo);
       alert('✅ Critérios salvos com sucesso!');
     } catch (e) {
       console.error('Erro ao salvar critérios:', e);
@@ -334,17 +375,20 @@ const AdminLogin = ({ onLogin }) => {
     try {
       const response = await fetch(`/api/admin/avaliar-elegibilidade`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-API-Key': adminKey },
         body: JSON.stringify(dadosExemplo)
       });
 
       if (response.ok) {
         const resultado = await response.json();
         const fundoNosRecomendados = resultado.elegibilidade.recomendados.find(f => f.id === selectedFundo);
+        const fundoNosAtipicos = resultado.elegibilidade.possiveis_atipicos.find(f => f.id === selectedFundo);
         const fundoNosNaoElegiveis = resultado.elegibilidade.nao_elegiveis.find(f => f.id === selectedFundo);
         
         if (fundoNosRecomendados) {
-          alert(`✅ TESTE APROVADO!\n\nFundo: ${fundoNosRecomendados.nome}\nStatus: RECOMENDADO\nMotivo: ${fundoNosRecomendados.motivo}`);
+          alert(`✅ TESTE APROVADO!\n\nFundo: ${fundoNosRecomendados.nome}\nStatus: RECOMENDADO\nScore: ${fundoNosRecomendados.score}\nMotivo: ${fundoNosRecomendados.motivo}`);
+        } else if (fundoNosAtipicos) {
+          alert(`⚠️ QUASE APROVADO!\n\nFundo: ${fundoNosAtipicos.nome}\nStatus: POSSÍVEL ATÍPICO\nMotivo: ${fundoNosAtipicos.motivo}`);
         } else if (fundoNosNaoElegiveis) {
           alert(`❌ TESTE REPROVADO!\n\nFundo: ${fundoNosNaoElegiveis.nome}\nStatus: NÃO ELEGÍVEL\nMotivo: ${fundoNosNaoElegiveis.motivo}`);
         } else {
@@ -358,6 +402,38 @@ const AdminLogin = ({ onLogin }) => {
     }
   };
 
+  // Simulação da aba Preview: todos os critérios reprovados de cada fundo (explain=true)
+  const simularElegibilidade = async () => {
+    const lead = {
+      nome: "Simulação Preview",
+      email: "preview@exemplo.com",
+      whatsapp: "+55 11 99999-9999",
+      como_chegou: "google",
+      situacao_empresa: previewLead.situacao_empresa,
+      faturamento_renda: previewLead.faturamento_renda,
+      local: previewLead.local,
+      segmento: [previewLead.segmento],
+      razao: [previewLead.razao],
+      garantia: [previewLead.garantia],
+      tipo_imovel: previewLead.tipo_imovel
+    };
+
+    try {
+      const response = await fetch(`/api/admin/avaliar-elegibilidade?explain=true`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'X-API-Key': adminKey },
+        body: JSON.stringify(lead)
+      });
+      if (!response.ok) {
+        throw new Error('Erro na avaliação');
+      }
+      const resultado = await response.json();
+      setPreviewResult(resultado.elegibilidade);
+    } catch (e) {
+      alert('❌ Erro ao simular elegibilidade: ' + e.message);
+    }
+  };
+
   const handleCriterioChange = (categoria, valor, checked) => {
     // Sanitizar entradas para evitar injeções
     const sanitizarTexto = (texto) => {
@@ -430,7 +506,7 @@ const AdminLogin = ({ onLogin }) => {
       }
 
       // Recarregar dados do backend
-      await loadFundosFromBackend(adminKey);
+      await refreshFundo(id);
       
       setEditingFundo(null);
       setTempFundo({});
@@ -927,34 +1003,57 @@ const AdminLogin = ({ onLogin }) => {
         <CardContent>
           <div className="space-y-4">
             <div className="grid grid-cols-2 gap-4">
-              <div>
-                <Label className="text-slate-300">Situação CNPJ</Label>
-                <select className="w-full p-2 bg-gray-700 border border-gray-600 rounded text-slate-200">
-                  <option>CNPJ há mais de 3 anos</option>
-                  <option>CNPJ há menos de 3 anos</option>
-                  <option>Empresa em implantação</option>
-                  <option>Pessoa física</option>
-                  <option>CNPJ em Recuperação Judicial</option>
-                </select>
-              </div>
-              <div>
-                <Label className="text-slate-300">Faturamento</Label>
-                <select className="w-full p-2 bg-gray-700 border border-gray-600 rounded text-slate-200">
-                  <option>R$ 10 a R$ 80 milhões</option>
-                  <option>Acima de R$ 80 milhões</option>
-                </select>
-              </div>
+              {[
+                ['situacao_empresa', 'Situação CNPJ', 'situacao_empresa'],
+                ['faturamento_renda', 'Faturamento', 'faturamento_renda'],
+                ['local', 'Região', 'regioes'],
+                ['segmento', 'Segmento', 'segmentos'],
+                ['razao', 'Razão', 'razoes'],
+                ['garantia', 'Garantia', 'garantias'],
+                ['tipo_imovel', 'Tipo de imóvel', 'tipo_imovel'],
+              ].map(([campo, label, opcao]) => (
+                <div key={campo}>
+                  <Label className="text-slate-300">{label}</Label>
+                  <select
+                    value={previewLead[campo]}
+                    onChange={(e) => setPreviewLead({ ...previewLead, [campo]: e.target.value })}
+                    className="w-full p-2 bg-gray-700 border border-gray-600 rounded text-slate-200"
+                  >
+                    {opcoesFormulario[opcao]?.map(option => (
+                      <option key={option.value} value={option.value}>{option.label}</option>
+                    ))}
+                  </select>
+                </div>
+              ))}
             </div>
             
-            <Button className="bg-blue-600 hover:bg-blue-700">
+            <Button onClick={simularElegibilidade} className="bg-blue-600 hover:bg-blue-700">
               🔍 Simular Elegibilidade
             </Button>
             
-            <div className="mt-4 p-4 bg-gray-700 rounded">
-              <p className="text-slate-300 text-sm">
-                💡 Em breve: simulação em tempo real dos critérios de elegibilidade
-              </p>
-            </div>
+            {previewResult && (
+              <div className="mt-4 space-y-3">
+                {previewResult.recomendados.map(fundo => (
+                  <div key={fundo.id} className="p-3 rounded border bg-green-900/20 border-green-700">
+                    <span className="text-green-400 font-medium">✅ {fundo.nome}</span>
+                    <span className="text-slate-400 text-sm ml-2">score {fundo.score}</span>
+                  </div>
+                ))}
+                {[...previewResult.possiveis_atipicos, ...previewResult.nao_elegiveis].map(fundo => (
+                  <div key={fundo.id} className="p-3 rounded border bg-red-900/20 border-red-700">
+                    <span className="text-red-400 font-medium">❌ {fundo.nome}</span>
+                    <ul className="mt-1 text-sm text-slate-300 list-disc list-inside">
+                      {(fundo.falhas || []).map(falha => (
+                        <li key={falha.dimensao}>
+                          {falha.motivo}
+                          <span className="text-slate-400"> (aceita: {falha.aceitos.join(', ') || '—'})</span>
+                        </li>
+                      ))}
+                    </ul>
+                  </div>
+                ))}
+              </div>
+            )}
           </div>
         </CardContent>
       </Card>
@@ -987,11 +1086,7 @@ const AdminLogin = ({ onLogin }) => {
   );
 
   const renderLogsTab = () => {
-    // Atualizar logs quando a aba for aberta
-    if (activeTab === 'logs' && webhookLogs.length === 0) {
-      loadWebhookLogs();
-    }
-
+    // Logs carregados e atualizados pelo stream SSE (ver useEffect acima)
     return (
       <div className="space-y-6">
         <div className="flex justify-between items-center">
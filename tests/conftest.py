@@ -0,0 +1,97 @@
+"""
+Configuração comum dos testes.
+
+O `server` lê a configuração do ambiente na importação: antes dela, os testes
+apontam FUNDOS_CONFIG_PATH para uma cópia do fundos_criterios.json cujo
+webhook é um endereço local sem servidor (nenhum lead de teste sai da
+máquina) e isolam spool, locks e snapshots num diretório temporário.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "backend"))
+
+TEST_DIR = Path(tempfile.mkdtemp(prefix="investiza-tests-"))
+CLOSED_PORT_URL = "http://127.0.0.1:9/webhook"  # porta discard: conexão recusada
+
+_config = json.loads((ROOT / "fundos_criterios.json").read_text(encoding="utf-8"))
+_config["configuracao"]["webhook_url"] = CLOSED_PORT_URL
+(TEST_DIR / "fundos_criterios.json").write_text(json.dumps(_config, ensure_ascii=False), encoding="utf-8")
+
+for _name, _value in {
+    "FUNDOS_CONFIG_PATH": str(TEST_DIR / "fundos_criterios.json"),
+    "WEBHOOK_SPOOL_DIR": str(TEST_DIR / "webhook_spool"),
+    "SCHEDULER_LOCK_DIR": str(TEST_DIR / "scheduler"),
+    "SCHEDULER_ENABLED": "0",
+    "CONFIG_SNAPSHOT_DIR": str(TEST_DIR / "snapshots"),
+    "STATE_BACKEND_URL": "memory://",
+    # O lifespan espera o watcher acordar ao desligar: intervalo curto nos testes
+    "CONFIG_POLL_INTERVAL": "0.2",
+    "ADMIN_API_KEY": "test-admin-key",
+}.items():
+    os.environ[_name] = _value
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def server():
+    import server as server_module
+    return server_module
+
+
+@pytest.fixture
+def client(server):
+    from fastapi.testclient import TestClient
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def admin_headers(server):
+    return {"X-API-Key": server.ADMIN_API_KEY}
+
+
+@pytest.fixture
+def lead_payload():
+    """Submissão de exemplo (MODELO_JSON_ENTREGA.json)"""
+    return json.loads((ROOT / "MODELO_JSON_ENTREGA.json").read_text(encoding="utf-8"))
+
+
+@pytest.fixture
+def edit_config(server):
+    """Altera o fundos_criterios.json de teste e publica o novo snapshot; restaura ao final"""
+    path = server.get_fundos_config_path()
+    original = path.read_bytes()
+
+    def edit(change):
+        config = json.loads(path.read_text(encoding="utf-8"))
+        change(config)
+        path.write_text(json.dumps(config, ensure_ascii=False), encoding="utf-8")
+        assert server.config_store.reload()
+
+    yield edit
+    path.write_bytes(original)
+    server.config_store.reload()
+
+
+@pytest.fixture
+def strict_loop_monitor(server, client):
+    """Modo estrito do LoopLagMonitor: requisição que bloquear o event loop falha o teste.
+
+    Depende de `client`, cujo lifespan inicia o monitor.
+    """
+    assert server.loop_monitor.running
+    previous = server.loop_monitor.strict
+    server.loop_monitor.strict = True
+    yield server.loop_monitor
+    server.loop_monitor.strict = previous
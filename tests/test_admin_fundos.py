@@ -0,0 +1,31 @@
+import pytest
+
+pytestmark = pytest.mark.usefixtures("strict_loop_monitor")
+
+
+def add_regiao(config):
+    config["opcoes_formulario"]["regioes"].append({"value": "Exterior", "label": "Exterior"})
+
+
+def test_fundo_etag_changes_with_opcoes(client, admin_headers, edit_config):
+    fundo_id = sorted(client.get("/api/admin/fundos", headers=admin_headers).json()["fundos"])[0]
+    url = f"/api/admin/fundos/{fundo_id}"
+    first = client.get(url, headers=admin_headers)
+    assert client.get(url, headers={**admin_headers, "If-None-Match": first.headers["etag"]}).status_code == 304
+
+    edit_config(add_regiao)
+
+    second = client.get(url, headers={**admin_headers, "If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.headers["etag"] != first.headers["etag"]
+    assert {"value": "Exterior", "label": "Exterior"} in second.json()["opcoes_formulario"]["regioes"]
+
+
+def test_fundo_etag_without_opcoes_ignores_opcoes(client, admin_headers, edit_config):
+    fundo_id = sorted(client.get("/api/admin/fundos", headers=admin_headers).json()["fundos"])[0]
+    url = f"/api/admin/fundos/{fundo_id}?include_opcoes=false"
+    etag = client.get(url, headers=admin_headers).headers["etag"]
+
+    edit_config(add_regiao)
+
+    assert client.get(url, headers={**admin_headers, "If-None-Match": etag}).status_code == 304
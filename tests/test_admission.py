@@ -0,0 +1,126 @@
+import asyncio
+
+import httpx
+import pytest
+
+from admission import AdmissionClass, AdmissionController, AdmissionMiddleware, Shed
+
+
+def controller(max_concurrency=1, max_queue=10, lead_queue=5, admin_queue=5, max_wait=5.0):
+    return AdmissionController(max_concurrency=max_concurrency, max_queue=max_queue, classes={
+        "lead": AdmissionClass(priority=0, concurrency=1, queue_size=lead_queue, max_wait=max_wait),
+        "admin": AdmissionClass(priority=1, concurrency=1, queue_size=admin_queue, max_wait=max_wait),
+    })
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_full_class_queue_gets_503_with_retry_after():
+    admission = controller(lead_queue=1)
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    middleware = AdmissionMiddleware(app, admission, routes=[("/api/form/", "lead")])
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            running = asyncio.ensure_future(client.post("/api/form/webhook"))
+            queued = asyncio.ensure_future(client.post("/api/form/webhook"))
+            await settle()
+            assert (admission.in_flight, admission.queue_depth) == (1, 1)
+
+            shed = await client.post("/api/form/webhook")
+            release.set()
+            return shed, await running, await queued
+
+    shed, running, queued = asyncio.run(scenario())
+    assert shed.status_code == 503
+    assert int(shed.headers["retry-after"]) >= 1
+    assert shed.json()["reason"] == "queue_full"
+    assert (running.status_code, queued.status_code) == (200, 200)
+    assert admission.classes["lead"].shed["queue_full"] == 1
+
+
+def test_lead_evicts_queued_admin_when_global_queue_is_full():
+    admission = controller(max_queue=1)
+
+    async def scenario():
+        await admission.acquire("admin")  # ocupa a única vaga
+        admin = asyncio.ensure_future(admission.acquire("admin"))
+        await settle()
+        lead = asyncio.ensure_future(admission.acquire("lead"))
+        await settle()
+        with pytest.raises(Shed) as shed:
+            await admin
+        admission.release("admin", 0.01)
+        await lead
+        return shed.value
+
+    shed = asyncio.run(scenario())
+    assert shed.reason == "evicted"
+    assert admission.classes["admin"].shed["evicted"] == 1
+    assert admission.classes["lead"].admitted == 1
+
+
+def test_admin_does_not_evict_queued_lead():
+    admission = controller(max_queue=1)
+
+    async def scenario():
+        await admission.acquire("lead")
+        lead = asyncio.ensure_future(admission.acquire("lead"))
+        await settle()
+        with pytest.raises(Shed) as shed:
+            await admission.acquire("admin")
+        lead.cancel()
+        return shed.value
+
+    assert asyncio.run(scenario()).reason == "queue_full"
+
+
+def test_waiter_expires_at_max_wait():
+    admission = controller(max_wait=0.1)
+
+    async def scenario():
+        await admission.acquire("lead")
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(Shed) as shed:
+            await admission.acquire("lead")
+        return shed.value, loop.time() - started
+
+    shed, waited = asyncio.run(scenario())
+    assert shed.reason == "expired"
+    assert 0.1 <= waited < 1
+    assert admission.queue_depth == 0
+    assert admission.classes["lead"].shed["expired"] == 1
+
+
+def test_lead_is_admitted_before_admin_queued_earlier():
+    admission = controller()
+    order = []
+
+    async def wait_for(name):
+        await admission.acquire(name)
+        order.append(name)
+
+    async def scenario():
+        await admission.acquire("admin")
+        admin = asyncio.ensure_future(wait_for("admin"))
+        await settle()
+        lead = asyncio.ensure_future(wait_for("lead"))
+        await settle()
+        admission.release("admin", 0.01)
+        await lead
+        admission.release("lead", 0.01)
+        await admin
+
+    asyncio.run(scenario())
+    assert order == ["lead", "admin"]
@@ -0,0 +1,82 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from body_limits import BodyLimitMiddleware, parse_size
+
+LIMIT = 1024
+
+
+async def echo_size(request):
+    return JSONResponse({"size": len(await request.body())})
+
+
+async def swallow_errors(request):
+    # Aplicação que captura qualquer erro ao ler o corpo e responde 200
+    try:
+        await request.body()
+    except Exception:
+        pass
+    return JSONResponse({"ok": True})
+
+
+@pytest.fixture
+def limited():
+    app = Starlette(routes=[
+        Route("/small/echo", echo_size, methods=["POST"]),
+        Route("/big/echo", echo_size, methods=["POST"]),
+        Route("/small/swallow", swallow_errors, methods=["POST"]),
+    ])
+    middleware = BodyLimitMiddleware(app, limits={"/small/": LIMIT, "/big/": 4 * LIMIT}, default=64)
+    return middleware, TestClient(middleware)
+
+
+def chunks(total, size=256):
+    for start in range(0, total, size):
+        yield b"x" * min(size, total - start)
+
+
+def test_parse_size():
+    assert parse_size("16k") == 16 * 1024
+    assert parse_size("8m") == 8 * 1024 ** 2
+    assert parse_size("1048576") == 1048576
+
+
+def test_body_within_limit_passes(limited):
+    _, client = limited
+    assert client.post("/small/echo", content=b"x" * LIMIT).json() == {"size": LIMIT}
+    # Prefixo mais longo vence: /big/ tem limite próprio
+    assert client.post("/big/echo", content=b"x" * 2 * LIMIT).json() == {"size": 2 * LIMIT}
+
+
+def test_oversized_content_length_is_rejected(limited):
+    middleware, client = limited
+    response = client.post("/small/echo", content=b"x" * (LIMIT + 1))
+    assert response.status_code == 413
+    assert str(LIMIT) in response.json()["detail"]
+    assert middleware.rejected == 1
+
+
+def test_oversized_chunked_body_is_rejected(limited):
+    middleware, client = limited
+    response = client.post("/small/echo", content=chunks(LIMIT * 3))
+    assert response.status_code == 413
+    assert middleware.rejected == 1
+    # Dentro do limite, o corpo chunked chega inteiro
+    assert client.post("/small/echo", content=chunks(LIMIT)).json() == {"size": LIMIT}
+
+
+@pytest.mark.parametrize("body", [b"x" * (LIMIT * 3), None], ids=["content-length", "chunked"])
+def test_app_catching_the_error_still_gets_413(limited, body):
+    _, client = limited
+    response = client.post("/small/swallow", content=body if body is not None else chunks(LIMIT * 3))
+    assert response.status_code == 413
+
+
+def test_server_applies_route_limits(server, client):
+    limit = server.body_limits["/api/form/"]
+    response = client.post("/api/form/webhook", content=b"{" + b" " * limit + b"}",
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 413
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+BULK_URL = "/api/admin/fundos/bulk"
+
+
+@pytest.fixture
+def config_file(server):
+    """Arquivo de configuração de teste, restaurado ao final"""
+    path = server.get_fundos_config_path()
+    original = path.read_bytes()
+    yield path
+    path.write_bytes(original)
+    server.config_store.reload()
+
+
+def fundo(nome, tipo="privado", regioes=("Nordeste",)):
+    return {"nome": nome, "tipo": tipo, "ativo": True,
+            "criterios": {"regioes": list(regioes), "segmentos": ["todos"]}}
+
+
+def test_bulk_json_applies_all_items_in_one_write(server, client, admin_headers, config_file):
+    generation = server.get_config_snapshot().generation
+    existing = sorted(server.load_fundos_config()["fundos"])[0]
+    response = client.post(BULK_URL, headers=admin_headers, json={"items": [
+        {"id": "BULK_A", "fundo": fundo("Bulk A")},
+        {"id": existing, "fundo": fundo("Renomeado", regioes=("Sul",))},
+    ]})
+
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert (data["applied"], data["failed"]) == (2, 0)
+    assert [r["status"] for r in data["results"]] == ["created", "updated"]
+    fundos = json.loads(config_file.read_text(encoding="utf-8"))["fundos"]
+    assert fundos["BULK_A"]["nome"] == "Bulk A"
+    assert fundos[existing]["criterios"]["regioes"] == ["Sul"]
+    # Uma única recompilação para o lote inteiro
+    assert server.get_config_snapshot().generation == generation + 1
+    assert data["version"] == server.get_config_snapshot().version
+
+
+def test_bulk_csv_splits_list_columns(server, client, admin_headers, config_file):
+    csv = ("id,nome,tipo,ativo,regioes,segmentos\n"
+           "BULK_CSV,Fundo CSV,desenvolvimento,sim,Nordeste|Norte,todos\n")
+    response = client.post(f"{BULK_URL}?mode=create", headers={**admin_headers, "Content-Type": "text/csv"},
+                           content=csv.encode("utf-8"))
+
+    assert response.status_code == 200, response.text
+    assert response.json()["results"] == [{"index": 0, "id": "BULK_CSV", "status": "created"}]
+    created = json.loads(config_file.read_text(encoding="utf-8"))["fundos"]["BULK_CSV"]
+    assert created["tipo"] == "desenvolvimento"
+    assert created["ativo"] is True
+    assert created["criterios"]["regioes"] == ["Nordeste", "Norte"]
+
+
+def test_bulk_dry_run_validates_without_writing(server, client, admin_headers, config_file):
+    original = config_file.read_bytes()
+    generation = server.get_config_snapshot().generation
+    response = client.post(f"{BULK_URL}?dry_run=true", headers=admin_headers, json={"items": [
+        {"id": "BULK_DRY", "fundo": fundo("Prévia")},
+        {"id": "BULK_DRY_2", "fundo": fundo("Tipo inválido", tipo="outro")},
+    ]})
+
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["dry_run"] is True
+    assert (data["applied"], data["valid"], data["failed"]) == (0, 1, 1)
+    assert [r["status"] for r in data["results"]] == ["created", "error"]
+    assert config_file.read_bytes() == original
+    assert server.get_config_snapshot().generation == generation
+
+
+def test_bulk_all_or_nothing_rolls_back_on_invalid_item(server, client, admin_headers, config_file):
+    original = config_file.read_bytes()
+    generation = server.get_config_snapshot().generation
+    response = client.post(BULK_URL, headers=admin_headers, json={"items": [
+        {"id": "BULK_OK", "fundo": fundo("Válido")},
+        {"id": "BULK_BAD", "fundo": fundo("Inválido", tipo="outro")},
+        {"id": "BULK_OK_2", "fundo": fundo("Também válido")},
+    ]})
+
+    assert response.status_code == 400
+    data = response.json()
+    assert data["applied"] == 0
+    assert [r["status"] for r in data["results"]] == ["skipped", "error", "skipped"]
+    assert config_file.read_bytes() == original
+    assert server.get_config_snapshot().generation == generation
+    assert "BULK_OK" not in server.get_config_snapshot().fundos
@@ -0,0 +1,31 @@
+import gzip
+
+from compression import CompressedResponseCache
+
+
+def test_invalidate_drops_entries_on_next_access():
+    cache = CompressedResponseCache(max_bytes=1024)
+    cache.put(("/api/form/config", b'"v1"'), b"corpo antigo")
+    cache.invalidate()
+    assert cache.get(("/api/form/config", b'"v1"')) is None
+    assert cache.snapshot()["entries"] == 0
+    assert cache.size == 0
+
+
+def test_compressed_entry_does_not_outlive_config_version(server, client, edit_config):
+    cache = server.response_compressor.cache
+    url = "/api/form/config"
+    first = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert first.headers["content-encoding"] == "gzip"
+    etag = first.headers["etag"].removeprefix("W/").encode()
+    key = (url, etag)
+    assert cache.get(key) is not None
+
+    # Mesmo que a chave (caminho, ETag) se repetisse, o corpo guardado é descartado
+    cache.put(key, gzip.compress(b'{"stale": true}'))
+    edit_config(lambda config: config["opcoes_formulario"]["regioes"].append(
+        {"value": "Exterior", "label": "Exterior"}))
+    assert cache.get(key) is None
+
+    second = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert "Exterior" in second.json()["fields"]["regioes"]
@@ -0,0 +1,81 @@
+import asyncio
+
+from event_stream import EventBroadcaster, EventRelay
+from serialization import loads
+
+
+def test_unstarted_stream_does_not_hold_subscriber():
+    broadcaster = EventBroadcaster(max_subscribers=1)
+
+    async def scenario():
+        # Respostas que nunca começaram (cliente desconectou antes) não ocupam vaga
+        for _ in range(3):
+            broadcaster.stream()
+        assert broadcaster.has_capacity()
+
+        stream = broadcaster.stream()
+        assert await stream.__anext__() == b"retry: 3000\n\n"
+        assert broadcaster.snapshot()["subscribers"] == 1
+        assert not broadcaster.has_capacity()
+        await stream.aclose()
+        assert broadcaster.snapshot()["subscribers"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_broadcaster_asks_client_to_retry():
+    broadcaster = EventBroadcaster(max_subscribers=1)
+
+    async def scenario():
+        first = broadcaster.stream()
+        await first.__anext__()
+        second = broadcaster.stream()
+        assert [chunk async for chunk in second] == [b"retry: 10000\n\n"]
+        await first.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_stream_id_is_per_process(monkeypatch):
+    broadcaster = EventBroadcaster()
+    parent = broadcaster.stream_id
+    monkeypatch.setattr("event_stream.os.getpid", lambda: 424242)
+    assert broadcaster.stream_id != parent
+    assert broadcaster.stream_id.startswith(f"{424242:x}")
+
+
+def relayed_events(broadcaster):
+    return [loads(payload) for _, event, payload in broadcaster._ring if event == "webhook_log"]
+
+
+def test_relay_publishes_only_new_events_from_other_workers(monkeypatch):
+    broadcaster = EventBroadcaster()
+    monkeypatch.setattr(broadcaster, "has_subscribers", lambda: True)
+    shared = [{"id": "a", "origin": "outro"}]
+    relay = EventRelay(broadcaster, "webhook_log", lambda: list(shared))
+
+    assert relay.poll() == 0  # primeira leitura: só marca o histórico
+    shared[:0] = [
+        {"id": "d", "origin": "outro"},
+        {"id": "c", "origin": broadcaster.stream_id},
+        {"id": "b", "origin": "outro"},
+    ]
+    assert relay.poll() == 2
+    assert [event["id"] for event in relayed_events(broadcaster)] == ["b", "d"]
+    assert relay.poll() == 0
+
+
+def test_relay_without_subscribers_does_not_replay_history(monkeypatch):
+    broadcaster = EventBroadcaster()
+    connected = [False]
+    monkeypatch.setattr(broadcaster, "has_subscribers", lambda: connected[0])
+    shared = [{"id": "a", "origin": "outro"}]
+    relay = EventRelay(broadcaster, "webhook_log", lambda: list(shared))
+
+    assert relay.poll() == 0
+    connected[0] = True
+    shared.insert(0, {"id": "b", "origin": "outro"})
+    assert relay.poll() == 0
+    shared.insert(0, {"id": "c", "origin": "outro"})
+    assert relay.poll() == 1
+    assert [event["id"] for event in relayed_events(broadcaster)] == ["c"]
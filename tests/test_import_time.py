@@ -0,0 +1,42 @@
+"""
+Orçamento de inicialização: importar `server` e pré-carregar a configuração
+num processo novo (como o mestre do serve.py) não pode passar de
+IMPORT_TIME_BUDGET_MS nem carregar módulos pesados/opcionais.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import serve
+
+BACKEND_DIR = Path(serve.__file__).resolve().parent
+BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "800"))
+
+
+def startup_probe():
+    proc = subprocess.run(
+        [sys.executable, "-c", serve._STARTUP_PROBE % (serve.FORBIDDEN_STARTUP_MODULES,)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=60,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+@pytest.fixture(scope="module")
+def probes():
+    return [startup_probe() for _ in range(3)]
+
+
+def test_startup_does_not_load_forbidden_modules(probes):
+    for probe in probes:
+        assert probe["loaded"] == [], f"módulos proibidos carregados na inicialização: {probe['loaded']}"
+
+
+def test_startup_within_budget(probes):
+    total = statistics.median(probe["import_ms"] + probe["preload_ms"] for probe in probes)
+    assert total <= BUDGET_MS, f"inicialização em {total:.1f} ms, acima do orçamento de {BUDGET_MS:.0f} ms"
@@ -0,0 +1,92 @@
+import pytest
+
+from eligibility import EligibilityIndex, Ranker
+
+FUNDOS = {
+    "EXPLICITO": {"nome": "Explícito", "tipo": "privado",
+                  "criterios": {"regioes": ["Nordeste"], "segmentos": ["industria"]}},
+    "CURINGA": {"nome": "Curinga", "tipo": "privado",
+                "criterios": {"regioes": ["todos"], "segmentos": ["todos"]}},
+    "CONSTITUCIONAL": {"nome": "Constitucional", "tipo": "constitucional",
+                       "criterios": {"regioes": ["todos"], "segmentos": ["todos"]}},
+    "MISTO": {"nome": "Misto", "tipo": "privado",
+              "criterios": {"regioes": ["Nordeste"], "segmentos": ["todos"]}},
+}
+LEAD = {"regioes": ["Nordeste"], "segmentos": ["industria"]}
+
+
+def ranked_ids(ranking=None, lead=LEAD):
+    index = EligibilityIndex(FUNDOS)
+    ranker = Ranker(index, ranking)
+    explicit = index.explicit_masks(lead)
+    eligible, _ = index.evaluate(lead)
+    return [(index.fund_ids[pos], score) for pos, score in ranker.rank(eligible, explicit)], ranker
+
+
+def test_scores_weight_explicit_wildcard_and_tipo():
+    ranked, _ = ranked_ids()
+    # máximo = prioridade 3 + pesos 1 (regiões) + 2 (segmentos) = 6
+    assert ranked == [
+        ("CONSTITUCIONAL", 75.0),   # 3 + 0.5 + 1 (curinga vale peso * 0.5)
+        ("EXPLICITO", 66.67),       # 1 + 1 + 2
+        ("MISTO", 50.0),            # 1 + 1 + 1
+        ("CURINGA", 41.67),         # 1 + 0.5 + 1
+    ]
+
+
+def test_ties_keep_configuration_order():
+    ranked, _ = ranked_ids({"prioridade_tipo": {"constitucional": 1}})
+    # máximo = 2 (desenvolvimento) + 3; CURINGA e CONSTITUCIONAL empatam em 2.5
+    assert ranked == [("EXPLICITO", 80.0), ("MISTO", 60.0), ("CURINGA", 50.0), ("CONSTITUCIONAL", 50.0)]
+
+
+def test_ranking_overrides_change_order():
+    ranked, ranker = ranked_ids({
+        "pesos": {"segmentos": 0},
+        "prioridade_tipo": {"constitucional": 10},
+        "peso_curinga": 1,
+        "top_k": 1,
+    })
+    assert ranked[0][0] == "CONSTITUCIONAL"
+    # Com peso_curinga 1 e segmentos sem peso, explícito e curinga empatam
+    assert {fid for fid, score in ranked if score == ranked[1][1]} == {"EXPLICITO", "CURINGA", "MISTO"}
+    assert ranker.top_k == 1
+
+
+def test_scores_match_rank():
+    index = EligibilityIndex(FUNDOS)
+    ranker = Ranker(index)
+    explicit = index.explicit_masks(LEAD)
+    assert ranker.scores(index.all_mask, explicit) == dict(ranker.rank(index.all_mask, explicit))
+    assert ranker.rank(0, explicit) == []
+
+
+def test_server_applies_top_k(client, admin_headers, edit_config, lead_payload):
+    edit_config(lambda config: config["configuracao"].update(ranking={"top_k": 1}))
+    response = client.post("/api/admin/avaliar-elegibilidade", headers=admin_headers, json=lead_payload["lead"])
+    assert response.status_code == 200, response.text
+    data = response.json()["elegibilidade"]
+    assert len(data["recomendados"]) > 1
+    assert data["top_k"] == [item["id"] for item in data["recomendados"][:1]]
+
+
+@pytest.mark.parametrize("ranking", [
+    "pesos",
+    {"pesos": {"regioes": "muito"}},
+    {"pesos": {"regioes": -1}},
+    {"pesos": {"inexistente": 1}},
+    {"prioridade_tipo": {"privado": float("inf")}},
+    {"peso_curinga": 2},
+    {"top_k": 0},
+])
+def test_invalid_ranking_is_rejected(ranking):
+    with pytest.raises(ValueError):
+        Ranker(EligibilityIndex(FUNDOS), ranking)
+
+
+def test_invalid_ranking_keeps_previous_config(server, edit_config):
+    version = server.get_config_snapshot().version
+    with pytest.raises(AssertionError):
+        edit_config(lambda config: config["configuracao"].update(ranking={"pesos": {"regioes": -1}}))
+    assert server.get_config_snapshot().version == version
+    assert "ranking" in server.config_store.last_error
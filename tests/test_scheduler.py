@@ -0,0 +1,37 @@
+import asyncio
+import fcntl
+
+from scheduler import JobScheduler
+
+
+def test_manual_job_is_not_scheduled_and_receives_kwargs(tmp_path):
+    scheduler = JobScheduler(tmp_path, enabled=True)
+    calls = []
+    scheduler.add("manual", lambda limit=1: calls.append(limit) or {"limit": limit}, None)
+
+    async def scenario():
+        scheduler.start()
+        assert scheduler._tasks == []
+        assert await scheduler.run("manual", limit=7)
+
+    asyncio.run(scenario())
+    assert calls == [7]
+    assert scheduler.jobs["manual"].snapshot()["schedule"] == "manual"
+    assert scheduler.jobs["manual"].last_result == {"limit": 7}
+
+
+def test_manual_spool_replay_uses_job_lock(server, client, admin_headers):
+    job = server.scheduler.jobs["webhook-spool-replay"]
+    runs = job.runs
+    response = client.post("/api/admin/webhook-spool/replay?limit=5", headers=admin_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["pending"] == server.webhook_spool.count()
+    assert job.runs == runs + 1
+
+    # Outro worker com o lock do job: o replay manual não roda em paralelo
+    server.scheduler.lock_dir.mkdir(parents=True, exist_ok=True)
+    with open(server.scheduler.lock_dir / f"{job.name}.lock", "a+") as held:
+        fcntl.flock(held.fileno(), fcntl.LOCK_EX)
+        response = client.post("/api/admin/webhook-spool/replay", headers=admin_headers)
+    assert response.status_code == 409
+    assert job.runs == runs + 1
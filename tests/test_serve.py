@@ -0,0 +1,59 @@
+import json
+import os
+
+import pytest
+import typer
+
+import serve
+
+
+def test_single_worker_keeps_state_backend(monkeypatch):
+    monkeypatch.delenv("STATE_BACKEND_URL", raising=False)
+    serve.configure_state_backend(1)
+    assert "STATE_BACKEND_URL" not in os.environ
+
+
+def test_multiple_workers_default_to_shared_sqlite(monkeypatch):
+    monkeypatch.delenv("STATE_BACKEND_URL", raising=False)
+    serve.configure_state_backend(4)
+    assert os.environ["STATE_BACKEND_URL"] == serve.default_state_backend_url()
+    assert os.environ["STATE_BACKEND_URL"].startswith("sqlite:///")
+
+
+def test_multiple_workers_refuse_memory_backend(monkeypatch):
+    monkeypatch.setenv("STATE_BACKEND_URL", "memory://")
+    with pytest.raises(typer.Exit):
+        serve.configure_state_backend(2)
+
+
+def test_multiple_workers_keep_explicit_backend(monkeypatch):
+    monkeypatch.setenv("STATE_BACKEND_URL", "redis://cache:6379/0")
+    serve.configure_state_backend(2)
+    assert os.environ["STATE_BACKEND_URL"] == "redis://cache:6379/0"
+
+
+def test_rolling_reload_loads_new_config_in_master(server, monkeypatch):
+    master = serve.Master(server, None, workers=1, loop="asyncio", http="h11", log_level="info",
+                          graceful_timeout=1, watch_config=False, watch_interval=2.0)
+    master.workers = {1001: 0.0}
+    events = []
+    monkeypatch.setattr(master, "spawn_worker", lambda: events.append(("spawn", server.get_config_snapshot().version)))
+    monkeypatch.setattr(master, "stop_worker", lambda pid: events.append(("stop", pid)))
+    monkeypatch.setattr(serve.gc, "freeze", lambda: events.append(("freeze", None)))
+
+    path = server.get_fundos_config_path()
+    original = path.read_bytes()
+    before = server.get_config_snapshot().version
+    try:
+        config = server.load_fundos_config()
+        config["configuracao"]["observacao"] = "reload gradual"
+        path.write_text(json.dumps(config), encoding="utf-8")
+        master.rolling_reload()
+        after = server.get_config_snapshot().version
+    finally:
+        path.write_bytes(original)
+        server.config_store.reload()
+
+    assert after != before
+    # O worker novo sobe depois da recarga no mestre; gc.freeze só na subida
+    assert events == [("spawn", after), ("stop", 1001)]
@@ -0,0 +1,38 @@
+import asyncio
+import threading
+import time
+
+import httpx
+
+
+def test_identical_eligibility_queries_share_one_evaluation(server, client, admin_headers, monkeypatch, lead_payload):
+    evaluate = server.evaluate_eligibility
+    calls = []
+    lock = threading.Lock()
+
+    def slow_evaluate(*args, **kwargs):
+        with lock:
+            calls.append(args[1].faturamento_renda)
+        time.sleep(0.2)  # mantém a primeira execução em andamento enquanto as outras chegam
+        return evaluate(*args, **kwargs)
+
+    monkeypatch.setattr(server, "evaluate_eligibility", slow_evaluate)
+    other = {**lead_payload["lead"], "faturamento_renda": "outro"}
+    before = server.eligibility_flight.snapshot()
+
+    async def main():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://teste") as http:
+            url = "/api/admin/avaliar-elegibilidade"
+            requests = [http.post(url, headers=admin_headers, json=lead_payload["lead"]) for _ in range(5)]
+            requests.append(http.post(url, headers=admin_headers, json=other))
+            return await asyncio.gather(*requests)
+
+    responses = asyncio.run(main())
+
+    assert [r.status_code for r in responses] == [200] * 6, responses[0].text
+    assert len({r.content for r in responses[:5]}) == 1
+    assert sorted(calls) == sorted([lead_payload["lead"]["faturamento_renda"], "outro"])
+    after = server.eligibility_flight.snapshot()
+    assert after["executions"] - before["executions"] == 2
+    assert after["coalesced"] - before["coalesced"] == 4
@@ -0,0 +1,66 @@
+import copy
+
+import pytest
+
+from snapshot_file import SnapshotDirectory, load_derived
+
+
+@pytest.fixture
+def config(server):
+    """Configuração de teste com fundos repetidos: bitsets com mais de um byte"""
+    config = copy.deepcopy(server.load_fundos_config())
+    for fundo_id, fundo in list(config["fundos"].items()):
+        for copy_n in range(2):
+            config["fundos"][f"{fundo_id}_{copy_n}"] = {**fundo, "ativo": bool(copy_n)}
+    return config
+
+
+def test_snapshot_round_trip_matches_compiled(server, config, tmp_path):
+    built = server.build_config_snapshot(config)
+    directory = SnapshotDirectory(tmp_path, "teste")
+    calls = []
+
+    def build():
+        calls.append(1)
+        return built
+
+    snapshot_file = directory.open_or_build("v1", build)
+    loaded = load_derived(snapshot_file)
+
+    index, mapped_index = built["eligibility"], loaded["eligibility"]
+    assert len(index) > 8
+    for attr in ("fund_ids", "names", "tipos", "positions", "all_mask", "accepts_all", "by_value"):
+        assert getattr(mapped_index, attr) == getattr(index, attr), attr
+    assert list(mapped_index.accepted) == list(index.accepted)
+
+    catalog, mapped_catalog = built["catalog"], loaded["catalog"]
+    for attr in ("ids", "all_mask", "fund_etags", "ativo_mask", "tipo_masks", "value_masks", "wildcard_masks"):
+        assert getattr(mapped_catalog, attr) == getattr(catalog, attr), attr
+    assert {k: bytes(v) for k, v in mapped_catalog.fund_json.items()} == \
+        {k: bytes(v) for k, v in catalog.fund_json.items()}
+
+    assert {k: bytes(v) for k, v in loaded["responses"].items()} == \
+        {k: bytes(v) for k, v in built["responses"].items()}
+
+    # Outro processo com a mesma versão só mapeia o arquivo
+    assert directory.open_or_build("v1", build) is not None
+    assert calls == [1]
+    assert (directory.writes, directory.hits) == (1, 2)
+
+
+def test_mapped_index_evaluates_like_compiled(server, config, tmp_path):
+    built = server.build_config_snapshot(config)
+    loaded = load_derived(SnapshotDirectory(tmp_path, "teste").open_or_build("v1", lambda: built))
+    index, mapped = built["eligibility"], loaded["eligibility"]
+    lead_values = {"situacao_empresa": ["cnpj_antigo"], "regioes": ["Nordeste"], "garantias": ["Imovel"]}
+    assert mapped.evaluate(lead_values) == index.evaluate(lead_values)
+    masks = index.masks(lead_values)
+    assert mapped.failure_masks(masks) == index.failure_masks(masks)
+
+
+def test_corrupt_snapshot_is_ignored(tmp_path):
+    directory = SnapshotDirectory(tmp_path, "teste")
+    directory.directory.mkdir(parents=True, exist_ok=True)
+    directory.path_for("v1").write_bytes(b"lixo")
+    assert directory.open("v1") is None
+    assert directory.errors == 1
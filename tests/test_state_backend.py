@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from state_backend import BatchedStateList, FakeRedis, MemoryStateBackend, RedisStateBackend, SQLiteStateBackend
+
+
+@pytest.fixture(params=["memory", "sqlite", "fakeredis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        backend = MemoryStateBackend()
+    elif request.param == "sqlite":
+        backend = SQLiteStateBackend(tmp_path / "state.db")
+    else:
+        backend = RedisStateBackend(FakeRedis())
+    yield backend
+    backend.close()
+
+
+def test_incr_counts_within_fixed_window(backend):
+    count, started = backend.incr("login_attempts", "10.0.0.1", ttl=60)
+    assert count == 1
+    for expected in (2, 3):
+        count, window_start = backend.incr("login_attempts", "10.0.0.1", ttl=60)
+        assert count == expected
+        assert window_start == pytest.approx(started)
+    assert backend.incr("login_attempts", "10.0.0.2", ttl=60)[0] == 1
+
+
+def test_incr_starts_new_window_after_ttl(backend):
+    backend.incr("login_attempts", "10.0.0.1", ttl=0.05)
+    backend.incr("login_attempts", "10.0.0.1", ttl=0.05)
+    time.sleep(0.1)
+    assert backend.incr("login_attempts", "10.0.0.1", ttl=0.05)[0] == 1
+
+
+def test_purge_expired_removes_only_expired(backend):
+    backend.set("tokens", "old", {"v": 1}, ttl=0.05)
+    backend.set("tokens", "fresh", {"v": 2}, ttl=60)
+    backend.set("tokens", "permanent", {"v": 3})
+    time.sleep(0.1)
+    backend.purge_expired("tokens")
+    assert sorted(backend.keys("tokens")) == ["fresh", "permanent"]
+    assert backend.get("tokens", "old") is None
+    assert backend.get("tokens", "fresh") == {"v": 2}
+
+
+def test_list_push_many_keeps_newest_first_and_trims(backend):
+    backend.list_push_many("webhook_logs", [{"n": 1}, {"n": 2}], maxlen=3)
+    backend.list_push_many("webhook_logs", [{"n": 3}, {"n": 4}], maxlen=3)
+    assert backend.list_range("webhook_logs", 10) == [{"n": 4}, {"n": 3}, {"n": 2}]
+    assert backend.list_range("webhook_logs", 1) == [{"n": 4}]
+    assert backend.list_range("other", 10) == []
+
+
+def test_batched_push_never_writes_in_caller_thread(tmp_path):
+    backend = SQLiteStateBackend(tmp_path / "state.db")
+    writers = []
+    list_push_many = backend.list_push_many
+
+    def recording_push_many(*args):
+        writers.append(threading.get_ident())
+        return list_push_many(*args)
+
+    backend.list_push_many = recording_push_many
+    logs = BatchedStateList(backend, "webhook_logs", maxlen=10, batch_size=2, flush_interval=60)
+    try:
+        for n in range(4):
+            logs.push({"n": n})
+        deadline = time.monotonic() + 5
+        while len(backend.list_range("webhook_logs", 10)) < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Lote cheio só acorda a thread de fundo: nenhuma gravação na thread de quem chamou push
+        assert writers and threading.get_ident() not in writers
+        assert [item["n"] for item in logs.range()] == [3, 2, 1, 0]
+    finally:
+        logs.close()
+        backend.close()
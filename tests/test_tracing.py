@@ -0,0 +1,60 @@
+import json
+import os
+import time
+
+import pytest
+
+from tracing import BatchSpanExporter, FileSink
+
+
+class FakeSpan:
+    def __init__(self, name):
+        self.name = name
+
+    def to_otlp(self):
+        return {"name": self.name}
+
+
+def exported(path):
+    """{pid: [nomes dos spans]} das linhas já gravadas pelo exporter"""
+    if not path.exists():
+        return {}
+    result = {}
+    for line in path.read_text().splitlines():
+        resource = json.loads(line)["resourceSpans"][0]
+        pid = next(a["value"]["intValue"] for a in resource["resource"]["attributes"] if a["key"] == "process.pid")
+        result.setdefault(int(pid), []).extend(s["name"] for s in resource["scopeSpans"][0]["spans"])
+    return result
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requer fork")
+def test_forked_child_exports_with_its_own_thread(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    exporter = BatchSpanExporter(FileSink(str(path)), "teste", flush_interval=60)
+    exporter.submit(FakeSpan("pai"))  # inicia a thread do pai; fica na fila até o flush
+    assert exporter._thread.is_alive()
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        ok = False
+        try:
+            os.close(read_fd)
+            exporter.flush_interval = 0.05
+            exporter.submit(FakeSpan("filho"))
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline and os.getpid() not in exported(path):
+                time.sleep(0.02)
+            ok = exported(path).get(os.getpid()) == ["filho"]
+        finally:
+            os.write(write_fd, b"1" if ok else b"0")
+            os._exit(0)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd, "rb") as pipe:
+        child_ok = pipe.read()
+    os.waitpid(pid, 0)
+    assert child_ok == b"1"  # o filho exportou pela própria thread, sem os spans do pai
+
+    exporter.flush()
+    assert exported(path)[os.getpid()] == ["pai"]
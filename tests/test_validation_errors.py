@@ -0,0 +1,63 @@
+"""
+As rotas que validam o corpo bruto (raw_json_body) têm que responder 422 com
+o mesmo corpo que o FastAPI geraria com `submission: FormSubmission` no
+parâmetro: é o contrato que o frontend lê.
+"""
+import copy
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="module")
+def reference_client(server):
+    reference = FastAPI()
+
+    @reference.post("/reference")
+    async def reference_route(submission: server.FormSubmission):
+        return {}
+
+    return TestClient(reference)
+
+
+def without_field(payload, *path):
+    payload = copy.deepcopy(payload)
+    target = payload
+    for key in path[:-1]:
+        target = target[key]
+    del target[path[-1]]
+    return json.dumps(payload).encode()
+
+
+def with_value(payload, value, *path):
+    payload = copy.deepcopy(payload)
+    target = payload
+    for key in path[:-1]:
+        target = target[key]
+    target[path[-1]] = value
+    return json.dumps(payload).encode()
+
+
+CASES = {
+    "campo ausente": lambda lead: without_field(lead, "lead", "email"),
+    "tipo errado": lambda lead: with_value(lead, "industria", "lead", "segmento"),
+    "objeto no lugar errado": lambda lead: with_value(lead, [], "lead"),
+    "JSON inválido": lambda lead: b'{"idempotency_key": ',
+    "corpo vazio": lambda lead: b"",
+    "JSON que não é objeto": lambda lead: b"[1, 2]",
+}
+
+
+@pytest.mark.parametrize("route", ["/api/form/submit", "/api/form/webhook"])
+@pytest.mark.parametrize("case", list(CASES))
+def test_raw_body_422_matches_fastapi(client, reference_client, lead_payload, route, case):
+    body = CASES[case](lead_payload)
+    headers = {"Content-Type": "application/json"}
+    expected = reference_client.post("/reference", content=body, headers=headers)
+    response = client.post(route, content=body, headers=headers)
+
+    assert expected.status_code == 422
+    assert response.status_code == 422
+    assert response.json() == expected.json()
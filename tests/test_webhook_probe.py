@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import pytest
+
+from state_backend import SQLiteStateBackend
+from webhook_probe import WebhookProber
+
+
+def test_debug_webhook_test_only_probes(server, client, admin_headers, monkeypatch):
+    def no_post():
+        raise AssertionError("o teste do webhook não pode enviar POST")
+
+    monkeypatch.setattr(server, "get_requests", no_post)
+    logs = server.webhook_logs.range()
+
+    response = client.post("/api/debug/webhook-test", headers=admin_headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["success"] is False  # webhook de teste: conexão recusada
+    assert "ConnectionRefusedError" in data["error"]
+    assert server.webhook_logs.range() == logs
+
+
+def test_probe_job_runs_in_one_worker(server):
+    assert server.scheduler.jobs["webhook-probe"].exclusive
+
+
+@pytest.fixture
+def shared_probe_state(server, monkeypatch, tmp_path):
+    backend = SQLiteStateBackend(tmp_path / "state.db")
+    monkeypatch.setattr(server, "state_backend", backend)
+    monkeypatch.setattr(server, "webhook_prober", WebhookProber(failure_threshold=3))
+    monkeypatch.setattr(server, "_probe_tripped", set())
+    monkeypatch.setattr(server, "_probe_seen", {})
+    breaker = server.webhook_destinations.breaker("default")
+    yield backend
+    breaker.reset()
+    backend.close()
+
+
+def refused():
+    return {"at": datetime.utcnow().isoformat(), "ok": False, "status_code": None,
+            "error": "ConnectionRefusedError", "total_ms": 1.0}
+
+
+def test_sync_applies_probes_published_by_another_worker(server, shared_probe_state):
+    breaker = server.webhook_destinations.breaker("default")
+    for _ in range(3):
+        # Sondagem feita e publicada por outro worker
+        shared_probe_state.set(server.PROBE_NAMESPACE, "default", refused())
+        assert server.sync_webhook_probes() == 1
+        assert server.sync_webhook_probes() == 0  # a mesma sondagem não conta duas vezes
+
+    assert server.webhook_prober.state("default") == "down"
+    assert not server.webhook_prober.readiness()["ready"]
+    assert breaker.state == breaker.OPEN
+
+
+def test_probe_publishes_result_for_other_workers(server, shared_probe_state, monkeypatch):
+    result = refused()
+    monkeypatch.setattr(server, "probe_url", lambda *args, **kwargs: result)
+    server.probe_webhooks()
+    assert shared_probe_state.get(server.PROBE_NAMESPACE, "default") == result
+    # Quem sondou já aplicou o resultado: a sincronização não repete
+    assert server.sync_webhook_probes() == 0
@@ -0,0 +1,63 @@
+import time
+
+from state_backend import BatchedStateList, SQLiteStateBackend
+
+
+def test_spool_write_does_not_block_event_loop(server, client, strict_loop_monitor, monkeypatch, lead_payload):
+    spool_submission = server.spool_submission
+
+    def slow_spool(*args, **kwargs):
+        time.sleep(strict_loop_monitor.threshold * 3)  # disco lento
+        return spool_submission(*args, **kwargs)
+
+    monkeypatch.setattr(server, "spool_submission", slow_spool)
+    breaker = server.webhook_destinations.breaker("default")
+    breaker.trip("teste")  # circuito aberto: a entrega vai direto para o spool
+    before = set(server.webhook_spool.pending())
+    try:
+        response = client.post("/api/form/webhook", json=lead_payload)
+    finally:
+        breaker.reset()
+        for path in set(server.webhook_spool.pending()) - before:
+            server.webhook_spool.remove(path)
+
+    # Sem LoopBlockedError: a gravação lenta rodou fora do event loop
+    assert response.status_code == 202, response.text
+    assert {d["status"] for d in response.json()["deliveries"]} == {"queued"}
+
+
+class SlowSQLiteStateBackend(SQLiteStateBackend):
+    """SQLite compartilhado com I/O lento (disco ocupado, lock de outro worker)"""
+
+    delay = 0.3
+
+    def list_push_many(self, *args):
+        time.sleep(self.delay)
+        return super().list_push_many(*args)
+
+    def list_range(self, *args):
+        time.sleep(self.delay)
+        return super().list_range(*args)
+
+
+def test_webhook_logs_io_does_not_block_event_loop(server, client, strict_loop_monitor, admin_headers,
+                                                   monkeypatch, lead_payload, tmp_path):
+    backend = SlowSQLiteStateBackend(tmp_path / "state.db")
+    # batch_size=1: todo push completa um lote
+    logs = BatchedStateList(backend, "webhook_logs", maxlen=10, batch_size=1, flush_interval=0.05)
+    monkeypatch.setattr(server, "webhook_logs", logs)
+    breaker = server.webhook_destinations.breaker("default")
+    breaker.trip("teste")
+    before = set(server.webhook_spool.pending())
+    try:
+        assert client.post("/api/form/webhook", json=lead_payload).status_code == 202
+        response = client.get("/api/admin/webhook-logs", headers=admin_headers)
+    finally:
+        breaker.reset()
+        for path in set(server.webhook_spool.pending()) - before:
+            server.webhook_spool.remove(path)
+        logs.close()
+        backend.close()
+
+    assert response.status_code == 200
+    assert [log["idempotency_key"] for log in response.json()["logs"]] == [lead_payload["idempotency_key"]]
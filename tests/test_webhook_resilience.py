@@ -0,0 +1,112 @@
+import asyncio
+
+from webhook_resilience import AdaptiveConcurrencyLimiter, CircuitBreaker, DestinationTracker, WebhookSpool
+from webhook_routing import DEFAULT_DESTINATION, Destination
+
+
+def half_open_breaker():
+    breaker = CircuitBreaker(open_seconds=60)
+    breaker.trip("teste")
+    breaker._opened_at -= 61  # já passou open_seconds: próxima consulta entra em half_open
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    return breaker
+
+
+def test_half_open_allows_single_trial():
+    breaker = half_open_breaker()
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_released_trial_can_be_taken_again():
+    breaker = half_open_breaker()
+    assert breaker.allow_request()
+    breaker.release_trial()
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_release_after_outcome_is_noop():
+    breaker = half_open_breaker()
+    assert breaker.allow_request()
+    breaker.record_failure("HTTP 503")
+    breaker.release_trial()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_unreleased_trial_expires():
+    breaker = half_open_breaker()
+    assert breaker.allow_request()
+    breaker._trial_started -= 61
+    assert breaker.allow_request()
+
+
+def test_limiter_rejection_does_not_hold_half_open_trial(server, monkeypatch, lead_payload):
+    breaker = half_open_breaker()
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1)
+    assert limiter.try_acquire()  # limite cheio: a entrega vai para o spool
+    monkeypatch.setattr(server, "webhook_destinations", DestinationTracker(
+        CircuitBreaker, seed={DEFAULT_DESTINATION: breaker}, limiter_seed={DEFAULT_DESTINATION: limiter}))
+
+    lead = server.FormSubmission.model_validate(lead_payload)
+    destination = server.get_config_snapshot().router.destinations[DEFAULT_DESTINATION]
+    result = asyncio.run(server.deliver_webhook(destination, b"{}", lead))
+
+    assert result["reason"] == "concurrency_limit"
+    assert [breaker.allow_request() for _ in range(3)] == [True, False, False]
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_send_without_outcome_does_not_hold_half_open_trial(server, monkeypatch, lead_payload):
+    breaker = half_open_breaker()
+    monkeypatch.setattr(server, "webhook_destinations", DestinationTracker(CircuitBreaker, seed={DEFAULT_DESTINATION: breaker}))
+
+    lead = server.FormSubmission.model_validate(lead_payload)
+    destination = Destination(DEFAULT_DESTINATION, "", 1.0, None, False)  # URL inválida: nada é enviado
+    result = asyncio.run(server.deliver_webhook(destination, b"{}", lead))
+
+    assert result["status"] == "failed"
+    assert breaker.allow_request()
+
+
+def test_full_limiter_only_refuses_its_own_destination(server, monkeypatch, lead_payload):
+    tracker = DestinationTracker(CircuitBreaker, limiter_factory=lambda: AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1))
+    monkeypatch.setattr(server, "webhook_destinations", tracker)
+    assert tracker.limiter("lento").try_acquire()  # destino lento com todas as vagas ocupadas
+
+    lead = server.FormSubmission.model_validate(lead_payload)
+    slow = asyncio.run(server.deliver_webhook(Destination("lento", "", 1.0, None, False), b"{}", lead))
+    other = asyncio.run(server.deliver_webhook(Destination("outro", "", 1.0, None, False), b"{}", lead))
+
+    assert slow["reason"] == "concurrency_limit"
+    assert other["status"] == "failed"  # chegou a tentar o envio
+    status = tracker.snapshot()
+    assert status["lento"]["concurrency"]["in_flight"] == 1
+    assert status["outro"]["concurrency"]["in_flight"] == 0
+
+
+def test_replay_moves_unusable_items_out_of_the_queue(server, monkeypatch, tmp_path):
+    spool = WebhookSpool(tmp_path / "spool")
+    monkeypatch.setattr(server, "webhook_spool", spool)
+    monkeypatch.setattr(server, "webhook_destinations", DestinationTracker(CircuitBreaker))
+    sent = []
+    monkeypatch.setattr(server, "send_to_destination",
+                        lambda destination, body, *args: sent.append(body) or {"success": True, "status_code": 200})
+
+    # Itens mais antigos que o válido: ilegível e de um destino que saiu da configuração
+    tmp_path.joinpath("spool").mkdir()
+    corrupt = spool.directory / "0_corrompido.json"
+    corrupt.write_bytes(b'{"reason": "timeout"')
+    orphan = spool.append(b'{"idempotency_key": "a"}', "timeout", destination="removido")
+    valid = spool.append(b'{"idempotency_key": "b"}', "timeout")
+
+    result = server.replay_webhook_spool(limit=1)
+
+    assert result == {"sent": 1, "failed": 0, "dead_lettered": 2, "pending": 0}
+    assert sent == [b'{"idempotency_key": "b"}']
+    assert not valid.exists()
+    assert [p.name for p in spool.dead_letters()] == [corrupt.name, orphan.name]
+    assert spool.snapshot()["dead_letter"] == 2
+    assert server.replay_webhook_spool(limit=1)["dead_lettered"] == 0
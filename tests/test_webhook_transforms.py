@@ -0,0 +1,42 @@
+import json
+
+from webhook_transforms import PayloadTransformer
+
+BODY = b'{"lead": {"nome": "Maria", "email": "maria@example.com"}, "idempotency_key": "abc"}'
+
+
+def test_transform_reshapes_payload():
+    transformer = PayloadTransformer({"crm": '{name: .lead.nome, key: .idempotency_key}'})
+    assert json.loads(transformer.apply("crm", BODY)) == {"name": "Maria", "key": "abc"}
+    assert transformer.apply("crm", BODY) == transformer.apply("crm", BODY)
+
+    status = transformer.status()["crm"]
+    assert status["compiled"] and status["applied"] == 3 and status["fallbacks"] == 0
+
+
+def test_destination_without_transform_gets_original_bytes():
+    transformer = PayloadTransformer({"crm": ".lead"})
+    assert transformer.apply("default", BODY) is BODY
+
+
+def test_program_that_does_not_compile_falls_back(monkeypatch):
+    import webhook_transforms
+    compiles = []
+    compile_jq = webhook_transforms.get_jq().compile
+    monkeypatch.setattr(webhook_transforms.get_jq(), "compile", lambda program: compiles.append(program) or compile_jq(program))
+
+    transformer = PayloadTransformer({"crm": "{name: .lead.nome"})
+    assert transformer.apply("crm", BODY) == BODY
+    assert transformer.apply("crm", BODY) == BODY
+    assert len(compiles) == 1  # o erro de compilação fica guardado para a versão da configuração
+
+    status = transformer.status()["crm"]
+    assert not status["compiled"]
+    assert status["fallbacks"] == 2 and status["applied"] == 0
+    assert status["last_error"]
+
+
+def test_program_with_several_outputs_falls_back():
+    transformer = PayloadTransformer({"crm": ".lead.nome, .lead.email"})
+    assert transformer.apply("crm", BODY) == BODY
+    assert "2 valores" in transformer.status()["crm"]["last_error"]